@@ -10,6 +10,8 @@ from django.contrib.auth.models import User
 from django.db import models
 from django.db.models.signals import post_save
 
+from ping_me_api.caching import bump_versions, version_key
+
 
 class Account(models.Model):
     """
@@ -60,3 +62,33 @@ def create_account(sender, instance, created, **kwargs):
 
 # Connect the create_account signal handler to the User post_save signal.
 post_save.connect(create_account, sender=User)
+
+
+def profile_version_key(user_id):
+    """
+    Returns:
+        str: The version counter of a user's public profile, part of the
+        ETags of the message history pages and server lists showing it.
+    """
+    return version_key("profile", user_id)
+
+
+def bump_profile_version(sender, instance, created, **kwargs):
+    """
+    Signal handler to invalidate the ETags showing an edited profile.
+
+    A new account isn't shown anywhere yet, so creating one bumps nothing.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (Account): The saved account.
+        created (bool): Whether this is a new Account instance.
+        **kwargs: Additional keyword arguments.
+    """
+    if created:
+        return
+    bump_versions([profile_version_key(instance.owner_id)])
+
+
+# Connect the bump_profile_version signal handler to the Account post_save signal.
+post_save.connect(bump_profile_version, sender=Account)
@@ -9,6 +9,7 @@ for use with drf_spectacular.
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter, extend_schema
 
+from server.schema import FIELDSET_PARAMETERS
 from server.serializers import ServerSerializer
 
 from .serializers import (AccountRegistrationSerializer, AccountSerializer,
@@ -89,6 +90,7 @@ edit_me_docs = extend_schema(
 # --- List User's Servers ---
 my_servers_docs = extend_schema(
     responses=ServerSerializer(many=True),
+    parameters=FIELDSET_PARAMETERS,
     description="Retrieve the list of servers the authenticated user is a member of.",
     tags=["Account"],
 )
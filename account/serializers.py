@@ -13,6 +13,7 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from ping_me_api.images import image_url
 from ping_me_api.utils import validate_image_file  # Adjust path if needed
 from server.serializers import ServerSerializer
 
@@ -54,13 +55,7 @@ class AccountSerializer(serializers.ModelSerializer):
         Returns:
             str or None: The URL of the image or None if not set.
         """
-        if obj.image:
-            url = obj.image.url
-            # Force HTTPS for Cloudinary URLs
-            if url.startswith('http://'):
-                url = url.replace('http://', 'https://', 1)
-            return url
-        return None
+        return image_url(obj.image)
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
@@ -81,7 +76,7 @@ class AccountSerializer(serializers.ModelSerializer):
             "id": account.id,
             "username": account.username,
             "email": user.email,
-            "avatar": account.image.url if account.image else None,
+            "avatar": image_url(account.image),
             "servers": ServerSerializer(servers, many=True).data,
         })
 
@@ -1,6 +1,8 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from rest_framework.test import APIClient
+from ping_me_api.testing import PingMeTestCase
 from server.models import Server, Channel, ServerCategory
 
 class TestAccountMyServersCache(TestCase):
@@ -41,3 +43,52 @@ class TestAccountMyServersCache(TestCase):
         # Invalidate cache
         cache.delete(self.cache_key)
         self.assertIsNone(cache.get(self.cache_key))
+
+
+class TestMyServersViewCache(PingMeTestCase):
+    url = '/api/account/my_servers/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user('viewcacheuser')
+        self.category = ServerCategory.objects.create(name='ViewCacheCat')
+        self.server = Server.objects.create(name='ViewCacheServer', owner=self.user.account, category=self.category)
+        self.other_server = Server.objects.create(name='OtherServer', owner=self.user.account, category=self.category)
+        self.server.members.add(self.user.account)
+        self.channel = Channel.objects.create(name='cache-general', server=self.server, owner=self.user.account)
+        self.cache_key = f'user_{self.user.account.id}_servers'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def names(self):
+        return sorted(server['name'] for server in self.client.get(self.url).json())
+
+    def changes(self, change):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+
+    def test_view_caches_serialized_servers(self):
+        first = self.client.get(self.url).json()
+        self.assertEqual(cache.get(self.cache_key)['data'], first)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).json(), first)
+
+    def test_joining_and_leaving_invalidate(self):
+        self.changes(lambda: self.other_server.members.add(self.user.account))
+        self.assertEqual(self.names(), ['OtherServer', 'ViewCacheServer'])
+        self.changes(lambda: self.server.members.remove(self.user.account))
+        self.assertEqual(self.names(), ['OtherServer'])
+
+    def test_server_and_channel_changes_invalidate(self):
+        self.changes(lambda: Server.objects.filter(pk=self.server.pk).first().save())
+        self.changes(lambda: Channel.objects.create(name='second', server=self.server, owner=self.user.account))
+        [server] = self.client.get(self.url).json()
+        self.assertEqual(sorted(channel['name'] for channel in server['channel_server']), ['cache-general', 'second'])
+        self.changes(lambda: self.channel.delete())
+        [server] = self.client.get(self.url).json()
+        self.assertEqual([channel['name'] for channel in server['channel_server']], ['second'])
+
+    def test_deleting_a_server_invalidates(self):
+        self.changes(lambda: self.server.delete())
+        self.assertEqual(self.names(), [])
@@ -5,25 +5,36 @@ This module contains the AccountViewSet, which handles user registration, email
 resending verification emails, password reset, and user profile endpoints for the account app.
 """
 
+import hashlib
 import os
 
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
 from django.core.mail import send_mail
+from django.db.models import F
 from django.http import HttpResponseRedirect
 from django.template.loader import render_to_string
+from django.utils.decorators import method_decorator
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.views.decorators.http import condition
 from dotenv import load_dotenv
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from ping_me_api.caching import get_versions, make_etag
+from ping_me_api.fieldsets import fieldset_params
 from ping_me_api.permissions import IsOwnerOrReadOnly
 from ping_me_api.utils import generate_token, verify_token
+from server.models import Server, attach_member_samples, membership_version_key, server_version_key
 from server.serializers import ServerSerializer
+from webchat.hotwindow import hot_windows
+from webchat.profiles import broadcast_profile_update
 
+from .models import profile_version_key
 from .serializers import (AccountRegistrationSerializer, AccountSerializer,
                           PasswordResetConfirmSerializer,
                           PasswordResetRequestSerializer,
@@ -31,6 +42,108 @@ from .serializers import (AccountRegistrationSerializer, AccountSerializer,
 
 load_dotenv()
 
+
+#: Seconds a user's server IDs and serialized server list stay cached.
+MY_SERVERS_CACHE_TIMEOUT = 3600
+
+
+def my_servers_cache_key(account_id, fieldsets=(None, None)):
+    """
+    Return the cache key of an account's serialized server list.
+
+    Args:
+        account_id (int): The account's ID.
+        fieldsets (tuple): The normalized ``fields``/``expand`` parameters
+            picking the rendering, see ``fieldset_params``; the full list has
+            the key without a suffix.
+
+    Returns:
+        str: The cache key.
+    """
+    key = f"user_{account_id}_servers"
+    if fieldsets != (None, None):
+        key += "_" + hashlib.sha1(repr(fieldsets).encode()).hexdigest()[:16]
+    return key
+
+
+def server_profile_ids(server_ids, versions):
+    """
+    Return the users whose profiles show in the given servers' listings.
+
+    Those are each server's owner and sampled members. They are cached per
+    server version, which joins, leaves and ownership changes all bump.
+
+    Args:
+        server_ids (list[int]): The server IDs.
+        versions (list[int]): The servers' versions, in the same order.
+
+    Returns:
+        list[int]: The user IDs, in ascending order.
+    """
+    keys = {
+        server_id: f"server_profiles_{server_id}_{version}"
+        for server_id, version in zip(server_ids, versions)
+    }
+    found = cache.get_many(list(keys.values()))
+    missing = [server_id for server_id, key in keys.items() if key not in found]
+    if missing:
+        servers = list(
+            Server.objects.filter(id__in=missing)
+            .with_member_summary(membership=False)
+            .annotate(owner_user_id=F("owner__owner_id"))
+            .only("id")
+        )
+        attach_member_samples(servers)
+        fresh = {
+            keys[server.id]: [server.owner_user_id] + [account.owner_id for account in server.member_sample]
+            for server in servers
+        }
+        cache.set_many(fresh, MY_SERVERS_CACHE_TIMEOUT)
+        found.update(fresh)
+    return sorted({user_id for user_ids in found.values() for user_id in user_ids})
+
+
+def my_servers_etag(request, *args, **kwargs):
+    """
+    Build the ETag of the user's server list without serializing it.
+
+    The tag combines the user's membership version with the version of
+    every server in the list, the profile versions of the servers' owners
+    and sampled members, and the ``fields``/``expand`` parameters picking
+    the rendering. The server IDs and profile IDs are cached per version,
+    so an unchanged list is validated from the cache alone. The tag is
+    kept on the request, so the view reuses the one ``condition`` built.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        str: The ETag.
+    """
+    etag = getattr(request, "_my_servers_etag", None)
+    if etag is not None:
+        return etag
+    user_id = request.user.id
+    [membership] = get_versions([membership_version_key(user_id)])
+    ids_key = f"my_servers_ids_{user_id}_{membership}"
+    server_ids = cache.get(ids_key)
+    if server_ids is None:
+        server_ids = list(
+            Server.members.through.objects.filter(account__owner_id=user_id)
+            .order_by("server_id")
+            .values_list("server_id", flat=True)
+        )
+        cache.set(ids_key, server_ids, MY_SERVERS_CACHE_TIMEOUT)
+    versions = get_versions([server_version_key(server_id) for server_id in server_ids])
+    profile_ids = server_profile_ids(server_ids, versions)
+    profiles = get_versions([profile_version_key(profile_id) for profile_id in profile_ids])
+    request._my_servers_etag = make_etag(
+        "my_servers", user_id, membership, server_ids, versions, profile_ids, profiles,
+        fieldset_params(request),
+    )
+    return request._my_servers_etag
+
+
 class AccountViewSet(viewsets.ViewSet):
     """
     ViewSet for handling account registration, authentication, verification,
@@ -240,6 +353,10 @@ class AccountViewSet(viewsets.ViewSet):
         """
         Edit the authenticated user's account.
 
+        Connected chat sockets of the user are sent the new sender profile
+        so their following messages carry it, and the user's cached author
+        block for message history is dropped.
+
         Args:
             request (Request): The HTTP request containing updated account data.
 
@@ -250,6 +367,8 @@ class AccountViewSet(viewsets.ViewSet):
         serializer = AccountSerializer(account, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        broadcast_profile_update(request.user)
+        hot_windows.forget_author(request.user.id)
         return Response(serializer.data)
     
     @action(detail=False, methods=['delete'], permission_classes=[IsAuthenticated, IsOwnerOrReadOnly], url_path='delete_me')
@@ -283,10 +402,17 @@ class AccountViewSet(viewsets.ViewSet):
         permission_classes=[IsAuthenticated, IsOwnerOrReadOnly],
         url_path='my_servers'
     )
+    @method_decorator(condition(etag_func=my_servers_etag))
     def my_servers(self, request):
         """
         Retrieve the list of servers the authenticated user is a member of.
 
+        Responses carry an ETag; a request whose ``If-None-Match`` still
+        matches gets ``304 Not Modified`` without serializing the servers.
+        The serialized list is cached along with its ETag, so a client
+        without the ETag is still answered from the cache until something in
+        the list changes.
+
         Args:
             request (Request): The HTTP request.
 
@@ -294,6 +420,13 @@ class AccountViewSet(viewsets.ViewSet):
             Response: Serialized list of servers.
         """
         account = request.user.account
-        servers = account.servers.select_related("owner", "category").prefetch_related("members", "channel_server").all()
-        serializer = ServerSerializer(servers, many=True, context={'request': request})
+        etag = my_servers_etag(request)
+        cache_key = my_servers_cache_key(account.id, fieldset_params(request))
+        cached = cache.get(cache_key)
+        if cached is not None and cached["etag"] == etag:
+            return Response(cached["data"])
+        context = {'request': request}
+        servers = ServerSerializer(context=context).load_related(account.servers.all(), request.user)
+        serializer = ServerSerializer(servers, many=True, context=context)
+        cache.set(cache_key, {"etag": etag, "data": serializer.data}, MY_SERVERS_CACHE_TIMEOUT)
         return Response(serializer.data)
@@ -0,0 +1,166 @@
+"""
+Benchmark the async ChatConsumer against the previous sync implementation.
+
+Connects a batch of sockets to one room, then has a single sender push
+messages through it, and reports connect time, peak thread count and
+delivered messages per second for both consumer versions.
+
+Usage:
+    python -m benchmarks.bench_consumer [--sockets 500] [--messages 200]
+"""
+
+import argparse
+import contextlib
+import io
+import threading
+import time
+
+from benchmarks.utils import create_channel, create_user, report, setup_django
+
+setup_django()
+
+from asgiref.sync import async_to_sync  # noqa: E402
+from channels.generic.websocket import JsonWebsocketConsumer  # noqa: E402
+from channels.routing import URLRouter  # noqa: E402
+from channels.testing import WebsocketCommunicator  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.urls import path  # noqa: E402
+
+from webchat.consumer import ChatConsumer  # noqa: E402
+from webchat.models import ConversationModel, Messages  # noqa: E402
+
+
+class LegacySyncChatConsumer(JsonWebsocketConsumer):
+    """
+    The sync consumer as it was before the async port, kept for comparison.
+    """
+
+    def connect(self):
+        self.server_id = self.scope["url_route"]["kwargs"]["serverId"]
+        self.channel_id = self.scope["url_route"]["kwargs"]["channelId"]
+        self.user = self.scope["user"]
+        self.room_group_name = f"chat_s{self.server_id}_c{self.channel_id}"
+        self.accept()
+        async_to_sync(self.channel_layer.group_add)(self.room_group_name, self.channel_name)
+
+    def receive_json(self, content, **kwargs):
+        sender = self.user
+        conversation, created = ConversationModel.objects.get_or_create(channel_id=self.channel_id)
+        new_message = Messages.objects.create(
+            conversation=conversation, sender=sender, content=content["message"]
+        )
+        account = getattr(sender, "account", None)
+        avatar_url = None
+        if account and account.image:
+            avatar_url = account.image.url
+            if avatar_url.startswith("http://"):
+                avatar_url = avatar_url.replace("http://", "https://", 1)
+        async_to_sync(self.channel_layer.group_send)(
+            self.room_group_name,
+            {
+                "type": "chat.message",
+                "new_message": {
+                    "id": new_message.id,
+                    "user": {
+                        "id": sender.id,
+                        "username": account.username if account else sender.username,
+                        "image_url": avatar_url,
+                    },
+                    "content": new_message.content,
+                    "timestamp_created": new_message.timestamp_created.isoformat(),
+                    "timestamp_updated": new_message.timestamp_updated.isoformat(),
+                },
+            },
+        )
+
+    def chat_message(self, event):
+        self.send_json({"message": event["new_message"]})
+
+    def disconnect(self, close_code):
+        async_to_sync(self.channel_layer.group_discard)(self.room_group_name, self.channel_name)
+
+
+def build_application(consumer_class, user):
+    """
+    Route sockets to the given consumer with ``user`` already in the scope.
+    """
+    router = URLRouter([path("<str:serverId>/<str:channelId>", consumer_class.as_asgi())])
+
+    async def application(scope, receive, send):
+        return await router(dict(scope, user=user), receive, send)
+
+    return application
+
+
+async def run(consumer_class, user, sockets, messages, channel_id):
+    """
+    Run one benchmark round and return its measurements.
+    """
+    application = build_application(consumer_class, user)
+    communicators = []
+    peak_threads = threading.active_count()
+
+    start = time.perf_counter()
+    for _ in range(sockets):
+        communicator = WebsocketCommunicator(application, f"1/{channel_id}")
+        connected, _ = await communicator.connect(timeout=10)
+        assert connected
+        communicators.append(communicator)
+        peak_threads = max(peak_threads, threading.active_count())
+    connect_time = time.perf_counter() - start
+
+    sender = communicators[0]
+    start = time.perf_counter()
+    for index in range(messages):
+        await sender.send_json_to({"message": f"benchmark message {index}"})
+    for communicator in communicators:
+        for _ in range(messages):
+            await communicator.receive_json_from(timeout=30)
+        peak_threads = max(peak_threads, threading.active_count())
+    delivery_time = time.perf_counter() - start
+
+    for communicator in communicators:
+        await communicator.disconnect()
+
+    return {
+        "connect_time": connect_time,
+        "peak_threads": peak_threads,
+        "messages_per_second": messages / delivery_time,
+        "deliveries_per_second": messages * sockets / delivery_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sockets", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    # The sender floods one socket on purpose; measure throughput, not the limiter.
+    settings.WEBCHAT = dict(settings.WEBCHAT, SOCKET_RATE=0, USER_RATE=0)
+
+    # Reload with the account joined, as the JWT middleware's user would
+    # resolve it, so both versions see a CloudinaryResource avatar.
+    user = type(create_user("bench_consumer")).objects.select_related("account").get(
+        username="bench_consumer"
+    )
+
+    for label, consumer_class, channel_id in (
+        ("sync JsonWebsocketConsumer", LegacySyncChatConsumer, create_channel(user, "sync").id),
+        ("async ChatConsumer", ChatConsumer, create_channel(user, "async").id),
+    ):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = async_to_sync(run)(consumer_class, user, args.sockets, args.messages, channel_id)
+        report(
+            f"{label} ({args.sockets} sockets, {args.messages} messages)",
+            [
+                ("connect all sockets", f"{result['connect_time']:.3f} s"),
+                ("peak threads", result["peak_threads"]),
+                ("messages / s", f"{result['messages_per_second']:.1f}"),
+                ("frames delivered / s", f"{result['deliveries_per_second']:.1f}"),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    main()
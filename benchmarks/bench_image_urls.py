@@ -0,0 +1,83 @@
+"""
+Benchmark image URL generation in server lists and message pages.
+
+Serializes a page of servers and a page of message rows with the shared,
+memoized ``image_url`` builder and with the previous per-row
+``CloudinaryField.url`` plus ``http://`` rewrite, and reports the time per
+row of each.
+
+Usage:
+    python -m benchmarks.bench_image_urls [--servers 100] [--messages 100] [--authors 10]
+"""
+
+import argparse
+from unittest import mock
+
+from benchmarks.utils import create_channel, create_user, report, setup_django, timed
+
+setup_django()
+
+from account.models import Account  # noqa: E402
+from server.models import Server  # noqa: E402
+from server.serializers import ServerSerializer  # noqa: E402
+from webchat.models import ConversationModel, Messages  # noqa: E402
+from webchat.payloads import MESSAGE_VALUES, row_payloads  # noqa: E402
+
+
+def legacy_image_url(image, width=None):
+    """
+    Build an image URL the way the serializers did before ``image_url``.
+    """
+    if not image:
+        return None
+    url = image.url
+    # Force HTTPS for Cloudinary URLs
+    if url.startswith('http://'):
+        url = url.replace('http://', 'https://', 1)
+    return url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--servers", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--authors", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    authors = [create_user(f"bench_images{i}") for i in range(args.authors)]
+    Account.objects.filter(owner__in=authors).update(image="image/upload/v1746801234/Avatars/avatar_k2x9qa.jpg")
+    channel = create_channel(authors[0], "bench-images")
+    for i in range(args.servers - 1):
+        Server.objects.create(name=f"bench-images{i}", owner=authors[0].account, category=channel.server.category)
+    conversation = ConversationModel.objects.create(channel=channel)
+    Messages.objects.bulk_create([
+        Messages(conversation=conversation, sender=authors[i % args.authors], content=f"message {i}")
+        for i in range(args.messages)
+    ])
+    servers = list(
+        Server.objects.select_related("owner", "category").prefetch_related("channel_server").with_member_summary()
+    )
+    rows = list(Messages.objects.filter(conversation=conversation).values(*MESSAGE_VALUES))
+
+    paths = {
+        "server list": (len(servers), lambda: ServerSerializer(servers, many=True).data),
+        "message page": (len(rows), lambda: row_payloads(rows)),
+    }
+    for name, (count, serialize) in paths.items():
+        shared = timed(serialize, repeat=args.repeat)
+        with mock.patch("server.serializers.image_url", legacy_image_url), \
+                mock.patch("webchat.payloads.image_url", legacy_image_url):
+            legacy = timed(serialize, repeat=args.repeat)
+        report(
+            f"{name} ({count} rows)",
+            [
+                ("CloudinaryField.url per row", f"{legacy / count * 1e6:.1f} us"),
+                ("memoized image_url per row", f"{shared / count * 1e6:.1f} us"),
+                ("speedup", f"{legacy / shared:.1f}x"),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark message history serialization.
+
+Builds one page of messages from a handful of authors and compares the
+nested ``MessageSerializer`` against the ``values()`` fast path used by
+``MessageViewSet.list``, both for serialization alone and end to end
+(query, serialize and render to JSON).
+
+Usage:
+    python -m benchmarks.bench_message_serializer [--messages 100] [--authors 10]
+"""
+
+import argparse
+
+from benchmarks.utils import create_channel, create_user, report, setup_django, timed
+
+setup_django()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from webchat.models import ConversationModel, Messages  # noqa: E402
+from webchat.payloads import (MESSAGE_VALUES, compact_payloads,  # noqa: E402
+                              message_payloads, row_payloads)
+from webchat.serializers import MessageSerializer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--authors", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    authors = [create_user(f"bench_author{i}") for i in range(args.authors)]
+    channel = create_channel(authors[0], "bench-history")
+    conversation = ConversationModel.objects.create(channel=channel)
+    Messages.objects.bulk_create([
+        Messages(
+            conversation=conversation,
+            sender=authors[i % args.authors],
+            content=f"message number {i}, anyone up for a game tonight?",
+        )
+        for i in range(args.messages)
+    ])
+    messages = Messages.objects.filter(conversation__channel=channel).order_by("id")
+
+    instances = list(messages.select_related("sender__account"))
+    rows = list(messages.values(*MESSAGE_VALUES))
+    assert row_payloads(rows) == message_payloads(instances)
+
+    renderer = JSONRenderer()
+    paths = {
+        "MessageSerializer": (
+            lambda: MessageSerializer(instances, many=True).data,
+            lambda: renderer.render(
+                MessageSerializer(messages.select_related("sender__account"), many=True).data
+            ),
+        ),
+        "values() payloads": (
+            lambda: row_payloads(rows),
+            lambda: renderer.render(row_payloads(messages.values(*MESSAGE_VALUES))),
+        ),
+        "values() compact": (
+            lambda: compact_payloads(row_payloads(rows)),
+            lambda: renderer.render(compact_payloads(row_payloads(messages.values(*MESSAGE_VALUES)))),
+        ),
+    }
+
+    baseline = None
+    for name, (serialize, end_to_end) in paths.items():
+        serialize_time = timed(serialize, repeat=args.repeat)
+        total_time = timed(end_to_end, repeat=args.repeat)
+        size = len(renderer.render(serialize()))
+        if baseline is None:
+            baseline = (serialize_time, total_time)
+        report(
+            f"{name} ({args.messages} messages, {args.authors} authors)",
+            [
+                ("serialize page", f"{serialize_time * 1000:.2f} ms"),
+                ("query + serialize + render", f"{total_time * 1000:.2f} ms"),
+                ("rendered bytes", size),
+                ("serialize speedup", f"{baseline[0] / serialize_time:.1f}x"),
+                ("end to end speedup", f"{baseline[1] / total_time:.1f}x"),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark JSON against MessagePack for chat frames.
+
+Encodes realistic ChatConsumer frames (single messages of various sizes,
+write-behind acknowledgements and coalesced batches) in both formats and
+reports the encode CPU time and wire size per message.
+
+Usage:
+    python -m benchmarks.bench_wire_formats [--iterations 20000]
+"""
+
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta, timezone
+
+import msgpack
+
+from benchmarks.utils import report
+
+STARTED = datetime(2025, 5, 9, 14, 36, tzinfo=timezone.utc)
+AVATAR = "https://res.cloudinary.com/pingme/image/upload/v1746801234/Avatars/avatar_k2x9qa.jpg"
+
+
+def new_message(index, content):
+    """
+    Build a ``new_message`` payload shaped like the ChatConsumer's.
+    """
+    timestamp = (STARTED + timedelta(seconds=index)).isoformat()
+    return {
+        "id": 1_000_000 + index,
+        "user": {"id": 4200 + index % 7, "username": f"member{index % 7}", "image_url": AVATAR},
+        "content": content,
+        "timestamp_created": timestamp,
+        "timestamp_updated": timestamp,
+    }
+
+
+#: Frames as the consumer sends them, with how many messages each carries.
+FRAMES = {
+    "short message": ({"message": new_message(1, "lol")}, 1),
+    "typical message": (
+        {"message": new_message(2, "anyone up for a game tonight? thinking around 9pm")}, 1
+    ),
+    "long message": ({"message": new_message(3, "lorem ipsum dolor sit amet " * 40)}, 1),
+    "unicode message": ({"message": new_message(4, "ça marche 👍 終わった 🎉")}, 1),
+    "persisted ack": ({"persisted": {f"p1a2b3c4d-{i}": 1_000_000 + i for i in range(5)}}, 5),
+    "batch of 20": (
+        {"messages": [new_message(i, f"message number {i} in a busy room") for i in range(20)]}, 20
+    ),
+}
+
+
+def json_encode(frame):
+    return json.dumps(frame)
+
+
+def msgpack_encode(frame):
+    return msgpack.packb(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, (frame, messages) in FRAMES.items():
+        rows = []
+        for label, encode in (("json", json_encode), ("msgpack", msgpack_encode)):
+            seconds = min(timeit.repeat(lambda: encode(frame), number=args.iterations, repeat=3))
+            size = len(encode(frame).encode() if label == "json" else encode(frame))
+            per_message = seconds / args.iterations / messages * 1e6
+            rows.append((f"{label} encode / message", f"{per_message:.2f} µs"))
+            rows.append((f"{label} bytes / message", f"{size / messages:.1f}"))
+        report(name, rows)
+
+
+if __name__ == "__main__":
+    main()
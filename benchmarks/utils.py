@@ -0,0 +1,110 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Boots Django against a throwaway SQLite test database and an in-memory
+channel layer, so the benchmarks run without Redis or Postgres.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    """
+    Configure Django for benchmarking and create a fresh test database.
+
+    Returns:
+        str: The name of the created test database.
+    """
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ping_me_api.settings")
+    os.environ.setdefault("DEV", "1")
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+    os.environ.setdefault("CLOUDINARY_CLOUD_NAME", "benchmark")
+
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+    }
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    return connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def create_user(username):
+    """
+    Create a user (and, through the post_save signal, its account).
+
+    Args:
+        username (str): The username for the new user.
+
+    Returns:
+        User: The created user.
+    """
+    from django.contrib.auth import get_user_model
+
+    return get_user_model().objects.create_user(username=username, password="benchmark")
+
+
+def create_channel(owner, name):
+    """
+    Create a server owned by ``owner`` with a single channel in it.
+
+    Args:
+        owner (User): The user owning the server and channel.
+        name (str): The channel name, also used for the server and category.
+
+    Returns:
+        Channel: The created channel.
+    """
+    from server.models import Channel, Server, ServerCategory
+
+    category, _ = ServerCategory.objects.get_or_create(name=f"{name}-category")
+    server = Server.objects.create(name=f"{name}-server", owner=owner.account, category=category)
+    server.members.add(owner.account)
+    return Channel.objects.create(name=name, server=server, owner=owner.account)
+
+
+def timed(func, repeat=5):
+    """
+    Run a callable several times and return the best wall-clock time.
+
+    Args:
+        func (callable): The zero-argument callable to time.
+        repeat (int): How many runs to take the best of.
+
+    Returns:
+        float: The fastest run in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(title, rows):
+    """
+    Print a small aligned results table.
+
+    Args:
+        title (str): The table heading.
+        rows (list[tuple]): ``(label, value)`` pairs.
+    """
+    print(f"\n{title}")
+    print("-" * len(title))
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print(f"{label.ljust(width)}  {value}")
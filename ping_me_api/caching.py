@@ -0,0 +1,97 @@
+"""
+Version counters and ETags for conditional GETs.
+
+Each cached resource has a version counter in the Django cache, bumped by
+model signals whenever the data behind it changes. Views build an ETag from
+the versions (never from the response body), so a request whose
+``If-None-Match`` still matches is answered with ``304 Not Modified`` before
+anything is queried or serialized.
+
+A counter that is missing (never set, or evicted) starts again from the
+current time in microseconds. It can therefore never come back to a value an
+earlier ETag was built from.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def version_key(kind, ident):
+    """
+    Return the cache key of a version counter.
+
+    Args:
+        kind (str): What the counter versions, e.g. ``"conversation"``.
+        ident: The ID of the versioned object.
+
+    Returns:
+        str: The cache key.
+    """
+    return f"version_{kind}_{ident}"
+
+
+def fresh_version():
+    """
+    Returns:
+        int: A starting value larger than any earlier counter could reach.
+    """
+    return time.time_ns() // 1000
+
+
+def get_versions(keys):
+    """
+    Read several version counters, starting any that are missing.
+
+    Args:
+        keys (list[str]): The counters' cache keys.
+
+    Returns:
+        list[int]: The versions, in the same order as ``keys``.
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, fresh_version(), None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def bump_versions(keys):
+    """
+    Advance version counters once the current transaction commits.
+
+    Bumping after the commit means a reader can never pair the new version
+    with data from before the change.
+
+    Args:
+        keys (Iterable[str]): The counters' cache keys.
+    """
+    keys = list(keys)
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, fresh_version(), None)
+
+    if keys:
+        transaction.on_commit(bump)
+
+
+def make_etag(*parts):
+    """
+    Build a strong ETag from versions and anything else the response varies on.
+
+    Args:
+        *parts: Values that together identify one rendering of the resource.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
@@ -0,0 +1,100 @@
+"""
+Sparse fieldsets and expansion control for serializers.
+
+``?fields=id,name`` limits a response to the listed fields, and
+``?expand=channel_server`` picks which of a serializer's expandable fields
+(nested relations, listed in ``Meta.expandable_fields``) are included.
+Without either parameter every field is returned as before, and a name the
+serializer doesn't have is answered with a 400. Views read the remaining
+field names back from the serializer to skip loading relations nobody asked
+for.
+"""
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+def query_list(request, name):
+    """
+    Parse a comma-separated query parameter.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        name (str): The parameter name.
+
+    Returns:
+        set[str] or None: The listed names, or None if the parameter is absent.
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+
+def fieldset_params(request):
+    """
+    Normalize the ``fields`` and ``expand`` parameters for cache keys and ETags.
+
+    Renderings that differ only in other parameters, or in the order or
+    repetition of the listed names, normalize the same.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        tuple: The sorted ``fields`` and ``expand`` names, each None when
+        the parameter is absent.
+    """
+    return tuple(
+        None if names is None else tuple(sorted(names))
+        for names in (query_list(request, "fields"), query_list(request, "expand"))
+    )
+
+
+class SparseFieldsetsMixin:
+    """
+    Serializer mixin dropping the fields a read request didn't ask for.
+
+    Fields are kept if ``fields`` lists them, or all of them when it isn't
+    given. An expandable field listed in ``expand`` is always kept; once
+    ``expand`` is given, the expandable fields it doesn't list are dropped
+    unless ``fields`` names them. Writes always get every field.
+    """
+
+    def get_fields(self):
+        """
+        Return the serializer's fields, less those the request left out.
+
+        Returns:
+            dict: The remaining fields by name.
+
+        Raises:
+            ValidationError: If ``fields`` names a field the serializer
+                doesn't have, or ``expand`` one that isn't expandable.
+        """
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return fields
+        wanted = query_list(request, "fields")
+        expand = query_list(request, "expand")
+        expandable = getattr(self.Meta, "expandable_fields", ())
+        unknown = {}
+        if wanted is not None and wanted - fields.keys():
+            unknown["fields"] = wanted - fields.keys()
+        if expand is not None and expand - set(expandable):
+            unknown["expand"] = expand - set(expandable)
+        if unknown:
+            raise ValidationError({
+                param: f"Unknown field names: {', '.join(sorted(names))}." for param, names in unknown.items()
+            })
+        for name in list(fields):
+            if name in expandable and expand is not None and name in expand:
+                continue
+            if wanted is not None:
+                keep = name in wanted
+            else:
+                keep = name not in expandable or expand is None
+            if not keep:
+                del fields[name]
+        return fields
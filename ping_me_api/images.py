@@ -0,0 +1,71 @@
+"""
+HTTPS delivery URLs for Cloudinary images.
+
+Every serializer and payload builder showing an image goes through
+``image_url``. It formats the secure URL straight from the stored public ID,
+version and format, and memoizes it in a bounded LRU cache. A server list or
+message page mostly repeats the same few images (default icons, the avatars
+of the handful of people talking), so most rows cost a dictionary lookup
+instead of a URL build and an ``http://`` rewrite.
+
+Images can also be delivered resized to one of IMAGE_WIDTHS, cropped to fill,
+for clients picking a size per display density.
+"""
+
+from functools import lru_cache
+
+import cloudinary
+from cloudinary.models import CloudinaryField
+from cloudinary.utils import cloudinary_url
+
+#: Most delivery URLs kept memoized; the least recently used are evicted.
+URL_CACHE_SIZE = 4096
+
+#: Widths, in pixels, of the resized variants ``image_url`` can deliver.
+IMAGE_WIDTHS = (64, 128, 256, 512)
+
+# Parses stored values that haven't been through the database yet, e.g. a
+# field default that is still a bare public ID string.
+_parser = CloudinaryField()
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _delivery_url(cloud_name, public_id, format, version, resource_type, type, width):
+    """
+    Format and memoize one delivery URL.
+
+    Every argument is part of the memo key; ``cloud_name`` keeps URLs built
+    before a configuration change from being served after it.
+    """
+    options = {"format": format, "version": version, "resource_type": resource_type, "type": type}
+    if width:
+        options.update(width=width, crop="fill")
+    return cloudinary_url(public_id, secure=True, **options)[0]
+
+
+def image_url(image, width=None):
+    """
+    Build the HTTPS delivery URL of a stored image.
+
+    Args:
+        image (CloudinaryResource or str): The image as loaded from a
+            CloudinaryField, or a stored value not yet loaded as one.
+        width (int): One of IMAGE_WIDTHS to deliver a resized variant, or
+            None for the original.
+
+    Returns:
+        str or None: The URL, or None if there is no image.
+
+    Raises:
+        ValueError: If ``width`` isn't one of IMAGE_WIDTHS.
+    """
+    if not image:
+        return None
+    if width is not None and width not in IMAGE_WIDTHS:
+        raise ValueError(f"Unsupported image width {width}; use one of {IMAGE_WIDTHS}.")
+    if isinstance(image, str):
+        image = _parser.parse_cloudinary_resource(image)
+    return _delivery_url(
+        cloudinary.config().cloud_name, image.public_id, image.format, image.version,
+        image.resource_type or "image", image.type, width,
+    )
@@ -142,6 +142,25 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache for ETag version counters, hot windows, rate-limit buckets and the
+# write-behind registry. These must be shared by every worker process, so the
+# cache lives in Redis; without REDIS_URL (local dev, tests) a single process
+# uses memory, with room for more than the default 300 entries.
+if redis_url:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": redis_url,
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+    }
+
 WSGI_APPLICATION = "ping_me_api.wsgi.application"
 ASGI_APPLICATION = "ping_me_api.asgi.application"
 
@@ -219,6 +238,34 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }   
 
+# Logging: webchat diagnostics (sender snapshots, write-behind flushes) are
+# logged at DEBUG, set WEBCHAT_LOG_LEVEL=DEBUG to see them
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "webchat": {
+            "handlers": ["console"],
+            "level": os.environ.get("WEBCHAT_LOG_LEVEL", "WARNING"),
+        },
+    },
+}
+
+# Webchat settings (see webchat/conf.py for the defaults)
+WEBCHAT = {
+    "WRITE_BEHIND": os.environ.get("WEBCHAT_WRITE_BEHIND") == "true",
+    "WRITE_BEHIND_BATCH_SIZE": int(os.environ.get("WEBCHAT_WRITE_BEHIND_BATCH_SIZE", 200)),
+    "WRITE_BEHIND_FLUSH_INTERVAL": float(os.environ.get("WEBCHAT_WRITE_BEHIND_FLUSH_INTERVAL", 0.25)),
+    "COALESCE_WINDOW_MS": int(os.environ.get("WEBCHAT_COALESCE_WINDOW_MS", 0)),
+    "RATE_LIMIT_STORE": os.environ.get("WEBCHAT_RATE_LIMIT_STORE", "memory"),
+    "HOT_WINDOW_SIZE": int(os.environ.get("WEBCHAT_HOT_WINDOW_SIZE", 100)),
+    # Leave at 0 under daphne (the Procfile server), see webchat/conf.py.
+    "OUTBOUND_QUEUE_SIZE": int(os.environ.get("WEBCHAT_OUTBOUND_QUEUE_SIZE", 0)),
+}
+
 # REST Registration settings
 REST_REGISTRATION = {
     "REGISTER_VERIFICATION_ENABLED": True,
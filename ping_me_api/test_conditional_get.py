@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from ping_me_api.caching import make_etag
+from ping_me_api.testing import PingMeTestCase
+from server.models import Channel, Server, ServerCategory
+from webchat.models import ConversationModel, Messages
+
+
+class TestConditionalGet(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user('etaguser')
+        self.other = self.make_user('etagother')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = ServerCategory.objects.create(name='etagcat')
+        self.server = Server.objects.create(name='etagserver', owner=self.user.account, category=self.category)
+        self.server.members.add(self.user.account)
+        self.channel = Channel.objects.create(name='etag', server=self.server, owner=self.user.account)
+        self.conversation = ConversationModel.objects.create(channel=self.channel)
+        self.message = Messages.objects.create(conversation=self.conversation, sender=self.user, content='hello')
+
+    def get(self, url, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, params, **headers)
+
+    def assertRevalidates(self, url, change, **params):
+        etag = self.get(url, **params)['ETag']
+        self.assertEqual(self.get(url, etag, **params).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.get(url, etag, **params)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unchanged_history_is_not_modified(self):
+        etag = self.get('/api/messages/', channel_id=self.channel.id)['ETag']
+        # The conversation ID is cached, so revalidating queries nothing.
+        with self.assertNumQueries(0):
+            response = self.get('/api/messages/', etag, channel_id=self.channel.id)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_history_pages_have_their_own_etags(self):
+        etag = self.get('/api/messages/', channel_id=self.channel.id)['ETag']
+        response = self.get('/api/messages/', etag, channel_id=self.channel.id, compact='true')
+        self.assertEqual(response.status_code, 200)
+
+    def test_history_changes_invalidate_the_etag(self):
+        url, channel_id = '/api/messages/', self.channel.id
+        self.assertRevalidates(url, lambda: Messages.objects.create(
+            conversation=self.conversation, sender=self.user, content='new'), channel_id=channel_id)
+        self.assertRevalidates(url, lambda: self.client.patch(
+            f'/api/messages/{self.message.id}/', {'content': 'edited'}, format='json'), channel_id=channel_id)
+        self.assertRevalidates(url, lambda: self.client.patch(
+            '/api/account/edit_me/', {'username': 'renamed'}, format='json'), channel_id=channel_id)
+        self.assertRevalidates(url, lambda: self.client.delete(
+            f'/api/messages/{self.message.id}/'), channel_id=channel_id)
+
+    def test_only_shown_profiles_invalidate_the_etags(self):
+        def rename(user):
+            user.account.username = 'renamed'
+            user.account.save()
+
+        urls = [('/api/messages/', {'channel_id': self.channel.id}), ('/api/account/my_servers/', {})]
+        etags = [self.get(url, **params)['ETag'] for url, params in urls]
+        with self.captureOnCommitCallbacks(execute=True):
+            get_user_model().objects.create(username='newcomer')
+            rename(self.other)
+        for (url, params), etag in zip(urls, etags):
+            self.assertEqual(self.get(url, etag, **params).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.server.members.add(self.other.account)
+        self.assertRevalidates('/api/account/my_servers/', lambda: rename(self.other))
+        self.assertRevalidates('/api/messages/', lambda: rename(self.user), channel_id=self.channel.id)
+
+    def test_unchanged_server_list_is_not_modified(self):
+        url = '/api/account/my_servers/'
+        etag = self.get(url)['ETag']
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_server_list_etag_is_built_once_per_request(self):
+        with mock.patch('account.views.make_etag', wraps=make_etag) as built:
+            self.get('/api/account/my_servers/')
+        self.assertEqual(built.call_count, 1)
+
+    def test_server_list_changes_invalidate_the_etag(self):
+        url = '/api/account/my_servers/'
+        joined = Server.objects.create(name='joined', owner=self.other.account, category=self.category)
+        self.assertRevalidates(url, lambda: joined.members.add(self.user.account))
+        self.assertRevalidates(url, lambda: joined.members.add(self.other.account))
+        self.assertRevalidates(url, lambda: Channel.objects.create(
+            name='more', server=self.server, owner=self.user.account))
+        self.assertRevalidates(url, lambda: self.user.account.servers.remove(joined))
+        self.assertRevalidates(url, lambda: self.server.delete())
@@ -0,0 +1,37 @@
+from cloudinary import CloudinaryResource
+from django.test import SimpleTestCase
+
+from ping_me_api.images import _delivery_url, image_url
+from ping_me_api.testing import configure_cloudinary
+
+
+class TestImageUrls(SimpleTestCase):
+    def setUp(self):
+        configure_cloudinary()
+        self.image = CloudinaryResource(
+            public_id='Avatars/avatar_k2x9qa', format='jpg', version='1746801234',
+            type='upload', resource_type='image',
+        )
+
+    def test_matches_the_rewritten_resource_url(self):
+        self.assertEqual(image_url(self.image), self.image.url.replace('http://', 'https://', 1))
+        self.assertTrue(image_url(self.image).startswith('https://'))
+
+    def test_stored_values_and_missing_images(self):
+        url = image_url('default_server_uxlg3a.jpg')
+        self.assertTrue(url.startswith('https://'))
+        self.assertTrue(url.endswith('/image/upload/default_server_uxlg3a.jpg'))
+        self.assertIsNone(image_url(None))
+        self.assertIsNone(image_url(''))
+
+    def test_resized_variants(self):
+        self.assertIn('/c_fill,w_128/', image_url(self.image, width=128))
+        with self.assertRaises(ValueError):
+            image_url(self.image, width=100)
+
+    def test_urls_are_memoized(self):
+        _delivery_url.cache_clear()
+        for _ in range(3):
+            image_url(self.image)
+        info = _delivery_url.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
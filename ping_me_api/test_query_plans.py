@@ -0,0 +1,204 @@
+import re
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from account.models import Account
+from ping_me_api.testing import PingMeTestCase
+from server.models import Channel, Server, ServerCategory
+from webchat.consumer import ChatConsumer
+from webchat.conversations import resolve_conversation_id
+from webchat.models import ConversationModel, Messages
+from webchat.readstate import advance_read_state
+
+#: Tables the hot queries must never read in full.
+HOT_TABLES = (
+    'webchat_messages',
+    'webchat_messages_archive',
+    'webchat_conversationmodel',
+    'webchat_readstate',
+    'server_server',
+    'server_server_members',
+    'server_servercategory',
+    'server_channel',
+)
+
+
+class TestHotQueryPlans(PingMeTestCase):
+    """
+    Seed a large dataset and check the hot queries are answered from indexes.
+
+    Every SELECT a code path issues is captured and explained, so a dropped
+    or unusable index shows up as a full table scan (or, for ordered history
+    pages, as an extra sort step).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        users = User.objects.bulk_create([User(username=f'planuser{i}') for i in range(200)])
+        accounts = Account.objects.bulk_create([Account(owner=user, username=user.username) for user in users])
+        categories = ServerCategory.objects.bulk_create([ServerCategory(name=f'plancat{i}') for i in range(20)])
+        servers = Server.objects.bulk_create([
+            Server(name=f'planserver{i}', owner=accounts[i % 200], category=categories[i % 20])
+            for i in range(400)
+        ])
+        Membership = Server.members.through
+        Membership.objects.bulk_create(
+            [Membership(server=servers[i % 400], account=accounts[i * 7 % 200]) for i in range(4000)],
+            ignore_conflicts=True,
+        )
+        channels = Channel.objects.bulk_create([
+            Channel(name=f'planchannel{i}', server=servers[i % 400], owner=accounts[i % 200])
+            for i in range(800)
+        ])
+        conversations = ConversationModel.objects.bulk_create(
+            [ConversationModel(channel=channels[i]) for i in range(50)]
+        )
+        start = timezone.now()
+        Messages.objects.bulk_create([
+            Messages(
+                conversation=conversations[i % 50], sender=users[i % 200], content=f'message {i}',
+                timestamp_created=start + timedelta(seconds=i),
+            )
+            for i in range(10000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = users[0]
+        cls.account = accounts[0]
+        cls.conversation = conversations[3]
+        cls.channel_id = str(channels[3].id)
+        cls.anchor = cls.conversation.messages.order_by('id')[100]
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Judge whether an index can serve the query, not whether the
+                # planner prefers it for a test-sized table.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertIndexedQueries(self, queries, ordered_table=None):
+        selects = [query['sql'] for query in queries if query['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            plan = self.explain(sql)
+            # An ordered page may walk an index in order, stopping at its LIMIT.
+            walk = r'(?! USING (COVERING )?INDEX)' if ordered_table and ' LIMIT ' in sql else ''
+            for table in HOT_TABLES:
+                if connection.vendor == 'postgresql':
+                    self.assertNotIn(f'Seq Scan on {table}', plan, f'{sql}\n{plan}')
+                else:
+                    self.assertIsNone(re.search(rf'\bSCAN {table}\b{walk}', plan), f'{sql}\n{plan}')
+            if ordered_table and ordered_table in sql:
+                sort = 'Sort' if connection.vendor == 'postgresql' else 'TEMP B-TREE FOR ORDER BY'
+                self.assertNotIn(sort, plan, f'{sql}\n{plan}')
+
+    def test_message_history_pages(self):
+        for params in ({}, {'before': self.anchor.id}, {'after': self.anchor.id}, {'around': self.anchor.id}):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/messages/', {'channel_id': self.channel_id, **params})
+            self.assertEqual(response.status_code, 200)
+            self.assertIndexedQueries(queries, ordered_table='webchat_messages')
+
+    def test_latest_messages(self):
+        Server.objects.get(channel_server__id=self.channel_id).members.add(self.account)
+        for params in ({}, {'channel_ids': ','.join(str(i) for i in range(1, 60))}):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/messages/latest/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(self.channel_id, response.json())
+            self.assertIndexedQueries(queries, ordered_table='webchat_messages')
+
+    def test_message_search(self):
+        server_id = Channel.objects.get(id=self.channel_id).server_id
+        for params in (
+            {'channel_id': self.channel_id},
+            {'server_id': server_id},
+            {'channel_id': self.channel_id, 'before': self.anchor.id},
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/messages/search/', {'q': 'message', **params})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()['results'])
+            # The full-text index drives the query, so only its matches get sorted.
+            self.assertIndexedQueries(queries)
+
+    def test_unread_counts(self):
+        advance_read_state(self.account.id, self.conversation.id, self.anchor.id)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/messages/unread/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexedQueries(queries, ordered_table='webchat_messages')
+
+    def test_chat_consumer_queries(self):
+        consumer = ChatConsumer()
+        consumer.user = self.user
+        consumer.channel_id = self.channel_id
+        consumer.sender = {'id': self.user.id, 'username': self.user.username, 'image_url': None}
+        with CaptureQueriesContext(connection) as queries:
+            consumer.conversation_id = resolve_conversation_id(self.channel_id)
+            async_to_sync(consumer.save_message)('hello')
+            async_to_sync(consumer.missed_messages)(self.anchor.id)
+        self.assertIndexedQueries(queries)
+
+    def test_server_list_filters(self):
+        for params in (
+            {'category': 'plancat3'},
+            {'by_user': 'true'},
+            {'mutual_with': '8', 'with_num_members': 'true'},
+            {'by_serverid': '5'},
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/servers/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertIndexedQueries(queries)
+
+    def test_server_list_pages(self):
+        for query in ('qty=5', 'qty=5&category=plancat3'):
+            url = f'/api/servers/?{query}'
+            for _ in range(2):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIndexedQueries(queries, ordered_table='server_server"')
+                url = response.json()['next']
+
+    def test_mutual_servers(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/servers/mutual/', {'user_id': 8})
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexedQueries(queries)
+
+    def test_server_members_pages(self):
+        server = Server.objects.order_by('id')[7]
+        server.members.add(*Account.objects.order_by('id')[:10])
+        url = f'/api/servers/{server.id}/members/?limit=3'
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), 3)
+            self.assertIndexedQueries(queries, ordered_table='server_server_members')
+            url = response.json()['next']
+
+    @skipUnlessDBFeature('can_introspect_foreign_keys')
+    def test_members_covering_index_exists(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'server_server_members')
+        self.assertEqual(constraints['server_members_account_server_idx']['columns'], ['account_id', 'server_id'])
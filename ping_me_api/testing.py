@@ -0,0 +1,78 @@
+"""
+Shared scaffolding for the test suites.
+
+API and socket tests all need the same environment: a Cloudinary cloud name
+so image URLs can be built, empty caches (versions, hot windows, rate-limit
+buckets and the per-process conversation lookup) and an in-process channel
+layer instead of Redis. PingMeTestCase and PingMeTransactionTestCase set it
+up for each test, and ``make_user`` creates users loaded the way the API
+sees them.
+"""
+
+import cloudinary
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from webchat.conversations import conversation_cache
+
+#: Channel layer for tests, so no Redis server is needed.
+IN_MEMORY_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def configure_cloudinary():
+    """
+    Give Cloudinary a cloud name if the environment didn't, so image URLs
+    can be built without credentials.
+    """
+    if not cloudinary.config().cloud_name:
+        cloudinary.config(cloud_name="pingme-test")
+
+
+class PingMeTestMixin:
+    """
+    Per-test setup shared by PingMeTestCase and PingMeTransactionTestCase.
+    """
+
+    def setUp(self):
+        """
+        Configure Cloudinary and start from empty caches.
+        """
+        super().setUp()
+        configure_cloudinary()
+        cache.clear()
+        conversation_cache.clear()
+
+    def make_user(self, username):
+        """
+        Create a user, and through the signal its account.
+
+        No password is set, as hashing one is slow and the tests
+        authenticate with ``force_authenticate`` or a socket scope. The
+        user is reloaded with its account, the way the JWT middleware loads
+        it, so the avatar is a CloudinaryResource.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            User: The new user, with ``account`` loaded.
+        """
+        User = get_user_model()
+        user = User.objects.create(username=username)
+        return User.objects.select_related("account").get(pk=user.pk)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+class PingMeTestCase(PingMeTestMixin, TestCase):
+    """
+    TestCase with the shared test environment.
+    """
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+class PingMeTransactionTestCase(PingMeTestMixin, TransactionTestCase):
+    """
+    TransactionTestCase with the shared test environment, for socket tests
+    whose database work runs on other threads.
+    """
@@ -0,0 +1,27 @@
+"""
+Management command recounting the stored member and channel counts of servers.
+
+The counts are kept up to date by signal handlers; changes that bypass the
+ORM signals (raw SQL, bulk deletes of memberships) leave them drifted, and
+running this puts them right.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from server.models import Server, server_counts
+
+
+class Command(BaseCommand):
+    help = "Recount the member and channel counts stored on servers and fix any that drifted."
+
+    def handle(self, *args, **options):
+        counts = server_counts()
+        drifted = list(
+            Server.objects.annotate(actual_members=counts["member_count"], actual_channels=counts["channel_count"])
+            .exclude(member_count=F("actual_members"), channel_count=F("actual_channels"))
+            .values_list("id", flat=True)
+        )
+        if drifted:
+            Server.objects.filter(pk__in=drifted).update(**server_counts())
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {len(drifted)} servers."))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0008_alter_channel_type"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="servercategory",
+            name="name",
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        # The auto-created members table only has a unique (server_id,
+        # account_id) index plus single-column ones, so "servers of this
+        # account" lookups go back to the table for server_id. This covering
+        # index answers them from the index alone.
+        migrations.RunSQL(
+            "CREATE INDEX server_members_account_server_idx "
+            "ON server_server_members (account_id, server_id)",
+            "DROP INDEX server_members_account_server_idx",
+        ),
+    ]
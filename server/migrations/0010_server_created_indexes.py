@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0004_alter_account_image"),
+        ("server", "0009_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="server",
+            index=models.Index(fields=["created_at", "id"], name="server_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="server",
+            index=models.Index(
+                fields=["category", "created_at", "id"],
+                name="server_category_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 08:39
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_servers(apps, schema_editor):
+    """
+    Fill in the member and channel counts of the existing servers.
+    """
+    Server = apps.get_model("server", "Server")
+    Channel = apps.get_model("server", "Channel")
+    memberships = Server.members.through.objects.filter(server=OuterRef("pk")).order_by().values("server")
+    channels = Channel.objects.filter(server=OuterRef("pk")).order_by().values("server")
+    Server.objects.update(
+        member_count=Coalesce(Subquery(memberships.annotate(count=Count("id")).values("count")), 0),
+        channel_count=Coalesce(Subquery(channels.annotate(count=Count("id")).values("count")), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0010_server_created_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="server",
+            name="channel_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="server",
+            name="member_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_servers, migrations.RunPython.noop),
+    ]
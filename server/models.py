@@ -7,8 +7,12 @@ server categories, individual servers, and channels within servers.
 
 from cloudinary.models import CloudinaryField
 from django.db import models
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 
 from account.models import Account
+from ping_me_api.caching import bump_versions, version_key
 
 
 class ServerCategory(models.Model):
@@ -23,7 +27,7 @@ class ServerCategory(models.Model):
         updated_at (datetime): Timestamp of last update.
     """
 
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     description = models.TextField(blank=True, null=True)
     category_image = CloudinaryField(
         "image", folder="ServerCategories", default="default_server_uxlg3a.jpg"
@@ -53,6 +57,50 @@ class ServerCategory(models.Model):
         return self.name
 
 
+#: Server columns maintained by the count signal handlers.
+COUNTER_FIELDS = ("member_count", "channel_count")
+
+#: Members listed with each server in server lists; the full list is paged
+#: through ``/api/servers/{id}/members/``.
+MEMBER_SAMPLE_SIZE = 10
+
+
+class ServerQuerySet(models.QuerySet):
+    """
+    QuerySet for servers, with the member summary used by server lists.
+    """
+
+    def with_member_summary(self, user=None, sample=True, membership=True):
+        """
+        Summarize each server's members instead of loading all of them.
+
+        Annotates ``is_member`` (whether ``user`` is a member) and
+        ``member_sample_cutoff``, the account ID of the server's
+        MEMBER_SAMPLE_SIZE-th member (None if it has fewer), from which
+        ``attach_member_samples`` loads the member samples. The member count
+        is stored on the server itself.
+
+        Args:
+            user (User): The requesting user, if authenticated.
+            sample (bool): Whether to annotate the sample cutoff.
+            membership (bool): Whether to annotate ``is_member``.
+
+        Returns:
+            QuerySet: The annotated servers.
+        """
+        memberships = Server.members.through.objects.filter(server=OuterRef("pk"))
+        annotations = {}
+        if sample:
+            annotations["member_sample_cutoff"] = Subquery(
+                memberships.order_by("account_id").values("account_id")[MEMBER_SAMPLE_SIZE - 1:MEMBER_SAMPLE_SIZE]
+            )
+        if membership:
+            annotations["is_member"] = (
+                Exists(memberships.filter(account__owner=user)) if user is not None else Value(False)
+            )
+        return self.annotate(**annotations)
+
+
 class Server(models.Model):
     """
     Model representing a server.
@@ -68,6 +116,8 @@ class Server(models.Model):
         created_at (datetime): Timestamp of creation.
         updated_at (datetime): Timestamp of last update.
         is_private (bool): Whether the server is private.
+        member_count (int): Number of members, kept up to date by signals.
+        channel_count (int): Number of channels, kept up to date by signals.
     """
 
     name = models.CharField(max_length=100)
@@ -92,6 +142,36 @@ class Server(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_private = models.BooleanField(default=True)
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+    channel_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ServerQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Discovery pages walk servers newest first, overall or within a
+            # category (see ServerCursorPagination).
+            models.Index(fields=["created_at", "id"], name="server_created_idx"),
+            models.Index(fields=["category", "created_at", "id"], name="server_category_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Save the server without writing back its member and channel counts.
+
+        The counts are only changed by the F() updates of the signal
+        handlers, so a stale in-memory copy must not overwrite them.
+
+        Args:
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+        """
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS
+            ]
+        super(Server, self).save(*args, **kwargs)
 
     def __str__(self):
         """
@@ -158,3 +238,260 @@ class Channel(models.Model):
             str: The channel name.
         """
         return self.name
+
+
+def attach_member_samples(servers, chunk_size=100):
+    """
+    Load the member samples of servers annotated by ``with_member_summary``.
+
+    Each server's sample is read as an index range of its memberships up to
+    its ``member_sample_cutoff``, so the rows read don't grow with the
+    servers' populations. The samples are stored in ``member_sample``.
+
+    Args:
+        servers (Iterable[Server]): The servers; those without the
+            annotation are left alone.
+        chunk_size (int): Servers whose samples are read per query.
+    """
+    servers = [server for server in servers if hasattr(server, "member_sample_cutoff")]
+    samples = {server.id: [] for server in servers}
+    for start in range(0, len(servers), chunk_size):
+        ranges = Q()
+        for server in servers[start:start + chunk_size]:
+            if server.member_sample_cutoff is None:
+                ranges |= Q(server_id=server.id)
+            else:
+                ranges |= Q(server_id=server.id, account_id__lte=server.member_sample_cutoff)
+        memberships = (
+            Server.members.through.objects.filter(ranges)
+            .select_related("account")
+            .order_by("server_id", "account_id")
+        )
+        for membership in memberships:
+            samples[membership.server_id].append(membership.account)
+    for server in servers:
+        server.member_sample = samples[server.id]
+
+
+def server_counts():
+    """
+    Count the members and channels of the outer server from their rows.
+
+    Returns:
+        dict: Expressions for ``member_count`` and ``channel_count``, for
+        ``annotate`` or ``update`` on a Server queryset.
+    """
+    memberships = Server.members.through.objects.filter(server=OuterRef("pk")).order_by().values("server")
+    channels = Channel.objects.filter(server=OuterRef("pk")).order_by().values("server")
+    return {
+        "member_count": Coalesce(Subquery(memberships.annotate(count=Count("id")).values("count")), 0),
+        "channel_count": Coalesce(Subquery(channels.annotate(count=Count("id")).values("count")), 0),
+    }
+
+
+def server_version_key(server_id):
+    """
+    Returns:
+        str: The version counter of a server's serialized representation.
+    """
+    return version_key("server", server_id)
+
+
+def membership_version_key(user_id):
+    """
+    Returns:
+        str: The version counter of the set of servers a user belongs to.
+    """
+    return version_key("memberships", user_id)
+
+
+def bump_membership_versions(account_ids):
+    """
+    Invalidate the server lists of the given accounts' users.
+
+    Args:
+        account_ids (Iterable[int]): The accounts whose memberships changed.
+    """
+    owner_ids = Account.objects.filter(id__in=account_ids).values_list("owner_id", flat=True)
+    bump_versions(membership_version_key(owner_id) for owner_id in owner_ids)
+
+
+def bump_server_version(sender, instance, **kwargs):
+    """
+    Signal handler to invalidate a saved server's ETags.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (Server): The saved server.
+        **kwargs: Additional keyword arguments.
+    """
+    bump_versions([server_version_key(instance.id)])
+
+
+def bump_server_members_versions(sender, instance, **kwargs):
+    """
+    Signal handler to invalidate the server lists of a deleted server's members.
+
+    Cascaded membership rows don't send ``m2m_changed``, so this runs before
+    the server (and its memberships) are deleted.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (Server): The server about to be deleted.
+        **kwargs: Additional keyword arguments.
+    """
+    bump_membership_versions(instance.members.values_list("id", flat=True))
+
+
+def bump_member_servers_versions(sender, instance, **kwargs):
+    """
+    Signal handler to invalidate the servers a deleted account was a member of.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (Account): The account about to be deleted.
+        **kwargs: Additional keyword arguments.
+    """
+    bump_versions(server_version_key(server_id) for server_id in instance.servers.values_list("id", flat=True))
+
+
+def bump_channel_server_version(sender, instance, **kwargs):
+    """
+    Signal handler to invalidate the server of a saved or deleted channel.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (Channel): The channel.
+        **kwargs: Additional keyword arguments.
+    """
+    bump_versions([server_version_key(instance.server_id)])
+
+
+def bump_category_server_versions(sender, instance, **kwargs):
+    """
+    Signal handler to invalidate every server of a renamed category.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (ServerCategory): The saved category.
+        **kwargs: Additional keyword arguments.
+    """
+    server_ids = Server.objects.filter(category=instance).values_list("id", flat=True)
+    bump_versions(server_version_key(server_id) for server_id in server_ids)
+
+
+def bump_members_changed_versions(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal handler to invalidate servers and server lists when members change.
+
+    Handles both directions of the relation: ``server.members`` (the instance
+    is a Server) and ``account.servers`` (the instance is an Account).
+
+    Args:
+        sender (Model): The intermediate model for Server.members.
+        instance (Server or Account): The instance whose relation changed.
+        action (str): The m2m_changed action.
+        reverse (bool): True when changed from the Account side.
+        pk_set (set[int]): The primary keys added or removed, if any.
+        **kwargs: Additional keyword arguments.
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        server_ids = pk_set if pk_set is not None else instance.servers.values_list("id", flat=True)
+        account_ids = [instance.pk]
+    else:
+        server_ids = [instance.pk]
+        account_ids = pk_set if pk_set is not None else instance.members.values_list("id", flat=True)
+    bump_versions(server_version_key(server_id) for server_id in server_ids)
+    bump_membership_versions(list(account_ids))
+
+
+def update_member_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal handler to keep ``Server.member_count`` in step with the members.
+
+    Handles both directions of the relation, like
+    ``bump_members_changed_versions``. Additions are counted with F() since
+    ``pk_set`` only holds the rows actually inserted; removals recount the
+    servers, since ``pk_set`` also holds IDs that weren't members.
+
+    Args:
+        sender (Model): The intermediate model for Server.members.
+        instance (Server or Account): The instance whose relation changed.
+        action (str): The m2m_changed action.
+        reverse (bool): True when changed from the Account side.
+        pk_set (set[int]): The primary keys added or removed, if any.
+        **kwargs: Additional keyword arguments.
+    """
+    if action == "post_add" and pk_set:
+        if reverse:
+            Server.objects.filter(pk__in=pk_set).update(member_count=F("member_count") + 1)
+        else:
+            Server.objects.filter(pk=instance.pk).update(member_count=F("member_count") + len(pk_set))
+    elif action == "post_remove" and pk_set:
+        server_ids = pk_set if reverse else [instance.pk]
+        Server.objects.filter(pk__in=server_ids).update(member_count=server_counts()["member_count"])
+    elif action == "pre_clear" and reverse:
+        instance.servers.update(member_count=F("member_count") - 1)
+    elif action == "post_clear" and not reverse:
+        Server.objects.filter(pk=instance.pk).update(member_count=0)
+
+
+def decrement_member_servers_counts(sender, instance, **kwargs):
+    """
+    Signal handler to uncount a deleted account from its servers.
+
+    Cascaded membership rows don't send ``m2m_changed``, so this runs before
+    the account (and its memberships) are deleted.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (Account): The account about to be deleted.
+        **kwargs: Additional keyword arguments.
+    """
+    instance.servers.update(member_count=F("member_count") - 1)
+
+
+def count_created_channel(sender, instance, created, **kwargs):
+    """
+    Signal handler to count a created channel on its server.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (Channel): The saved channel.
+        created (bool): Whether the channel was just created.
+        **kwargs: Additional keyword arguments.
+    """
+    if created:
+        Server.objects.filter(pk=instance.server_id).update(channel_count=F("channel_count") + 1)
+
+
+def uncount_deleted_channel(sender, instance, **kwargs):
+    """
+    Signal handler to uncount a deleted channel from its server.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (Channel): The deleted channel.
+        **kwargs: Additional keyword arguments.
+    """
+    Server.objects.filter(pk=instance.server_id).update(channel_count=F("channel_count") - 1)
+
+
+# Connect the version signal handlers so server ETags follow every change
+# that shows up in a serialized server or in a user's server list.
+post_save.connect(bump_server_version, sender=Server)
+pre_delete.connect(bump_server_members_versions, sender=Server)
+pre_delete.connect(bump_member_servers_versions, sender=Account)
+post_save.connect(bump_channel_server_version, sender=Channel)
+post_delete.connect(bump_channel_server_version, sender=Channel)
+post_save.connect(bump_category_server_versions, sender=ServerCategory)
+m2m_changed.connect(bump_members_changed_versions, sender=Server.members.through)
+
+# Connect the count signal handlers so the stored counts follow every
+# membership and channel change.
+m2m_changed.connect(update_member_counts, sender=Server.members.through)
+pre_delete.connect(decrement_member_servers_counts, sender=Account)
+post_save.connect(count_created_channel, sender=Channel)
+post_delete.connect(uncount_deleted_channel, sender=Channel)
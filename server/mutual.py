@@ -0,0 +1,113 @@
+"""
+Servers two users have in common, for profile popovers.
+
+The intersection is read off the ``(account_id, server_id)`` index of the
+membership table: one user's server IDs are looked up for each of the other
+user's, without touching the servers or joining the membership table to
+itself twice. Results are cached per unordered pair of users, keyed by both
+users' membership versions, so joining or leaving a server (or its deletion)
+invalidates them and nothing else does.
+"""
+
+from django.core.cache import cache
+from rest_framework.exceptions import ValidationError
+
+from ping_me_api.caching import get_versions, make_etag
+
+from .models import Server, membership_version_key, server_version_key
+from .serializers import ServerCardSerializer
+
+#: Seconds a pair's mutual server IDs and cards stay cached.
+MUTUAL_CACHE_TIMEOUT = 3600
+
+
+def get_other_user_id(request):
+    """
+    Read the other user's ID from the ``user_id`` query parameter.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        int: The other user's ID.
+
+    Raises:
+        ValidationError: If the parameter is missing or not an ID.
+    """
+    try:
+        return int(request.query_params["user_id"])
+    except (KeyError, ValueError):
+        raise ValidationError({"user_id": "A user ID is required."})
+
+
+def mutual_server_ids(user_id, other_id):
+    """
+    Return the IDs of the servers both users are members of.
+
+    Args:
+        user_id (int): One user's ID.
+        other_id (int): The other user's ID.
+
+    Returns:
+        list[int]: The shared server IDs, in ascending order.
+    """
+    low, high = sorted((user_id, other_id))
+    versions = get_versions([membership_version_key(low), membership_version_key(high)])
+    key = f"mutual_server_ids_{low}_{high}_{versions[0]}_{versions[1]}"
+    server_ids = cache.get(key)
+    if server_ids is None:
+        Membership = Server.members.through
+        server_ids = list(
+            Membership.objects.filter(
+                account__owner_id=low,
+                server_id__in=Membership.objects.filter(account__owner_id=high).values("server_id"),
+            )
+            .order_by("server_id")
+            .values_list("server_id", flat=True)
+        )
+        cache.set(key, server_ids, MUTUAL_CACHE_TIMEOUT)
+    return server_ids
+
+
+def mutual_servers_etag(user_id, other_id):
+    """
+    Build the ETag of a pair's mutual server cards without serializing them.
+
+    Combines the shared server IDs with those servers' versions, so renamed
+    or re-iconed servers change it too.
+
+    Args:
+        user_id (int): One user's ID.
+        other_id (int): The other user's ID.
+
+    Returns:
+        str: The ETag.
+    """
+    server_ids = mutual_server_ids(user_id, other_id)
+    versions = get_versions([server_version_key(server_id) for server_id in server_ids])
+    return make_etag("mutual_servers", sorted((user_id, other_id)), server_ids, versions)
+
+
+def mutual_server_cards(user_id, other_id):
+    """
+    Return the serialized cards of the servers both users are members of.
+
+    The cards are cached with their ETag, per unordered pair of users.
+
+    Args:
+        user_id (int): One user's ID.
+        other_id (int): The other user's ID.
+
+    Returns:
+        list[dict]: The server cards, in server ID order.
+    """
+    low, high = sorted((user_id, other_id))
+    key = f"mutual_servers_{low}_{high}"
+    etag = mutual_servers_etag(low, high)
+    cached = cache.get(key)
+    if cached is not None and cached["etag"] == etag:
+        return cached["data"]
+    servers = Server.objects.filter(id__in=mutual_server_ids(low, high)).order_by("id")
+    data = ServerCardSerializer(servers, many=True).data
+    cache.set(key, {"etag": etag, "data": data}, MUTUAL_CACHE_TIMEOUT)
+    return data
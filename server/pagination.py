@@ -0,0 +1,34 @@
+"""
+Pagination for the server app.
+
+Server discovery is paged newest first with a cursor on ``(created_at, id)``,
+so pages stay stable while servers are created and are read in index order.
+Member lists are paged over the membership rows by account ID with a cursor,
+so every page is a range scan of the ``(server_id, account_id)`` index
+however large the server is.
+"""
+
+from rest_framework.pagination import CursorPagination
+
+
+class MemberCursorPagination(CursorPagination):
+    """
+    Cursor pagination for a server's memberships, in account ID order.
+    """
+    ordering = "account_id"
+    page_size = 50
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+
+class ServerCursorPagination(CursorPagination):
+    """
+    Cursor pagination for server lists, newest first.
+
+    The page size is read from the ``qty`` parameter the server list already
+    took, and is always capped, anonymous requests included.
+    """
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "qty"
+    max_page_size = 100
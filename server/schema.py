@@ -9,9 +9,27 @@ for use with drf_spectacular.
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter, extend_schema
 
-from .serializers import (ChannelSerializer, ServerCategorySerializer,
+from .serializers import (ChannelSerializer, MemberSerializer,
+                          ServerCardSerializer, ServerCategorySerializer,
                           ServerSerializer)
 
+# --- Sparse Fieldset Parameters ---
+FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        name="fields",
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        description="Comma-separated fields to return, e.g. id,name,member_count (default all)",
+    ),
+    OpenApiParameter(
+        name="expand",
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        description="Comma-separated nested relations to include (channel_server, members_sample); "
+                    "when given, the others are left out",
+    ),
+]
+
 # --- Server List Endpoint ---
 server_list_docs = extend_schema(
     responses=ServerSerializer(many=True),
@@ -26,7 +44,13 @@ server_list_docs = extend_schema(
             name="qty",
             type=OpenApiTypes.INT,
             location=OpenApiParameter.QUERY,
-            description="Number of servers to retrieve",
+            description="Servers per page (default 20, at most 100)",
+        ),
+        OpenApiParameter(
+            name="cursor",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Cursor from the next/previous link of a previous page",
         ),
         OpenApiParameter(
             name="by_user",
@@ -46,14 +70,17 @@ server_list_docs = extend_schema(
             location=OpenApiParameter.QUERY,
             description="Include server by ID",
         ),
+        *FIELDSET_PARAMETERS,
     ],
-    description="List servers with optional filters such as category, user, and member count.",
+    description="List servers newest first, a page at a time, with optional filters such as "
+                "category, user, and member count.",
     tags=["Server"],
 )
 
 # --- Server Retrieve Endpoint ---
 server_retrieve_docs = extend_schema(
     responses=ServerSerializer,
+    parameters=FIELDSET_PARAMETERS,
     description="Retrieve a single server by its ID.",
     tags=["Server"],
 )
@@ -80,9 +107,48 @@ server_remove_member_docs = extend_schema(
     tags=["Server"],
 )
 
+# --- Server Members Endpoint ---
+server_members_docs = extend_schema(
+    responses=MemberSerializer(many=True),
+    parameters=[
+        OpenApiParameter(
+            name="limit",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Members per page (default 50, at most 100)",
+        ),
+        OpenApiParameter(
+            name="cursor",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Cursor from the next/previous link of a previous page",
+        ),
+    ],
+    description="List a server's members a page at a time, in account ID order. "
+                "Server lists only carry the member count and a small sample.",
+    tags=["Server"],
+)
+
+# --- Mutual Servers Endpoint ---
+server_mutual_docs = extend_schema(
+    responses=ServerCardSerializer(many=True),
+    parameters=[
+        OpenApiParameter(
+            name="user_id",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            required=True,
+            description="The user to find shared servers with",
+        ),
+    ],
+    description="List the servers the authenticated user shares with another user, as small cards.",
+    tags=["Server"],
+)
+
 # --- ServerCategory List/Retrieve Endpoints ---
 server_category_list_docs = extend_schema(
     responses=ServerCategorySerializer(many=True),
+    parameters=FIELDSET_PARAMETERS[:1],
     description="List all server categories.",
     tags=["ServerCategory"],
 )
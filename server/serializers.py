@@ -5,12 +5,17 @@ Provides serializers for channels, servers, and server categories, including
 custom fields and methods for image URLs and member counts.
 """
 
-from django.db import transaction
+from django.db import models, transaction
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from rest_framework.permissions import AllowAny
 
-from .models import Channel, Server, ServerCategory
+from account.models import Account
+from ping_me_api.fieldsets import SparseFieldsetsMixin
+from ping_me_api.images import image_url
+
+from .models import (MEMBER_SAMPLE_SIZE, Channel, Server, ServerCategory,
+                     attach_member_samples)
 
 
 class ChannelSerializer(serializers.ModelSerializer):
@@ -25,19 +30,89 @@ class ChannelSerializer(serializers.ModelSerializer):
         read_only_fields = ["owner"]
 
 
-class ServerSerializer(serializers.ModelSerializer):
+class MemberSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a server member, with just what a member list shows.
+    """
+    image_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Account
+        fields = ["id", "username", "image_url"]
+
+    @extend_schema_field(serializers.CharField(allow_null=True))
+    def get_image_url(self, obj):
+        """
+        Retrieve the URL of the member's profile image.
+
+        Args:
+            obj (Account): The member's account.
+
+        Returns:
+            str or None: The image URL, if available.
+        """
+        return image_url(obj.image)
+
+
+class ServerCardSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the small server cards shown in profile popovers.
+    """
+    server_icon_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Server
+        fields = ["id", "name", "server_icon_url", "member_count"]
+
+    @extend_schema_field(serializers.CharField(allow_null=True))
+    def get_server_icon_url(self, obj):
+        """
+        Retrieve the URL of the server's icon.
+
+        Args:
+            obj (Server): The server instance.
+
+        Returns:
+            str or None: The icon URL, if available.
+        """
+        return image_url(obj.server_icon)
+
+
+class ServerListSerializer(serializers.ListSerializer):
+    """
+    List serializer for servers, loading their member samples in one query.
+    """
+
+    def to_representation(self, data):
+        """
+        Serialize the servers after attaching their member samples.
+
+        Args:
+            data (QuerySet or list): The servers.
+
+        Returns:
+            list: The serialized servers.
+        """
+        servers = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        attach_member_samples(servers)
+        return super().to_representation(servers)
+
+
+class ServerSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Serializer for the Server model.
 
-    Includes additional fields for member count, related channels, owner info,
-    category name, and server image URLs.
+    Includes additional fields for member count, a sample of the members,
+    related channels, owner info, category name, and server image URLs. The
+    full member list is paged through the server's members endpoint.
     """
     num_members = serializers.SerializerMethodField()
     channel_server = ChannelSerializer(many=True, read_only=True)
-    owner_id = serializers.ReadOnlyField(source="owner.id")
+    owner_id = serializers.ReadOnlyField()
     owner = serializers.ReadOnlyField(source="owner.owner.username")
     category_name = serializers.CharField(source="category.name", read_only=True)
-    members = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    members_sample = serializers.SerializerMethodField()
+    is_member = serializers.SerializerMethodField()
 
     @extend_schema_field(serializers.CharField(allow_null=True))
     def get_server_image_urls(self, obj):
@@ -52,17 +127,9 @@ class ServerSerializer(serializers.ModelSerializer):
         """
         image_urls = {}
         if obj.server_icon:
-            url = obj.server_icon.url
-            # Force HTTPS for Cloudinary URLs
-            if url.startswith('http://'):
-                url = url.replace('http://', 'https://', 1)
-            image_urls["server_icon_url"] = url
+            image_urls["server_icon_url"] = image_url(obj.server_icon)
         if obj.banner_image:
-            url = obj.banner_image.url
-            # Force HTTPS for Cloudinary URLs
-            if url.startswith('http://'):
-                url = url.replace('http://', 'https://', 1)
-            image_urls["banner_image_url"] = url
+            image_urls["banner_image_url"] = image_url(obj.banner_image)
         return image_urls
 
     server_image_urls = serializers.SerializerMethodField()
@@ -71,7 +138,68 @@ class ServerSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Server
-        fields = "__all__"
+        exclude = ["members"]
+        list_serializer_class = ServerListSerializer
+        expandable_fields = ("channel_server", "members_sample")
+
+    def load_related(self, queryset, user=None):
+        """
+        Load what the serialized fields need for a server queryset, and no more.
+
+        Relations and annotations behind fields that ``fields``/``expand``
+        left out are skipped, so the queries shrink with the payload.
+
+        Args:
+            queryset (QuerySet): The servers to serialize.
+            user (User): The requesting user, if authenticated.
+
+        Returns:
+            QuerySet: The queryset with the needed joins, prefetches and
+            annotations.
+        """
+        fields = self.fields
+        related = [path for name, path in (("owner", "owner__owner"), ("category_name", "category")) if name in fields]
+        if related:
+            queryset = queryset.select_related(*related)
+        if "channel_server" in fields:
+            queryset = queryset.prefetch_related("channel_server")
+        return queryset.with_member_summary(
+            user, sample="members_sample" in fields, membership="is_member" in fields
+        )
+
+    @extend_schema_field(MemberSerializer(many=True))
+    def get_members_sample(self, obj):
+        """
+        Get the first few members of the server, in account ID order.
+
+        Args:
+            obj (Server): The server instance.
+
+        Returns:
+            list: At most MEMBER_SAMPLE_SIZE serialized members.
+        """
+        sample = getattr(obj, "member_sample", None)
+        if sample is None:
+            sample = obj.members.order_by("id")[:MEMBER_SAMPLE_SIZE]
+        return MemberSerializer(sample, many=True, context=self.context).data
+
+    @extend_schema_field(serializers.BooleanField())
+    def get_is_member(self, obj):
+        """
+        Check whether the requesting user is a member of the server.
+
+        Args:
+            obj (Server): The server instance.
+
+        Returns:
+            bool: True if the requesting user is a member.
+        """
+        if hasattr(obj, "is_member"):
+            return obj.is_member
+        request = self.context.get("request")
+        if request is None or not request.user.is_authenticated:
+            return False
+        return obj.members.filter(owner=request.user).exists()
 
     @extend_schema_field(serializers.IntegerField(allow_null=True))
     def get_num_members(self, obj):
@@ -107,7 +235,7 @@ class ServerSerializer(serializers.ModelSerializer):
         return data
 
 
-class ServerCategorySerializer(serializers.ModelSerializer):
+class ServerCategorySerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Serializer for the ServerCategory model.
 
@@ -128,14 +256,7 @@ class ServerCategorySerializer(serializers.ModelSerializer):
         Returns:
             str or None: The image URL, if available.
         """
-        image = getattr(obj, "category_image", None)
-        if image and hasattr(image, "url"):
-            url = image.url
-            # Force HTTPS for Cloudinary URLs
-            if url.startswith('http://'):
-                url = url.replace('http://', 'https://', 1)
-            return url
-        return None
+        return image_url(getattr(obj, "category_image", None))
 
     category_icon_url = serializers.SerializerMethodField()
     category_icon = serializers.ImageField(write_only=True, required=False)
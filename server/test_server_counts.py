@@ -0,0 +1,74 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from account.models import Account
+from ping_me_api.testing import PingMeTestCase
+from server.models import Channel, Server, ServerCategory
+
+
+class TestServerCounts(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.users = [User.objects.create(username=f'countuser{i}') for i in range(4)]
+        self.accounts = list(Account.objects.filter(owner__in=self.users).order_by('id'))
+        self.category = ServerCategory.objects.create(name='countcat')
+        self.server = Server.objects.create(name='counted', owner=self.accounts[0], category=self.category)
+        self.client = APIClient()
+
+    def counts(self, server=None):
+        server = Server.objects.get(pk=(server or self.server).pk)
+        return server.member_count, server.channel_count
+
+    def test_create_counts_owner_and_general_channel(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post('/api/servers/', {'name': 'fresh', 'category': self.category.id})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['member_count'], response.data['channel_count']), (1, 1))
+        self.assertEqual(self.counts(Server.objects.get(name='fresh')), (1, 1))
+
+    def test_member_changes_from_either_side(self):
+        self.server.members.add(*self.accounts[:3])
+        self.server.members.add(self.accounts[0])
+        self.assertEqual(self.counts(), (3, 0))
+        self.accounts[3].servers.add(self.server)
+        self.server.members.remove(self.accounts[1], self.accounts[1].pk + 100)
+        self.assertEqual(self.counts(), (3, 0))
+        self.accounts[2].servers.clear()
+        self.assertEqual(self.counts(), (2, 0))
+        self.users[3].delete()
+        self.assertEqual(self.counts(), (1, 0))
+        self.server.members.clear()
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_join_and_leave_endpoints(self):
+        self.client.force_authenticate(self.users[1])
+        url = f'/api/servers/{self.server.id}/'
+        self.client.post(url + 'add_member/')
+        self.client.post(url + 'add_member/')
+        self.assertEqual(self.counts(), (1, 0))
+        self.client.post(url + 'remove_member/')
+        self.client.post(url + 'remove_member/')
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_channel_changes_and_stale_saves(self):
+        stale = Server.objects.get(pk=self.server.pk)
+        channel = Channel.objects.create(name='one', server=self.server, owner=self.accounts[0])
+        Channel.objects.create(name='two', server=self.server, owner=self.accounts[0])
+        channel.delete()
+        self.server.members.add(self.accounts[1])
+        stale.name = 'renamed'
+        stale.save()
+        self.assertEqual(self.counts(), (1, 1))
+
+    def test_reconcile_command(self):
+        self.server.members.add(*self.accounts)
+        Channel.objects.create(name='one', server=self.server, owner=self.accounts[0])
+        Server.objects.filter(pk=self.server.pk).update(member_count=9, channel_count=0)
+        out = StringIO()
+        call_command('reconcile_server_counts', stdout=out)
+        self.assertIn('Reconciled 1 servers.', out.getvalue())
+        self.assertEqual(self.counts(), (4, 1))
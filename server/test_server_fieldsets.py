@@ -0,0 +1,82 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ping_me_api.testing import PingMeTestCase
+from server.models import Channel, Server, ServerCategory
+
+
+class TestServerFieldsets(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user('fielduser')
+        self.category = ServerCategory.objects.create(name='fieldcat')
+        for i in range(3):
+            server = Server.objects.create(name=f'field{i}', owner=self.user.account, category=self.category)
+            server.members.add(self.user.account)
+            Channel.objects.create(name='general', server=server, owner=self.user.account)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def servers(self, url='/api/servers/', **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return (data['results'] if 'results' in data else data), len(queries)
+
+    def test_fields_limit_payload_and_queries(self):
+        full, full_queries = self.servers()
+        cards, card_queries = self.servers(fields='id,name,member_count')
+        self.assertEqual([set(card) for card in cards], [{'id', 'name', 'member_count'}] * 3)
+        self.assertEqual([card['name'] for card in cards], [server['name'] for server in full])
+        self.assertLess(card_queries, full_queries)
+        self.assertIn('channel_server', full[0])
+        self.assertIn('members_sample', full[0])
+
+    def test_expand_picks_nested_relations(self):
+        servers, _ = self.servers(expand='channel_server')
+        self.assertIn('channel_server', servers[0])
+        self.assertNotIn('members_sample', servers[0])
+        self.assertIn('owner', servers[0])
+        servers, _ = self.servers(fields='id', expand='members_sample')
+        self.assertEqual(set(servers[0]), {'id', 'members_sample'})
+        self.assertEqual(len(servers[0]['members_sample']), 1)
+
+    def test_categories_and_my_servers(self):
+        categories, _ = self.servers('/api/categories/', fields='id,name')
+        self.assertEqual(set(categories[0]), {'id', 'name'})
+        mine, _ = self.servers('/api/account/my_servers/', fields='id,name')
+        self.assertEqual([set(server) for server in mine], [{'id', 'name'}] * 3)
+        full, _ = self.servers('/api/account/my_servers/')
+        self.assertIn('channel_server', full[0])
+        etags = {
+            self.client.get('/api/account/my_servers/', params)['ETag']
+            for params in ({}, {'fields': 'id,name'}, {'fields': 'id'})
+        }
+        self.assertEqual(len(etags), 3)
+
+    def test_my_servers_ignores_unrelated_params(self):
+        first = self.client.get('/api/account/my_servers/', {'fields': 'id,name'})
+        # Served from the entry the first request cached, under the same ETag.
+        with self.assertNumQueries(0):
+            responses = [
+                self.client.get('/api/account/my_servers/', params)
+                for params in ({'fields': 'name,id,id', 'utm': 'x'}, {'fields': 'id,name', 'v': '2'})
+            ]
+        for response in responses:
+            self.assertEqual(response['ETag'], first['ETag'])
+            self.assertEqual(response.json(), first.json())
+
+    def test_unknown_names_are_rejected(self):
+        for url in ('/api/servers/', '/api/account/my_servers/'):
+            response = self.client.get(url, {'fields': 'id,bogus', 'expand': 'owner,members_sample'})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {
+                'fields': 'Unknown field names: bogus.', 'expand': 'Unknown field names: owner.',
+            })
+
+    def test_writes_ignore_fields(self):
+        response = self.client.post('/api/servers/?fields=id', {'name': 'written', 'category': self.category.id})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIn('channel_server', response.data)
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ping_me_api.testing import PingMeTestCase
+from server.models import Server, ServerCategory
+
+
+class TestServerListPagination(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user('pageuser')
+        games = ServerCategory.objects.create(name='games')
+        music = ServerCategory.objects.create(name='music')
+        servers = Server.objects.bulk_create([
+            Server(name=f'page{i}', owner=self.user.account, category=games if i % 2 else music)
+            for i in range(105)
+        ])
+        # Pair up creation times so the ID breaks the ties.
+        now = timezone.now()
+        for i, server in enumerate(servers):
+            Server.objects.filter(pk=server.pk).update(created_at=now - timedelta(minutes=i // 2))
+        self.user.account.servers.add(*servers[:7])
+        self.client = APIClient()
+
+    def walk(self, url):
+        ids = []
+        while url:
+            page = self.client.get(url).json()
+            ids += [server['id'] for server in page['results']]
+            url = page['next']
+        return ids
+
+    def test_pages_walk_servers_newest_first(self):
+        ordered = list(Server.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/servers/?qty=10'), ordered)
+        games = list(
+            Server.objects.filter(category__name='games').order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self.walk('/api/servers/?qty=7&category=games'), games)
+
+    def test_pages_combine_with_member_filters(self):
+        self.client.force_authenticate(self.user)
+        page = self.client.get('/api/servers/', {'by_user': 'true', 'with_num_members': 'true', 'qty': 5}).json()
+        self.assertEqual(len(page['results']), 5)
+        self.assertEqual({server['num_members'] for server in page['results']}, {1})
+        self.assertEqual(len(self.walk(page['next'])), 2)
+
+    def test_anonymous_pages_are_bounded(self):
+        response = self.client.get('/api/servers/')
+        self.assertEqual(len(response.json()['results']), 20)
+        response = self.client.get('/api/servers/', {'qty': 1000})
+        self.assertEqual(len(response.json()['results']), 100)
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from account.models import Account
+from ping_me_api.testing import PingMeTestCase
+from server.models import MEMBER_SAMPLE_SIZE, Server, ServerCategory
+
+
+class TestServerMembers(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        users = [User.objects.create(username=f'member{i}') for i in range(25)]
+        self.user = users[0]
+        self.accounts = list(Account.objects.filter(owner__in=users).order_by('id'))
+        category = ServerCategory.objects.create(name='membercat')
+        self.big = Server.objects.create(name='big', owner=self.accounts[0], category=category)
+        self.big.members.add(*self.accounts)
+        self.small = Server.objects.create(name='small', owner=self.accounts[1], category=category)
+        self.small.members.add(*self.accounts[1:3])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_list_summarizes_members(self):
+        response = self.client.get('/api/servers/', {'category': 'membercat'})
+        self.assertEqual(response.status_code, 200)
+        servers = {server['name']: server for server in response.json()['results']}
+        self.assertNotIn('members', servers['big'])
+        self.assertEqual(servers['big']['member_count'], 25)
+        self.assertEqual(
+            [member['id'] for member in servers['big']['members_sample']],
+            [account.id for account in self.accounts[:MEMBER_SAMPLE_SIZE]],
+        )
+        self.assertEqual(servers['small']['member_count'], 2)
+        self.assertEqual(len(servers['small']['members_sample']), 2)
+        self.assertTrue(servers['big']['is_member'])
+        self.assertFalse(servers['small']['is_member'])
+
+    def test_server_list_queries_dont_grow_with_members(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/servers/', {'category': 'membercat'})
+        before = len(queries)
+        self.small.members.add(*self.accounts[3:])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/servers/', {'category': 'membercat'})
+        self.assertEqual(len(queries), before)
+        servers = {server['name']: server for server in response.json()['results']}
+        self.assertEqual(servers['small']['member_count'], 24)
+        self.assertEqual(len(servers['small']['members_sample']), MEMBER_SAMPLE_SIZE)
+
+    def test_members_endpoint_pages_through_every_member(self):
+        url = f'/api/servers/{self.big.id}/members/?limit=10'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page['results']), 10)
+            seen += [member['id'] for member in page['results']]
+            url = page['next']
+        self.assertEqual(seen, [account.id for account in self.accounts])
+        self.assertEqual(set(page['results'][0]), {'id', 'username', 'image_url'})
+
+    def test_num_members_counts_every_member(self):
+        response = self.client.get('/api/servers/', {'by_user': 'true', 'with_num_members': 'true'})
+        self.assertEqual(response.json()['results'][0]['num_members'], 25)
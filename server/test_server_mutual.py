@@ -0,0 +1,56 @@
+from rest_framework.test import APIClient
+
+from ping_me_api.testing import PingMeTestCase
+from server.models import Server, ServerCategory
+
+
+class TestMutualServers(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol = [
+            self.make_user(name) for name in ('mutualalice', 'mutualbob', 'mutualcarol')
+        ]
+        category = ServerCategory.objects.create(name='mutualcat')
+        self.servers = [
+            Server.objects.create(name=f'mutual{i}', owner=self.alice.account, category=category) for i in range(4)
+        ]
+        for server in self.servers[:3]:
+            server.members.add(self.alice.account)
+        for server in self.servers[1:]:
+            server.members.add(self.bob.account)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def mutual(self, user, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/servers/mutual/', {'user_id': user.id}, **headers)
+
+    def test_lists_shared_servers_as_cards(self):
+        response = self.mutual(self.bob)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([card['name'] for card in response.json()], ['mutual1', 'mutual2'])
+        self.assertEqual(set(response.json()[0]), {'id', 'name', 'server_icon_url', 'member_count'})
+        self.assertEqual(response.json()[0]['member_count'], 2)
+        self.assertEqual(self.mutual(self.carol).json(), [])
+
+    def test_cached_per_unordered_pair(self):
+        cards = self.mutual(self.bob).json()
+        self.client.force_authenticate(self.bob)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.mutual(self.alice).json(), cards)
+
+    def test_membership_and_server_changes_invalidate(self):
+        etag = self.mutual(self.bob)['ETag']
+        self.assertEqual(self.mutual(self.bob, etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.servers[0].members.add(self.bob.account)
+        response = self.mutual(self.bob, etag)
+        self.assertEqual([card['name'] for card in response.json()], ['mutual0', 'mutual1', 'mutual2'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.servers[1].name = 'renamed'
+            self.servers[1].save()
+        self.assertEqual(self.mutual(self.bob).json()[1]['name'], 'renamed')
+
+    def test_requires_a_user_id(self):
+        self.assertEqual(self.client.get('/api/servers/mutual/').status_code, 400)
+        self.assertEqual(self.client.get('/api/servers/mutual/', {'user_id': 'bob'}).status_code, 400)
@@ -5,7 +5,10 @@ Provides API endpoints for servers, server categories, and channels,
 including member management and custom filtering.
 """
 
-from django.db.models import Count
+from django.db.models import F
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
@@ -14,8 +17,24 @@ from rest_framework.response import Response
 from ping_me_api.permissions import IsOwnerOrReadOnly
 
 from .models import Channel, Server, ServerCategory
-from .serializers import (ChannelSerializer, ServerCategorySerializer,
-                          ServerSerializer)
+from .mutual import (get_other_user_id, mutual_server_cards, mutual_server_ids,
+                     mutual_servers_etag)
+from .pagination import MemberCursorPagination, ServerCursorPagination
+from .serializers import (ChannelSerializer, MemberSerializer,
+                          ServerCategorySerializer, ServerSerializer)
+
+
+def mutual_etag(request, *args, **kwargs):
+    """
+    Build the ETag of the servers the user shares with another user.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        str: The ETag.
+    """
+    return mutual_servers_etag(request.user.id, get_other_user_id(request))
 
 
 class ServerViewSet(viewsets.ModelViewSet):
@@ -24,9 +43,10 @@ class ServerViewSet(viewsets.ModelViewSet):
 
     Supports creation, listing, filtering, and member management for servers.
     """
-    queryset = Server.objects.select_related("owner", "category").prefetch_related("members", "channel_server").all()
+    queryset = Server.objects.select_related("owner", "category").prefetch_related("channel_server").all()
     serializer_class = ServerSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = ServerCursorPagination
 
     def perform_create(self, serializer):
         """
@@ -48,6 +68,9 @@ class ServerViewSet(viewsets.ModelViewSet):
             owner=self.request.user.account,
             description="General text chat",
         )
+        # Reload the counts the signal handlers just updated, and the default
+        # images as Cloudinary resources rather than their public IDs.
+        server.refresh_from_db()
         return server
 
     def get_queryset(self):
@@ -55,28 +78,33 @@ class ServerViewSet(viewsets.ModelViewSet):
         Optionally filters the queryset based on query parameters.
 
         Supports filtering by category, user, mutual membership, server ID,
-        and annotating with member counts.
+        and annotating with member counts. Lists are paged newest first by
+        ServerCursorPagination, with ``qty`` as the page size. Only the
+        relations behind the requested ``fields``/``expand`` are loaded.
 
         Returns:
             QuerySet: The filtered queryset.
         """
-        queryset = Server.objects.select_related("owner", "category").prefetch_related("members", "channel_server").all()
         request = self.request
+        user = request.user if request.user.is_authenticated else None
+        queryset = self.get_serializer().load_related(Server.objects.all(), user)
         category = request.query_params.get("category")
-        qty = request.query_params.get("qty")
         by_user = request.query_params.get("by_user") == "true"
         mutual_with = request.query_params.get("mutual_with")
         by_serverid = request.query_params.get("by_serverid")
         with_num_members = request.query_params.get("with_num_members") == "true"
 
         if category:
-            queryset = queryset.filter(category__name=category)
+            # Filter on the category's ID rather than joining on its name, so
+            # the page is read in order off the (category, created_at, id) index.
+            category_ids = ServerCategory.objects.filter(name=category).values_list("id", flat=True)
+            queryset = queryset.filter(category_id__in=list(category_ids))
         if by_user and request.user.is_authenticated:
             queryset = queryset.filter(members=request.user.id)
         if mutual_with and request.user.is_authenticated:
             try:
                 other_user_id = int(mutual_with)
-                queryset = queryset.filter(members=request.user.id).filter(members=other_user_id)
+                queryset = queryset.filter(id__in=mutual_server_ids(request.user.id, other_user_id))
             except ValueError:
                 return queryset.none()
         if by_serverid:
@@ -85,12 +113,7 @@ class ServerViewSet(viewsets.ModelViewSet):
             except ValueError:
                 return queryset.none()
         if with_num_members:
-            queryset = queryset.annotate(num_members=Count("members"))
-        if qty:
-            try:
-                queryset = queryset[: int(qty)]
-            except ValueError:
-                pass
+            queryset = queryset.annotate(num_members=F("member_count"))
         return queryset
 
     def get_serializer_context(self):
@@ -138,6 +161,49 @@ class ServerViewSet(viewsets.ModelViewSet):
         server.members.remove(account)
         return Response({'status': 'member removed'})
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @method_decorator(condition(etag_func=mutual_etag))
+    def mutual(self, request):
+        """
+        List the servers the authenticated user shares with another user.
+
+        Returns small server cards, cached per pair of users and answered
+        with ``304 Not Modified`` while the ETag still matches.
+
+        Args:
+            request (Request): The HTTP request, with the other user's
+                ``user_id``.
+
+        Returns:
+            Response: The shared servers' cards.
+        """
+        return Response(mutual_server_cards(request.user.id, get_other_user_id(request)))
+
+    @action(detail=True, methods=['get'])
+    def members(self, request, pk=None):
+        """
+        List the server's members a page at a time, in account ID order.
+
+        Args:
+            request (Request): The HTTP request, optionally with ``limit`` and
+                the ``cursor`` from a previous page.
+            pk (int): The primary key of the server.
+
+        Returns:
+            Response: A page of members with next/previous cursor links.
+        """
+        server = get_object_or_404(Server, pk=pk)
+        self.check_object_permissions(request, server)
+        paginator = MemberCursorPagination()
+        # The accounts are loaded separately so the page reads straight off the
+        # (server_id, account_id) index without a sort.
+        memberships = Server.members.through.objects.filter(server=server).prefetch_related("account")
+        page = paginator.paginate_queryset(memberships, request, view=self)
+        serializer = MemberSerializer(
+            [membership.account for membership in page], many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
 
 class ServerCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
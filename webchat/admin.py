@@ -7,10 +7,13 @@ to allow management through the admin interface.
 
 from django.contrib import admin
 
-from .models import ConversationModel, Messages
+from .models import ConversationModel, Messages, ReadState
 
 # Register the ConversationModel with the admin site.
 admin.site.register(ConversationModel)
 
 # Register the Messages model with the admin site.
 admin.site.register(Messages)
+
+# Register the ReadState model with the admin site.
+admin.site.register(ReadState)
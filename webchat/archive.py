@@ -0,0 +1,64 @@
+"""
+Archive tier for messages on databases that can't partition them.
+
+On PostgreSQL ``webchat_messages`` is partitioned by month (see
+``partitions``), so no read needs routing. Elsewhere (SQLite in development)
+the ``archive_messages`` command moves messages older than a cutoff into
+``ArchivedMessage``. Everything left in Messages is newer than everything
+in the archive, so readers only go on to the archive where Messages runs out:
+history pages, search and channel previews do that with the querysets built
+here. The chat socket's replay and the unread counts only look at recent
+messages and read Messages alone; archived messages can't be edited or
+deleted.
+"""
+
+from django.db import connection, transaction
+
+from .models import ArchivedMessage, Messages
+
+#: Columns copied into the archive.
+ARCHIVED_FIELDS = ("id", "conversation_id", "sender_id", "content", "timestamp_created", "timestamp_updated")
+
+
+def archived_messages(**filters):
+    """
+    Return the archived messages matching the filters, if the archive is in use.
+
+    Args:
+        **filters: Lookups valid on Messages, e.g. ``conversation__channel_id``.
+
+    Returns:
+        QuerySet or None: The archived messages, or None on PostgreSQL.
+    """
+    if connection.vendor == "postgresql":
+        return None
+    return ArchivedMessage.objects.filter(**filters)
+
+
+def archive_messages(before, batch_size=1000):
+    """
+    Move the messages created before a cutoff into the archive.
+
+    Each batch is copied and deleted in one transaction, so a message is
+    always in exactly one of the two tables.
+
+    Args:
+        before (datetime): Messages created before this are archived.
+        batch_size (int): How many messages to move per transaction.
+
+    Returns:
+        int: How many messages were archived.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Messages.objects.filter(timestamp_created__lt=before)
+                .order_by("timestamp_created", "id")
+                .values(*ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rows:
+                return moved
+            ArchivedMessage.objects.bulk_create([ArchivedMessage(**row) for row in rows])
+            Messages.objects.filter(id__in=[row["id"] for row in rows]).delete()
+        moved += len(rows)
@@ -0,0 +1,69 @@
+"""
+Settings for the webchat app.
+
+Reads the optional ``WEBCHAT`` dictionary from the Django settings and falls
+back to the defaults defined here for any key it does not set.
+"""
+
+from django.conf import settings
+
+#: Default values for every supported ``WEBCHAT`` setting.
+DEFAULTS = {
+    # Broadcast messages straight away and persist them in batches.
+    "WRITE_BEHIND": False,
+    # Flush as soon as this many messages are waiting.
+    "WRITE_BEHIND_BATCH_SIZE": 200,
+    # Flush at least this often (seconds) while messages are waiting.
+    "WRITE_BEHIND_FLUSH_INTERVAL": 0.25,
+    # Give up on a message after this many failed flushes.
+    "WRITE_BEHIND_MAX_RETRIES": 5,
+    # Most messages waiting to be persisted; senders wait for a flush beyond.
+    "WRITE_BEHIND_MAX_PENDING": 10000,
+    # How many channel -> conversation mappings each process keeps.
+    "CONVERSATION_CACHE_SIZE": 10000,
+    # Gather a room's messages for this many milliseconds and fan them out
+    # as one event; 0 sends every message on its own.
+    "COALESCE_WINDOW_MS": 0,
+    # Fan out early once this many messages are gathered for a room.
+    "COALESCE_MAX_MESSAGES": 50,
+    # Most missed messages replayed to a socket that reconnects with ?since=.
+    "REPLAY_LIMIT": 500,
+    # Messages per second and burst allowed on one socket; a rate of 0 disables.
+    "SOCKET_RATE": 5,
+    "SOCKET_BURST": 10,
+    # Messages per second and burst allowed across all of a user's sockets.
+    "USER_RATE": 10,
+    "USER_BURST": 20,
+    # Where per-user buckets live: "memory" (per process) or "cache" (shared).
+    "RATE_LIMIT_STORE": "memory",
+    # Close the socket after this many rejected frames; 0 never closes.
+    "RATE_LIMIT_CLOSE_AFTER": 50,
+    # Frames a socket may have waiting to be written; 0 sends directly. Only
+    # useful on servers whose websocket send waits for the socket to drain
+    # (e.g. uvicorn). Daphne's send returns as soon as the frame is handed
+    # to Twisted, so under daphne the queue never fills; leave it off there.
+    "OUTBOUND_QUEUE_SIZE": 0,
+    # What to do when the outbound queue is full: "drop" or "disconnect".
+    "SLOW_CONSUMER_POLICY": "drop",
+    # Newest messages of each channel kept in the Django cache; 0 disables.
+    "HOT_WINDOW_SIZE": 100,
+    # Seconds a hot window (and a cached author) lives without being written.
+    "HOT_WINDOW_TTL": 300,
+    # Fraction of hot window hits checked against the database.
+    "HOT_WINDOW_VERIFY_RATE": 0.01,
+    # Unread counts stop at this many messages per channel (shown as "99+").
+    "UNREAD_COUNT_CAP": 100,
+}
+
+
+def webchat_setting(name):
+    """
+    Return a webchat setting, falling back to its default.
+
+    Args:
+        name (str): The setting name, e.g. ``"WRITE_BEHIND"``.
+
+    Returns:
+        The configured value or the default from DEFAULTS.
+    """
+    return getattr(settings, "WEBCHAT", {}).get(name, DEFAULTS[name])
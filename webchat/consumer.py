@@ -5,19 +5,54 @@ Defines the ChatConsumer for handling WebSocket connections, message broadcastin
 and message persistence in chat channels.
 """
 
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import JsonWebsocketConsumer
+import asyncio
+import logging
+from urllib.parse import parse_qs
+
+import msgpack
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .conf import webchat_setting
+from .conversations import conversation_cache, resolve_conversation_id
+from .fanout import room_coalescer
+from .hotwindow import hot_windows
+from .models import Messages
+from .payloads import message_payload, message_payloads
+from .persistence import WriteBehindFull, pending_messages, provisional_payload, write_behind
+from .profiles import sender_snapshot, user_group_name
+from .readstate import advance_read_state
+from .throttling import TokenBucket, bucket_store
+
+logger = logging.getLogger(__name__)
+
+#: Subprotocol a client offers to receive batched ``{"messages": [...]}`` frames.
+BATCH_SUBPROTOCOL = "pingme.batch.v1"
+
+#: Subprotocol a client offers to exchange MessagePack binary frames instead of JSON.
+MSGPACK_SUBPROTOCOL = "pingme.msgpack.v1"
 
-from .models import ConversationModel, Messages
+#: Subprotocols the consumer can negotiate; the client's first match wins.
+SUBPROTOCOLS = (MSGPACK_SUBPROTOCOL, BATCH_SUBPROTOCOL)
+
+#: Close code for a socket that kept sending over its rate limit.
+RATE_LIMITED_CLOSE_CODE = 4029
+
+#: Close code for a socket that could not keep up with its outbound frames.
+SLOW_CONSUMER_CLOSE_CODE = 4008
 
 User = get_user_model()
 
-class ChatConsumer(JsonWebsocketConsumer):
+class ChatConsumer(AsyncJsonWebsocketConsumer):
     """
     WebSocket consumer for handling chat messages in a channel.
 
     Handles connection, message receipt, broadcasting, and disconnect logic.
+    Runs natively on the event loop; only the ORM work is pushed onto the
+    database thread pool, so idle sockets do not hold a worker thread.
     """
 
     def __init__(self, *args, **kwargs):
@@ -26,106 +61,495 @@ class ChatConsumer(JsonWebsocketConsumer):
         """
         super().__init__(*args, **kwargs)
         self.channel_id = None
+        self.conversation_id = None
         self.user = None
+        self.sender = None
+        self.batch_frames = False
+        self.binary_frames = False
+        self.replayed_ids = set()
+        self.socket_bucket = None
+        self.rejected_frames = 0
+        self.outbound = None
+        self.outbound_writer = None
+        self.dropped_frames = 0
 
-    def connect(self):
+    async def connect(self):
         """
         Handle WebSocket connection.
 
         Extracts server and channel IDs from the URL, authenticates the user,
-        and joins the appropriate room group for message broadcasting.
+        resolves the channel's conversation (rejecting channels that don't
+        exist) and the sender's profile once for the socket's lifetime, and joins the room group for message
+        broadcasting plus the user's own group for profile updates.
+
+        Clients opt into batched frames by offering the ``pingme.batch.v1``
+        subprotocol or passing ``batch=true`` in the query string, and into
+        MessagePack binary frames by offering ``pingme.msgpack.v1``. JSON
+        text frames stay the default.
+
+        A reconnecting client can pass ``since=<message_id>`` to be sent the
+        messages it missed before any live traffic.
         """
         self.server_id  = self.scope["url_route"]["kwargs"]["serverId"]
         self.channel_id = self.scope["url_route"]["kwargs"]["channelId"]
 
         self.user = self.scope["user"]
         if not self.user.is_authenticated:
-            self.close()
+            await self.close()
             return
 
+        self.conversation_id = conversation_cache.get(self.channel_id)
+        if self.conversation_id is None:
+            self.conversation_id = await database_sync_to_async(resolve_conversation_id)(self.channel_id)
+        if self.conversation_id is None:
+            await self.close()
+            return
+        self.sender = await database_sync_to_async(sender_snapshot)(self.user)
+        logger.debug("Sender snapshot for %s: %s", self.user, self.sender)
+
         # Build a unique room name to prevent ID collisions across servers
         self.room_group_name = f"chat_s{self.server_id}_c{self.channel_id}"
-        
+
+        subprotocol = next(
+            (offered for offered in self.scope.get("subprotocols", []) if offered in SUBPROTOCOLS),
+            None,
+        )
+        self.binary_frames = subprotocol == MSGPACK_SUBPROTOCOL
+        self.batch_frames = (
+            subprotocol == BATCH_SUBPROTOCOL or self.query_param("batch") in ("1", "true")
+        )
+
+        if webchat_setting("SOCKET_RATE"):
+            self.socket_bucket = TokenBucket(
+                webchat_setting("SOCKET_RATE"), webchat_setting("SOCKET_BURST")
+            )
+
         # Accept the WebSocket connection and join the group
-        self.accept()
-        async_to_sync(self.channel_layer.group_add)(
+        await self.accept(subprotocol=subprotocol)
+        if webchat_setting("OUTBOUND_QUEUE_SIZE"):
+            self.outbound = asyncio.Queue(maxsize=webchat_setting("OUTBOUND_QUEUE_SIZE"))
+            self.outbound_writer = asyncio.create_task(self.write_outbound())
+        await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
+        await self.channel_layer.group_add(
+            user_group_name(self.user.id),
+            self.channel_name
+        )
+
+        since = self.query_param("since")
+        if since is not None:
+            await self.replay_missed(since)
 
-    def receive_json(self, content, **kwargs):
+    async def replay_missed(self, since):
+        """
+        Send a reconnecting client the messages stored after its cursor.
+
+        Runs after the socket joined its room, and live events are not
+        dispatched until connect() returns, so the replay frame always comes
+        first. Anything broadcast while the replay query ran is queued and
+        dropped on arrival if the replay already carried it, so the client
+        gets no gaps and no duplicates.
+
+        In write-behind mode the messages pending in this process are flushed
+        first, and those still pending in other processes are read from the
+        shared pending store and replayed under their provisional IDs. Live
+        events for any of them, under either ID, are dropped as well. A flush
+        that fails (e.g. during a database hiccup) is logged, and its messages
+        are replayed from the pending store like the other processes' ones.
+
+        The frame is ``{"replay": [...], "complete": bool}``; ``complete`` is
+        false when more than ``REPLAY_LIMIT`` messages were missed, in which
+        case the client should page through the rest over the REST API.
+
+        Args:
+            since (str): The ID of the last message the client has.
+        """
+        try:
+            since = int(since)
+        except ValueError:
+            await self.send_json({"error": {"code": "invalid_since"}})
+            return
+        flushed = {}
+        if webchat_setting("WRITE_BEHIND"):
+            try:
+                flushed = await write_behind.flush()
+            except Exception:
+                # The unflushed messages stay in the pending store, so they
+                # are still replayed below under their provisional IDs.
+                logger.exception("Write-behind flush before a replay failed")
+        replay, complete = await self.missed_messages(since)
+        self.replayed_ids = {new_message["id"] for new_message in replay}
+        self.replayed_ids.update(
+            provisional_id for provisional_id, message_id in flushed.items()
+            if message_id in self.replayed_ids
+        )
+        if webchat_setting("WRITE_BEHIND"):
+            # Read after the query: a message persisted in between is either
+            # in the replay or listed here with its database ID.
+            for entry in await sync_to_async(pending_messages)(self.conversation_id):
+                provisional_id = entry["message"]["id"]
+                if entry["id"] is not None and (entry["id"] in self.replayed_ids or entry["id"] <= since):
+                    self.replayed_ids.add(provisional_id)
+                elif entry["id"] is None or complete:
+                    replay.append(entry["message"])
+                    self.replayed_ids.add(provisional_id)
+        await self.send_json({"replay": replay, "complete": complete})
+
+    @database_sync_to_async
+    def missed_messages(self, since):
+        """
+        Fetch the conversation's messages after a cursor in one keyset query.
+
+        Args:
+            since (int): The ID of the last message the client has.
+
+        Returns:
+            tuple[list[dict], bool]: The message payloads, oldest first, and
+            whether that is everything that was missed.
+        """
+        limit = webchat_setting("REPLAY_LIMIT")
+        messages = list(
+            Messages.objects.filter(conversation_id=self.conversation_id, id__gt=since)
+            .select_related("sender__account")
+            .order_by("id")[: limit + 1]
+        )
+        return message_payloads(messages[:limit]), len(messages) <= limit
+
+    def query_param(self, name):
+        """
+        Return a query string parameter of the connection, if present.
+
+        Args:
+            name (str): The parameter name.
+
+        Returns:
+            str or None: The first value given for the parameter.
+        """
+        values = parse_qs(self.scope.get("query_string", b"").decode()).get(name)
+        return values[0] if values else None
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        """
+        Decode an incoming frame and pass it on to receive_json.
+
+        Binary frames are decoded as MessagePack on sockets that negotiated
+        it; everything else is handled as JSON text.
+
+        Args:
+            text_data (str): The text frame payload, if any.
+            bytes_data (bytes): The binary frame payload, if any.
+            **kwargs: Additional keyword arguments.
+        """
+        if self.binary_frames and bytes_data:
+            await self.receive_json(msgpack.unpackb(bytes_data), **kwargs)
+            return
+        await super().receive(text_data=text_data, bytes_data=bytes_data, **kwargs)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        """
+        Queue a frame for the socket's writer, guarding against slow clients.
+
+        When the bounded outbound queue is full the frame is dropped, or the
+        socket is closed with code 4008, depending on
+        ``WEBCHAT["SLOW_CONSUMER_POLICY"]``.
+
+        The queue only fills if the server's send waits for the socket to
+        drain, as uvicorn's does; daphne's returns at once, so the queue is
+        off by default (``OUTBOUND_QUEUE_SIZE`` 0) and frames go straight out.
+
+        Args:
+            text_data (str): The text frame payload, if any.
+            bytes_data (bytes): The binary frame payload, if any.
+            close (bool): Whether to close the socket after sending.
+        """
+        if self.outbound is None:
+            await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+            return
+        try:
+            self.outbound.put_nowait((text_data, bytes_data, close))
+        except asyncio.QueueFull:
+            if webchat_setting("SLOW_CONSUMER_POLICY") == "disconnect":
+                logger.debug("Closing slow socket of %s", self.user)
+                self.outbound = None
+                await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                return
+            self.dropped_frames += 1
+            logger.debug("Dropped frame %d for slow socket of %s", self.dropped_frames, self.user)
+
+    async def write_outbound(self):
+        """
+        Write queued frames to the socket, one at a time, until cancelled.
+
+        Each write waits for the server to take the frame, which is what
+        lets the queue build up behind a slow client.
+        """
+        while True:
+            text_data, bytes_data, close = await self.outbound.get()
+            await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    async def throttle(self):
+        """
+        Take a token from the socket's and the user's buckets.
+
+        Returns:
+            float: 0 if the frame may proceed, otherwise the seconds the
+            client should wait before sending again.
+        """
+        if self.socket_bucket is not None:
+            retry_after = self.socket_bucket.consume()
+            if retry_after:
+                return retry_after
+        if webchat_setting("USER_RATE"):
+            return await bucket_store().consume(
+                f"user_{self.user.id}", webchat_setting("USER_RATE"), webchat_setting("USER_BURST")
+            )
+        return 0
+
+    async def reject_frame(self, retry_after):
+        """
+        Answer an over-limit frame with an error frame, or close the socket
+        once it has been rejected too often.
+
+        Args:
+            retry_after (float): Seconds until the client may send again.
+        """
+        self.rejected_frames += 1
+        close_after = webchat_setting("RATE_LIMIT_CLOSE_AFTER")
+        if close_after and self.rejected_frames >= close_after:
+            await self.close(code=RATE_LIMITED_CLOSE_CODE)
+            return
+        await self.send_json({
+            "error": {"code": "rate_limited", "retry_after": round(retry_after, 3)}
+        })
+
+    async def send_json(self, content, close=False):
+        """
+        Encode a frame in the socket's negotiated format and send it.
+
+        Both formats go through ``send``, so JSON frames are queued too
+        (the base class would hand them to the socket directly).
+
+        Args:
+            content (dict): The frame content.
+            close (bool): Whether to close the socket after sending.
+        """
+        if self.binary_frames:
+            await self.send(bytes_data=msgpack.packb(content), close=close)
+            return
+        await self.send(text_data=await self.encode_json(content), close=close)
+
+    async def receive_json(self, content, **kwargs):
         """
         Handle receipt of a JSON message from the WebSocket.
 
         Saves the message to the database and broadcasts it to the room group.
+        In write-behind mode the message is broadcast under a provisional ID
+        first and persisted later in a batch. With a coalescing window set,
+        the message is fanned out together with the room's other messages
+        from the same window.
+
+        A ``{"read": <message_id>}`` frame advances the user's read
+        watermark in the channel instead of sending a message.
+
+        Frames over the socket's or the user's rate limit are answered with
+        an error frame instead.
 
         Args:
             content (dict): The JSON message content.
             **kwargs: Additional keyword arguments.
         """
-        channel_id = self.channel_id
-        sender = self.user
-        message = content["message"]
+        retry_after = await self.throttle()
+        if retry_after:
+            await self.reject_frame(retry_after)
+            return
 
-        conversation, created = ConversationModel.objects.get_or_create(channel_id=channel_id)
-        new_message = Messages.objects.create(conversation=conversation, sender=sender, content=message)
+        if "read" in content:
+            if isinstance(content["read"], int):
+                await self.mark_read(content["read"])
+            return
 
-        # Get sender's Account and avatar image URL
-        account = getattr(sender, "account", None)
-        avatar_url = None
-        if account and account.image:
-            avatar_url = account.image.url
-            # Force HTTPS for Cloudinary URLs
-            if avatar_url.startswith('http://'):
-                avatar_url = avatar_url.replace('http://', 'https://', 1)
-        sender_username = account.username if account else sender.username
+        if webchat_setting("WRITE_BEHIND"):
+            try:
+                new_message = await self.queue_message(content["message"])
+            except WriteBehindFull:
+                await self.send_json({"error": {"code": "unavailable"}})
+                return
+        else:
+            new_message = await self.save_message(content["message"])
 
-        print("Sender:", sender)
-        print("Account:", account)
-        print("Account image:", account.image if account else None)
-        print("Avatar URL:", avatar_url)
+        if webchat_setting("COALESCE_WINDOW_MS"):
+            room_coalescer.add(self.room_group_name, new_message)
+            return
 
         # Only broadcast to the exact room group
-        async_to_sync(self.channel_layer.group_send)(
+        await self.channel_layer.group_send(
             self.room_group_name,
             {
                 "type": "chat.message",
-                "new_message": {
-                    "id": new_message.id,
-                    "user": {
-                        "id": sender.id,
-                        "username": sender_username,
-                        "image_url": avatar_url,
-                    },
-                    "content": new_message.content,
-                    "timestamp_created": new_message.timestamp_created.isoformat(),
-                    "timestamp_updated": new_message.timestamp_updated.isoformat(),
-                }
+                "new_message": new_message,
             }
         )
 
-    def chat_message(self, event):
+    @database_sync_to_async
+    def mark_read(self, message_id):
+        """
+        Advance the user's read watermark in this channel to a message.
+
+        Args:
+            message_id (int): The last message the user has read.
+        """
+        advance_read_state(self.user.account.id, self.conversation_id, message_id)
+
+    @database_sync_to_async
+    def save_message(self, message):
+        """
+        Persist a message, write it through to the channel's hot window and
+        build its broadcast payload.
+
+        Runs on the database thread pool, as it inserts the message row.
+
+        Args:
+            message (str): The message content.
+
+        Returns:
+            dict: The ``new_message`` payload sent to the room group.
+        """
+        new_message = Messages.objects.create(
+            conversation_id=self.conversation_id, sender=self.user, content=message
+        )
+        payload = message_payload(new_message, self.sender)
+        hot_windows.append(self.channel_id, [payload])
+        return payload
+
+    async def queue_message(self, message):
+        """
+        Hand a message to the write-behind buffer and build its payload.
+
+        The payload carries a provisional ID; the room is sent the real ID
+        through a ``chat.persisted`` event once the batch is written, or a
+        ``chat.failed`` event if it could not be. The message is published to
+        the shared pending store before it is broadcast. When the buffer is
+        full the sender waits for a flush first.
+
+        Args:
+            message (str): The message content.
+
+        Returns:
+            dict: The ``new_message`` payload sent to the room group.
+
+        Raises:
+            WriteBehindFull: If the buffer is still full after the flush.
+        """
+        pending = {
+            "provisional_id": write_behind.provisional_id(),
+            "conversation_id": self.conversation_id,
+            "channel_id": self.channel_id,
+            "room_group_name": self.room_group_name,
+            "sender_id": self.user.id,
+            "sender": self.sender,
+            "content": message,
+            "timestamp_created": timezone.now(),
+        }
+        try:
+            write_behind.enqueue(pending)
+        except WriteBehindFull:
+            try:
+                await write_behind.flush()
+            except Exception:
+                logger.exception("Write-behind flush for a full buffer failed")
+            write_behind.enqueue(pending)
+        await sync_to_async(write_behind.publish)(self.conversation_id)
+        return provisional_payload(pending)
+
+    async def chat_message(self, event):
         """
         Handler for broadcasting a chat message to all sockets in the room group.
 
         Args:
             event (dict): The event data containing the new message.
         """
-        self.send_json({
+        if event["new_message"]["id"] in self.replayed_ids:
+            return
+        if self.batch_frames:
+            await self.send_json({"messages": [event["new_message"]]})
+            return
+        await self.send_json({
             "message": event["new_message"]
         })
 
-    def disconnect(self, close_code):
+    async def chat_batch(self, event):
+        """
+        Handler for a coalesced batch of chat messages.
+
+        Batching sockets get the whole batch in one frame, the rest get one
+        frame per message as before.
+
+        Args:
+            event (dict): The event data containing the new messages.
+        """
+        messages = [
+            new_message for new_message in event["messages"]
+            if new_message["id"] not in self.replayed_ids
+        ]
+        if not messages:
+            return
+        if self.batch_frames:
+            await self.send_json({"messages": messages})
+            return
+        for new_message in messages:
+            await self.send_json({"message": new_message})
+
+    async def chat_persisted(self, event):
+        """
+        Handler for telling sockets the real IDs of write-behind messages.
+
+        Args:
+            event (dict): The event data mapping provisional IDs to message IDs.
+        """
+        await self.send_json({
+            "persisted": event["ids"]
+        })
+
+    async def chat_failed(self, event):
+        """
+        Handler for telling sockets which write-behind messages were dropped.
+
+        Args:
+            event (dict): The event data listing the provisional IDs.
+        """
+        await self.send_json({
+            "failed": event["ids"]
+        })
+
+    async def profile_updated(self, event):
+        """
+        Handler for swapping in the sender's new profile snapshot.
+
+        Args:
+            event (dict): The event data containing the new sender block.
+        """
+        self.sender = event["user"]
+        logger.debug("Sender snapshot for %s updated: %s", self.user, self.sender)
+
+    async def disconnect(self, close_code):
         """
         Handle WebSocket disconnection.
 
-        Removes the socket from the room group.
-        
+        Removes the socket from the room and user groups and stops its
+        outbound writer.
+
         Args:
             close_code (int): The close code for the WebSocket connection.
         """
+        if self.outbound_writer is not None:
+            self.outbound_writer.cancel()
         if hasattr(self, "room_group_name"):
-            async_to_sync(self.channel_layer.group_discard)(
+            await self.channel_layer.group_discard(
                 self.room_group_name, self.channel_name
             )
-        super().disconnect(close_code)
+            await self.channel_layer.group_discard(
+                user_group_name(self.user.id), self.channel_name
+            )
+        await super().disconnect(close_code)
@@ -0,0 +1,132 @@
+"""
+Process-wide lookup of conversations by channel ID.
+
+A channel's conversation never changes once created, so each process keeps
+a bounded LRU of ``channel_id -> conversation_id`` and only reaches the
+database for channels it hasn't seen recently. Creation is race-safe: the
+one-to-one link from ``ConversationModel`` to ``Channel`` makes concurrent
+``get_or_create`` calls settle on the same row.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.db.models.signals import post_delete
+
+from server.models import Channel
+
+from .conf import webchat_setting
+from .hotwindow import hot_windows
+from .models import ConversationModel
+
+
+class ConversationCache:
+    """
+    Thread-safe, bounded LRU mapping channel IDs to conversation IDs.
+    """
+
+    def __init__(self, maxsize):
+        """
+        Initialize an empty cache.
+
+        Args:
+            maxsize (int): The most entries kept before evicting the oldest.
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, channel_id):
+        """
+        Return the cached conversation ID for a channel, if any.
+
+        Args:
+            channel_id (str): The channel ID.
+
+        Returns:
+            int or None: The conversation ID, or None on a miss.
+        """
+        key = str(channel_id)
+        with self._lock:
+            conversation_id = self._entries.get(key)
+            if conversation_id is not None:
+                self._entries.move_to_end(key)
+            return conversation_id
+
+    def set(self, channel_id, conversation_id):
+        """
+        Cache a channel's conversation ID, evicting the least recently used.
+
+        Args:
+            channel_id (str): The channel ID.
+            conversation_id (int): The conversation ID.
+        """
+        key = str(channel_id)
+        with self._lock:
+            self._entries[key] = conversation_id
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, channel_id):
+        """
+        Drop a channel from the cache.
+
+        Args:
+            channel_id (str): The channel ID.
+        """
+        with self._lock:
+            self._entries.pop(str(channel_id), None)
+
+    def clear(self):
+        """
+        Drop every cached entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+#: The process-wide conversation cache.
+conversation_cache = ConversationCache(webchat_setting("CONVERSATION_CACHE_SIZE"))
+
+
+def resolve_conversation_id(channel_id):
+    """
+    Return the conversation ID for a channel, creating the conversation if needed.
+
+    Hits the database only on a cache miss, so callers on the event loop
+    should check ``conversation_cache`` first and run this on the database
+    thread pool.
+
+    Args:
+        channel_id (str): The channel ID.
+
+    Returns:
+        int or None: The conversation ID, or None if there is no such channel.
+    """
+    conversation_id = conversation_cache.get(channel_id)
+    if conversation_id is None:
+        if not str(channel_id).isdigit() or not Channel.objects.filter(id=channel_id).exists():
+            return None
+        conversation, created = ConversationModel.objects.get_or_create(channel_id=channel_id)
+        conversation_id = conversation.id
+        conversation_cache.set(channel_id, conversation_id)
+    return conversation_id
+
+
+def evict_conversation(sender, instance, **kwargs):
+    """
+    Signal handler to drop a deleted conversation from the cache, along
+    with its channel's hot window.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (ConversationModel): The deleted conversation.
+        **kwargs: Additional keyword arguments.
+    """
+    conversation_cache.discard(instance.channel_id)
+    hot_windows.discard(instance.channel_id)
+
+
+# Connect the evict_conversation signal handler to the ConversationModel post_delete signal.
+post_delete.connect(evict_conversation, sender=ConversationModel)
@@ -0,0 +1,105 @@
+"""
+Coalesced fan-out of chat messages.
+
+With ``WEBCHAT["COALESCE_WINDOW_MS"]`` set, the ChatConsumer hands new
+messages to the process-wide RoomCoalescer instead of publishing each one.
+The coalescer gathers a room's messages for the window and publishes them as
+a single ``chat.batch`` event, so a burst costs one channel-layer publish
+rather than one per message. Sockets that negotiated batch frames forward
+the event as one ``{"messages": [...]}`` frame.
+"""
+
+import asyncio
+
+from channels.layers import get_channel_layer
+
+from .conf import webchat_setting
+
+
+class RoomCoalescer:
+    """
+    Per-process buffer of messages waiting to be fanned out, keyed by room.
+    """
+
+    def __init__(self):
+        """
+        Initialize with no pending rooms.
+        """
+        self._rooms = {}
+        self._publishing = {}
+
+    def add(self, room_group_name, new_message):
+        """
+        Queue a message for the room's next batch.
+
+        Must be called from the event loop. The first message of a batch
+        schedules its publish after the coalescing window; a full batch is
+        published straight away.
+
+        Args:
+            room_group_name (str): The room group to publish to.
+            new_message (dict): The ``new_message`` payload.
+        """
+        loop = asyncio.get_running_loop()
+        pending = self._rooms.get(room_group_name)
+        if pending is None or pending["loop"] is not loop:
+            pending = {"loop": loop, "messages": []}
+            self._rooms[room_group_name] = pending
+            window = webchat_setting("COALESCE_WINDOW_MS") / 1000
+            loop.call_later(window, self._publish_soon, room_group_name, pending)
+        pending["messages"].append(new_message)
+        if len(pending["messages"]) >= webchat_setting("COALESCE_MAX_MESSAGES"):
+            self._publish_soon(room_group_name, pending)
+
+    def _publish_soon(self, room_group_name, pending):
+        """
+        Detach a room's batch and schedule its publish.
+
+        Does nothing if the batch was already published early.
+
+        Args:
+            room_group_name (str): The room group.
+            pending (dict): The batch being closed.
+        """
+        if self._rooms.get(room_group_name) is not pending:
+            return
+        del self._rooms[room_group_name]
+        previous = self._publishing.get(room_group_name)
+        task = pending["loop"].create_task(
+            self._publish(room_group_name, pending["messages"], previous)
+        )
+        self._publishing[room_group_name] = task
+        task.add_done_callback(lambda done: self._forget(room_group_name, done))
+
+    def _forget(self, room_group_name, task):
+        """
+        Drop a finished publish task unless a newer one has replaced it.
+
+        Args:
+            room_group_name (str): The room group.
+            task (asyncio.Task): The finished publish task.
+        """
+        if self._publishing.get(room_group_name) is task:
+            del self._publishing[room_group_name]
+
+    async def _publish(self, room_group_name, messages, previous=None):
+        """
+        Publish a batch of messages to the room group as one event.
+
+        Waits for the room's previous batch first, so batches reach the
+        channel layer in the order they were gathered.
+
+        Args:
+            room_group_name (str): The room group.
+            messages (list[dict]): The ``new_message`` payloads, oldest first.
+            previous (asyncio.Task): The room's previous publish, if still running.
+        """
+        if previous is not None and previous.get_loop() is asyncio.get_running_loop():
+            await asyncio.wait([previous])
+        await get_channel_layer().group_send(
+            room_group_name, {"type": "chat.batch", "messages": messages}
+        )
+
+
+#: The process-wide coalescer used by the ChatConsumer.
+room_coalescer = RoomCoalescer()
@@ -0,0 +1,335 @@
+"""
+Hot-window cache of each channel's newest messages.
+
+Most history reads are the newest page of a channel, so the newest
+``WEBCHAT["HOT_WINDOW_SIZE"]`` messages of every recently read channel are
+kept in the Django cache. A window is filled from the database on a miss,
+and the ChatConsumer (or the write-behind flusher) writes new messages
+through to it. Editing or deleting a message patches the window in place.
+The cache has to be shared by all worker processes (Redis in production,
+see ``CACHES``), or one worker would keep serving a page another has
+already written past.
+
+Windows store each message's author as a user ID. Author blocks are cached
+separately, one key per user, so a profile edit only has to drop that key.
+
+A window is updated with a read-modify-write that is not atomic across
+processes. Like the shared rate-limit buckets, windows are therefore
+best-effort. A sample of hits (``WEBCHAT["HOT_WINDOW_VERIFY_RATE"]``) is
+checked against the database, and a window found stale is refilled. Hit,
+miss and staleness counters live in the cache too; see ``stats()``.
+"""
+
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from .conf import webchat_setting
+from .pagination import MessageCursorPagination
+from .payloads import row_payloads
+from .profiles import sender_snapshot
+
+#: The counters kept by HotWindowCache, see ``stats()``.
+COUNTERS = ("hits", "misses", "verified", "stale", "age_ms")
+
+
+def message_key(message):
+    """
+    Sort key putting window messages in history order.
+
+    Args:
+        message (dict): A window message.
+
+    Returns:
+        tuple: ``(timestamp_created, id)``.
+    """
+    return message["timestamp_created"], message["id"]
+
+
+class HotWindowCache:
+    """
+    Per-channel windows of the newest messages, held in the Django cache.
+
+    A window is a dict with ``messages`` (oldest first, with ``user`` as the
+    author's ID), ``exhaustive`` (True if it holds the channel's whole
+    history) and ``filled_at`` (when it was last loaded from the database).
+
+    Args:
+        backend (BaseCache): The cache holding the windows. Defaults to the
+            Django cache, which production shares between worker processes.
+    """
+
+    def __init__(self, backend=None):
+        self.cache = backend or cache
+
+    def window_key(self, channel_id):
+        """
+        Returns:
+            str: The cache key for a channel's window.
+        """
+        return f"webchat_hot_{int(channel_id)}"
+
+    def author_key(self, user_id):
+        """
+        Returns:
+            str: The cache key for an author's sender block.
+        """
+        return f"webchat_author_{user_id}"
+
+    def newest_page(self, channel_id, rows, limit, archive=None):
+        """
+        Return the newest page of a channel, from its window when possible.
+
+        Args:
+            channel_id (str): The channel ID.
+            rows (QuerySet): The channel's messages as ``values()`` rows with
+                the ``MESSAGE_VALUES`` columns.
+            limit (int): The page size.
+            archive (QuerySet): The channel's archived messages, in the same
+                shape, if the archive is in use.
+
+        Returns:
+            list[dict]: The ``new_message`` payloads, oldest first.
+        """
+        size = webchat_setting("HOT_WINDOW_SIZE")
+        if not size:
+            return self.load(rows, limit, archive)[0]
+
+        key = self.window_key(channel_id)
+        window = self.cache.get(key)
+        if window is not None and (len(window["messages"]) >= limit or window["exhaustive"]):
+            self.count("hits")
+            self.count("age_ms", int((time.time() - window["filled_at"]) * 1000))
+            if random.random() < webchat_setting("HOT_WINDOW_VERIFY_RATE"):
+                payloads, exhaustive = self.load(rows, size, archive)
+                self.count("verified")
+                fresh = self.store(key, payloads, exhaustive, size)
+                if fresh["messages"][-limit:] != window["messages"][-limit:]:
+                    self.count("stale")
+                window = fresh
+            return self.with_authors(window["messages"][-limit:])
+
+        self.count("misses")
+        payloads, exhaustive = self.load(rows, max(size, limit), archive)
+        self.store(key, payloads, exhaustive, size)
+        return payloads[-limit:]
+
+    def author_ids(self, channel_id, limit):
+        """
+        Return the authors of a channel's newest page, if its window holds it.
+
+        Args:
+            channel_id (str): The channel ID.
+            limit (int): The page size.
+
+        Returns:
+            set[int] or None: The authors' user IDs, or None if the page
+            would be loaded from the database.
+        """
+        if not webchat_setting("HOT_WINDOW_SIZE"):
+            return None
+        window = self.cache.get(self.window_key(channel_id))
+        if window is None or (len(window["messages"]) < limit and not window["exhaustive"]):
+            return None
+        return {message["user"] for message in window["messages"][-limit:]}
+
+    def load(self, rows, count, archive=None):
+        """
+        Fetch a channel's newest messages from the database.
+
+        Args:
+            rows (QuerySet): The channel's messages as ``values()`` rows.
+            count (int): How many messages to fetch.
+            archive (QuerySet): The channel's archived messages, if any.
+
+        Returns:
+            tuple[list[dict], bool]: The payloads, oldest first, and whether
+            they are the channel's whole history.
+        """
+        page = MessageCursorPagination().older(rows, count, archive=archive)
+        return row_payloads(page), len(page) < count
+
+    def store(self, key, payloads, exhaustive, size):
+        """
+        Save freshly loaded payloads as a window and cache their authors.
+
+        Args:
+            key (str): The window's cache key.
+            payloads (list[dict]): ``new_message`` payloads, oldest first.
+            exhaustive (bool): Whether they are the channel's whole history.
+            size (int): The most messages a window holds.
+
+        Returns:
+            dict: The stored window.
+        """
+        authors = {payload["user"]["id"]: payload["user"] for payload in payloads}
+        window = {
+            "messages": [dict(payload, user=payload["user"]["id"]) for payload in payloads[-size:]],
+            "exhaustive": exhaustive and len(payloads) <= size,
+            "filled_at": time.time(),
+        }
+        timeout = webchat_setting("HOT_WINDOW_TTL")
+        self.cache.set(key, window, timeout)
+        self.cache.set_many(
+            {self.author_key(user_id): author for user_id, author in authors.items()}, timeout
+        )
+        return window
+
+    def with_authors(self, messages):
+        """
+        Swap each window message's author ID for the author's sender block.
+
+        Authors missing from the cache are snapshotted from the database.
+
+        Args:
+            messages (list[dict]): Window messages.
+
+        Returns:
+            list[dict]: The ``new_message`` payloads.
+        """
+        user_ids = {message["user"] for message in messages}
+        cached = self.cache.get_many([self.author_key(user_id) for user_id in user_ids])
+        authors = {author["id"]: author for author in cached.values()}
+        missing = user_ids - authors.keys()
+        if missing:
+            users = get_user_model().objects.select_related("account").filter(id__in=missing)
+            fetched = {user.id: sender_snapshot(user) for user in users}
+            self.cache.set_many(
+                {self.author_key(user_id): author for user_id, author in fetched.items()},
+                webchat_setting("HOT_WINDOW_TTL"),
+            )
+            authors.update(fetched)
+        return [dict(message, user=authors[message["user"]]) for message in messages]
+
+    def append(self, channel_id, payloads):
+        """
+        Write new messages through to a channel's window, if it has one,
+        and cache their authors.
+
+        Args:
+            channel_id (str): The channel ID.
+            payloads (list[dict]): The new ``new_message`` payloads.
+        """
+        size = webchat_setting("HOT_WINDOW_SIZE")
+        key = self.window_key(channel_id)
+        window = self.cache.get(key) if size else None
+        if window is None:
+            return
+        messages = window["messages"] + [dict(payload, user=payload["user"]["id"]) for payload in payloads]
+        messages.sort(key=message_key)
+        if len(messages) > size:
+            del messages[:-size]
+            window["exhaustive"] = False
+        window["messages"] = messages
+        timeout = webchat_setting("HOT_WINDOW_TTL")
+        self.cache.set(key, window, timeout)
+        self.cache.set_many(
+            {self.author_key(payload["user"]["id"]): payload["user"] for payload in payloads}, timeout
+        )
+
+    def patch(self, channel_id, message_id, **fields):
+        """
+        Update a cached message in place, if the channel's window holds it.
+
+        Args:
+            channel_id (str): The channel ID.
+            message_id (int): The edited message's ID.
+            **fields: The payload fields to replace, e.g. ``content``.
+        """
+        self.rewrite(channel_id, message_id, lambda message: dict(message, **fields))
+
+    def remove(self, channel_id, message_id):
+        """
+        Drop a deleted message from the channel's window.
+
+        Args:
+            channel_id (str): The channel ID.
+            message_id (int): The deleted message's ID.
+        """
+        self.rewrite(channel_id, message_id, lambda message: None)
+
+    def rewrite(self, channel_id, message_id, change):
+        """
+        Replace (or, when ``change`` returns None, drop) one window message.
+
+        Args:
+            channel_id (str): The channel ID.
+            message_id (int): The message's ID.
+            change (callable): Maps the cached message to its replacement.
+        """
+        key = self.window_key(channel_id)
+        window = self.cache.get(key)
+        if window is None:
+            return
+        messages = []
+        for message in window["messages"]:
+            if message["id"] == message_id:
+                message = change(message)
+            if message is not None:
+                messages.append(message)
+        window["messages"] = messages
+        self.cache.set(key, window, webchat_setting("HOT_WINDOW_TTL"))
+
+    def discard(self, channel_id):
+        """
+        Drop a channel's window, e.g. once the channel is deleted.
+
+        Args:
+            channel_id (str): The channel ID.
+        """
+        self.cache.delete(self.window_key(channel_id))
+
+    def forget_author(self, user_id):
+        """
+        Drop a user's cached sender block after a profile edit.
+
+        Args:
+            user_id (int): The user's ID.
+        """
+        self.cache.delete(self.author_key(user_id))
+
+    def count(self, name, amount=1):
+        """
+        Add to one of the shared counters.
+
+        Args:
+            name (str): The counter, one of COUNTERS.
+            amount (int): How much to add.
+        """
+        key = f"webchat_hot_stats_{name}"
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key, amount)
+        except ValueError:
+            # Evicted between add and incr; losing one sample is fine.
+            pass
+
+    def stats(self):
+        """
+        Summarize the shared counters.
+
+        Returns:
+            dict: The raw counters, plus the hit rate, the mean age of the
+            windows served and the share of verified hits found stale.
+        """
+        counters = self.cache.get_many([f"webchat_hot_stats_{name}" for name in COUNTERS])
+        values = {name: counters.get(f"webchat_hot_stats_{name}", 0) for name in COUNTERS}
+        reads = values["hits"] + values["misses"]
+        return {
+            **values,
+            "hit_rate": values["hits"] / reads if reads else None,
+            "mean_age_seconds": values["age_ms"] / values["hits"] / 1000 if values["hits"] else None,
+            "stale_rate": values["stale"] / values["verified"] if values["verified"] else None,
+        }
+
+    def reset_stats(self):
+        """
+        Zero the shared counters.
+        """
+        self.cache.delete_many([f"webchat_hot_stats_{name}" for name in COUNTERS])
+
+
+#: The hot-window cache used by the message history and the ChatConsumer.
+hot_windows = HotWindowCache()
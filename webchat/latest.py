@@ -0,0 +1,75 @@
+"""
+Newest message of many channels at once, for sidebar previews.
+
+Rather than one history request (and one query) per channel, the newest
+message of every requested channel is fetched with a single query. Each
+conversation picks its newest message ID with a correlated subquery, the
+portable form of a lateral join: one backwards seek on the
+``(conversation, timestamp_created, id)`` index per conversation. A
+``ROW_NUMBER()`` window would number every message of every channel
+before keeping the first of each. Conversations with nothing left in
+Messages fall back to their newest archived message, in the same query.
+"""
+
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import ValidationError
+
+from .archive import archived_messages
+from .models import Messages
+from .payloads import MESSAGE_VALUES, row_payloads
+
+#: The most channels a client may ask about in one request.
+MAX_CHANNELS = 200
+
+
+def get_channel_ids(request):
+    """
+    Read the channel IDs from the ``channel_ids`` query parameter.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        list[int] or None: The channel IDs, or None if the parameter is
+        missing (meaning every channel of the user's servers).
+
+    Raises:
+        ValidationError: If an ID is not an integer or there are too many.
+    """
+    value = request.query_params.get("channel_ids")
+    if value is None:
+        return None
+    ids = [part.strip() for part in value.split(",") if part.strip()]
+    if not all(part.isdigit() for part in ids):
+        raise ValidationError({"channel_ids": "Must be a comma-separated list of channel IDs."})
+    if len(ids) > MAX_CHANNELS:
+        raise ValidationError({"channel_ids": f"At most {MAX_CHANNELS} channels per request."})
+    return [int(part) for part in ids]
+
+
+def latest_payloads(conversations):
+    """
+    Build the ``new_message`` payload of the newest message of each channel.
+
+    Args:
+        conversations (QuerySet): The conversations of the channels wanted.
+
+    Returns:
+        dict: Channel ID (as a string) to its newest message payload.
+        Channels without messages are left out.
+    """
+    fields = ("conversation__channel_id", *MESSAGE_VALUES)
+    newest = Messages.objects.filter(conversation=OuterRef("pk")).order_by("-timestamp_created", "-id")
+    latest_id = Subquery(newest.values("id")[:1])
+    archive = archived_messages(conversation=OuterRef("pk"))
+    if archive is not None:
+        newest_archived = archive.order_by("-timestamp_created", "-id")
+        latest_id = Coalesce(latest_id, Subquery(newest_archived.values("id")[:1]))
+    latest_ids = conversations.annotate(latest_id=latest_id).values("latest_id")
+    rows = Messages.objects.filter(id__in=latest_ids).values(*fields)
+    if archive is not None:
+        rows = rows.union(archived_messages(id__in=latest_ids).values(*fields), all=True)
+    rows = list(rows)
+    payloads = row_payloads(rows)
+    return {str(row["conversation__channel_id"]): payload for row, payload in zip(rows, payloads)}
@@ -0,0 +1,29 @@
+"""
+Management command moving old messages into the archive table.
+
+Used where Messages isn't partitioned (SQLite in development); on
+PostgreSQL old months are dropped with ``message_partitions`` instead.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from webchat.archive import archive_messages
+
+
+class Command(BaseCommand):
+    help = "Move messages older than a number of days into the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, required=True, help="Age in days of the messages to archive.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Messages moved per transaction.")
+
+    def handle(self, *args, **options):
+        if connection.vendor == "postgresql":
+            raise CommandError("Messages are partitioned on PostgreSQL; use message_partitions instead.")
+        before = timezone.now() - timedelta(days=options["older_than"])
+        moved = archive_messages(before, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} messages."))
@@ -0,0 +1,44 @@
+"""
+Management command maintaining the monthly message partitions on PostgreSQL.
+
+Run it from a monthly (or more frequent) job so new months always have a
+partition before their first message arrives.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from webchat.partitions import add_months, create_partition, drop_partitions_before, month_start, partition_name
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly message partitions and drop those past retention (PostgreSQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead", type=int, default=3,
+            help="How many months after the current one get a partition (default 3).",
+        )
+        parser.add_argument(
+            "--keep-months", type=int,
+            help="Drop the partitions of months more than this many months ago. Nothing is "
+                 "dropped without it.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError(
+                "Messages are only partitioned on PostgreSQL; use archive_messages on other databases."
+            )
+        current = month_start(timezone.now())
+        with transaction.atomic(), connection.cursor() as cursor:
+            for ahead in range(options["months_ahead"] + 1):
+                month = add_months(current, ahead)
+                moved = create_partition(cursor, month)
+                if moved:
+                    self.stdout.write(f"Moved {moved} messages from the default partition to {partition_name(month)}")
+            if options["keep_months"] is not None:
+                for name in drop_partitions_before(cursor, add_months(current, -options["keep_months"])):
+                    self.stdout.write(f"Dropped {name}")
+        self.stdout.write(self.style.SUCCESS("Message partitions are up to date."))
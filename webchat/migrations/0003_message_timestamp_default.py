@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 07:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0002_rename_timestamp_create_messages_timestamp_created_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="messages",
+            name="timestamp_created",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+    ]
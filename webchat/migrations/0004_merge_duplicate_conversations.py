@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 07:30
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_conversations(apps, schema_editor):
+    """
+    Fold duplicate conversations for a channel into the oldest one.
+
+    Messages from the duplicates are moved onto the surviving conversation
+    before the duplicates are deleted, so no history is lost.
+    """
+    ConversationModel = apps.get_model("webchat", "ConversationModel")
+    Messages = apps.get_model("webchat", "Messages")
+    duplicates = (
+        ConversationModel.objects.values("channel_id")
+        .annotate(keep_id=Min("id"), total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        extra = ConversationModel.objects.filter(
+            channel_id=duplicate["channel_id"]
+        ).exclude(id=duplicate["keep_id"])
+        Messages.objects.filter(conversation__in=extra).update(
+            conversation_id=duplicate["keep_id"]
+        )
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0003_message_timestamp_default"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_conversations, migrations.RunPython.noop
+        ),
+    ]
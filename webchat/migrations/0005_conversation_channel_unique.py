@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0004_merge_duplicate_conversations"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="conversationmodel",
+            name="channel_id",
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
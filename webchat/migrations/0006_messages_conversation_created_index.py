@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 07:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0005_conversation_channel_unique"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="messages",
+            index=models.Index(
+                fields=["conversation", "timestamp_created", "id"],
+                name="webchat_msg_conv_created_idx",
+            ),
+        ),
+    ]
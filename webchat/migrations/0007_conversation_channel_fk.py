@@ -0,0 +1,76 @@
+# Generated by Django 5.2 on 2026-10-18 08:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+
+def link_conversations_to_channels(apps, schema_editor):
+    """
+    Point each conversation at the channel its old string ID named.
+
+    Conversations whose ID isn't a channel that still exists can't be
+    reached from the app any more, so they are deleted with their messages.
+    """
+    ConversationModel = apps.get_model("webchat", "ConversationModel")
+    Channel = apps.get_model("server", "Channel")
+    conversations = list(ConversationModel.objects.only("id", "channel_ref"))
+    candidates = {
+        int(conversation.channel_ref)
+        for conversation in conversations
+        if conversation.channel_ref.isdigit()
+    }
+    existing = set(Channel.objects.filter(id__in=candidates).values_list("id", flat=True))
+
+    linked, orphans = [], []
+    for conversation in conversations:
+        ref = conversation.channel_ref
+        if ref.isdigit() and int(ref) in existing:
+            conversation.channel_id = int(ref)
+            linked.append(conversation)
+        else:
+            orphans.append(conversation.id)
+    ConversationModel.objects.bulk_update(linked, ["channel"], batch_size=500)
+    ConversationModel.objects.filter(id__in=orphans).delete()
+
+
+def unlink_conversations(apps, schema_editor):
+    """
+    Restore the string channel IDs from the foreign key.
+    """
+    ConversationModel = apps.get_model("webchat", "ConversationModel")
+    ConversationModel.objects.update(channel_ref=Cast("channel_id", models.CharField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0009_hot_query_indexes"),
+        ("webchat", "0006_messages_conversation_created_index"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="conversationmodel",
+            old_name="channel_id",
+            new_name="channel_ref",
+        ),
+        migrations.AlterField(
+            model_name="conversationmodel",
+            name="channel_ref",
+            field=models.CharField(max_length=255, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name="conversationmodel",
+            name="channel",
+            field=models.OneToOneField(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="conversation",
+                to="server.channel",
+            ),
+        ),
+        migrations.RunPython(
+            link_conversations_to_channels, unlink_conversations
+        ),
+    ]
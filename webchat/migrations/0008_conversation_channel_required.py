@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 08:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0009_hot_query_indexes"),
+        ("webchat", "0007_conversation_channel_fk"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="conversationmodel",
+            name="channel_ref",
+        ),
+        migrations.AlterField(
+            model_name="conversationmodel",
+            name="channel",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="conversation",
+                to="server.channel",
+            ),
+        ),
+    ]
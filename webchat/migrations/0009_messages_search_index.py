@@ -0,0 +1,75 @@
+# Generated by Django 5.2 on 2026-10-18 09:12
+
+from django.db import migrations
+
+# The search index lives outside the model: a generated tsvector column with
+# a GIN index on PostgreSQL, an FTS5 table kept in sync by triggers on SQLite.
+# Both follow inserts, edits and deletes (cascades included) on their own.
+#
+# SQLite rebuilds a table to alter one of its columns, which drops the
+# triggers. A later migration that alters Messages must recreate them.
+SEARCH_SQL = {
+    "postgresql": (
+        [
+            "ALTER TABLE webchat_messages ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED",
+            "CREATE INDEX webchat_msg_search_idx ON webchat_messages USING GIN (search_vector)",
+        ],
+        [
+            "DROP INDEX webchat_msg_search_idx",
+            "ALTER TABLE webchat_messages DROP COLUMN search_vector",
+        ],
+    ),
+    "sqlite": (
+        [
+            "CREATE VIRTUAL TABLE webchat_messages_fts USING fts5("
+            "content, content='webchat_messages', content_rowid='id')",
+            "CREATE TRIGGER webchat_messages_fts_insert AFTER INSERT ON webchat_messages BEGIN "
+            "INSERT INTO webchat_messages_fts (rowid, content) VALUES (new.id, new.content); END",
+            "CREATE TRIGGER webchat_messages_fts_delete AFTER DELETE ON webchat_messages BEGIN "
+            "INSERT INTO webchat_messages_fts (webchat_messages_fts, rowid, content) "
+            "VALUES ('delete', old.id, old.content); END",
+            "CREATE TRIGGER webchat_messages_fts_update AFTER UPDATE OF content ON webchat_messages BEGIN "
+            "INSERT INTO webchat_messages_fts (webchat_messages_fts, rowid, content) "
+            "VALUES ('delete', old.id, old.content); "
+            "INSERT INTO webchat_messages_fts (rowid, content) VALUES (new.id, new.content); END",
+            "INSERT INTO webchat_messages_fts (webchat_messages_fts) VALUES ('rebuild')",
+        ],
+        [
+            "DROP TRIGGER webchat_messages_fts_insert",
+            "DROP TRIGGER webchat_messages_fts_delete",
+            "DROP TRIGGER webchat_messages_fts_update",
+            "DROP TABLE webchat_messages_fts",
+        ],
+    ),
+}
+
+
+def run_search_sql(schema_editor, reverse):
+    """
+    Run the search index statements for the database in use, if it has any.
+    """
+    statements = SEARCH_SQL.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for statement in statements[reverse]:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    run_search_sql(schema_editor, reverse=False)
+
+
+def drop_search_index(apps, schema_editor):
+    run_search_sql(schema_editor, reverse=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0008_conversation_channel_required"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
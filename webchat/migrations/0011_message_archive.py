@@ -0,0 +1,89 @@
+# Generated by Django 5.2 on 2026-10-18 08:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# The archive is only used where Messages can't be partitioned (SQLite), so
+# only SQLite gets a full-text index for it, in the shape of the one from
+# 0009_messages_search_index.
+ARCHIVE_SEARCH_SQL = (
+    [
+        "CREATE VIRTUAL TABLE webchat_messages_archive_fts USING fts5("
+        "content, content='webchat_messages_archive', content_rowid='id')",
+        "CREATE TRIGGER webchat_messages_archive_fts_insert AFTER INSERT ON webchat_messages_archive BEGIN "
+        "INSERT INTO webchat_messages_archive_fts (rowid, content) VALUES (new.id, new.content); END",
+        "CREATE TRIGGER webchat_messages_archive_fts_delete AFTER DELETE ON webchat_messages_archive BEGIN "
+        "INSERT INTO webchat_messages_archive_fts (webchat_messages_archive_fts, rowid, content) "
+        "VALUES ('delete', old.id, old.content); END",
+    ],
+    [
+        "DROP TRIGGER webchat_messages_archive_fts_insert",
+        "DROP TRIGGER webchat_messages_archive_fts_delete",
+        "DROP TABLE webchat_messages_archive_fts",
+    ],
+)
+
+
+def run_archive_search_sql(schema_editor, reverse):
+    """
+    Run the archive's search index statements on SQLite.
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in ARCHIVE_SEARCH_SQL[reverse]:
+        schema_editor.execute(statement)
+
+
+def create_archive_search_index(apps, schema_editor):
+    run_archive_search_sql(schema_editor, reverse=False)
+
+
+def drop_archive_search_index(apps, schema_editor):
+    run_archive_search_sql(schema_editor, reverse=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0010_read_state"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedMessage",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("content", models.TextField()),
+                ("timestamp_created", models.DateTimeField()),
+                ("timestamp_updated", models.DateTimeField()),
+                (
+                    "conversation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_messages",
+                        to="webchat.conversationmodel",
+                    ),
+                ),
+                (
+                    "sender",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "webchat_messages_archive",
+                "indexes": [
+                    models.Index(
+                        fields=["conversation", "timestamp_created", "id"],
+                        name="webchat_archive_conv_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(create_archive_search_index, drop_archive_search_index),
+    ]
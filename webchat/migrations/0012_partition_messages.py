@@ -0,0 +1,115 @@
+# Generated by Django 5.2 on 2026-10-18 09:40
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations
+from django.utils import timezone
+
+# PostgreSQL only: rebuild webchat_messages as a table range-partitioned by
+# month on timestamp_created. A partitioned table's primary key must include
+# the partition key, so it becomes (id, timestamp_created); IDs still come
+# from one identity sequence and stay unique. Other databases keep a plain
+# table and move old rows to webchat_messages_archive instead.
+COLUMNS = (
+    "content text NOT NULL, "
+    "timestamp_created timestamp with time zone NOT NULL, "
+    "timestamp_updated timestamp with time zone NOT NULL, "
+    "conversation_id bigint NOT NULL, "
+    "sender_id integer NOT NULL, "
+    "search_vector tsvector GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED"
+)
+COPIED = "id, content, timestamp_created, timestamp_updated, conversation_id, sender_id"
+
+#: Monthly partitions created ahead of the current month.
+MONTHS_AHEAD = 3
+
+
+def month_start(moment):
+    return moment.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def finish_table(schema_editor, primary_key):
+    """
+    Copy the rows over, then recreate the keys, indexes and sequence position.
+    """
+    execute = schema_editor.execute
+    execute(f"INSERT INTO webchat_messages ({COPIED}) SELECT {COPIED} FROM webchat_messages_previous")
+    execute("DROP TABLE webchat_messages_previous")
+    execute(f"ALTER TABLE webchat_messages ADD PRIMARY KEY ({primary_key})")
+    execute(
+        "CREATE INDEX webchat_msg_conv_created_idx "
+        "ON webchat_messages (conversation_id, timestamp_created, id)"
+    )
+    execute("CREATE INDEX webchat_messages_sender_id_idx ON webchat_messages (sender_id)")
+    execute("CREATE INDEX webchat_msg_search_idx ON webchat_messages USING GIN (search_vector)")
+    execute(
+        "ALTER TABLE webchat_messages ADD CONSTRAINT webchat_messages_conversation_id_fk "
+        "FOREIGN KEY (conversation_id) REFERENCES webchat_conversationmodel (id) "
+        "DEFERRABLE INITIALLY DEFERRED"
+    )
+    execute(
+        "ALTER TABLE webchat_messages ADD CONSTRAINT webchat_messages_sender_id_fk "
+        "FOREIGN KEY (sender_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED"
+    )
+    execute(
+        "SELECT setval(pg_get_serial_sequence('webchat_messages', 'id'), "
+        "COALESCE(MAX(id), 0) + 1, false) FROM webchat_messages"
+    )
+
+
+def partition_messages(apps, schema_editor):
+    """
+    Partition the messages by month, from the oldest message's month to
+    MONTHS_AHEAD months from now, with a default partition for the rest.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    execute = schema_editor.execute
+    execute("ALTER TABLE webchat_messages RENAME TO webchat_messages_previous")
+    execute(
+        "CREATE TABLE webchat_messages (id bigint GENERATED BY DEFAULT AS IDENTITY NOT NULL, "
+        f"{COLUMNS}) PARTITION BY RANGE (timestamp_created)"
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT MIN(timestamp_created) FROM webchat_messages_previous")
+        oldest = cursor.fetchone()[0]
+    month = month_start(oldest or timezone.now())
+    last = month_start(timezone.now())
+    for _ in range(MONTHS_AHEAD):
+        last = next_month(last)
+    while month <= last:
+        execute(
+            f"CREATE TABLE webchat_messages_y{month.year}m{month.month:02d} "
+            "PARTITION OF webchat_messages FOR VALUES FROM (%s) TO (%s)",
+            (month, next_month(month)),
+        )
+        month = next_month(month)
+    execute("CREATE TABLE webchat_messages_default PARTITION OF webchat_messages DEFAULT")
+    finish_table(schema_editor, "id, timestamp_created")
+
+
+def unpartition_messages(apps, schema_editor):
+    """
+    Move the messages back into a plain table.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    execute = schema_editor.execute
+    execute("ALTER TABLE webchat_messages RENAME TO webchat_messages_previous")
+    execute(f"CREATE TABLE webchat_messages (id bigint GENERATED BY DEFAULT AS IDENTITY NOT NULL, {COLUMNS})")
+    finish_table(schema_editor, "id")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0011_message_archive"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_messages, unpartition_messages),
+    ]
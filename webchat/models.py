@@ -6,6 +6,12 @@ Defines ConversationModel for chat channels and Messages for individual chat mes
 
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from account.models import Account
+from ping_me_api.caching import bump_versions, version_key
+from server.models import Channel
 
 
 class ConversationModel(models.Model):
@@ -13,10 +19,15 @@ class ConversationModel(models.Model):
     Model representing a chat conversation within a channel.
 
     Fields:
-        channel_id (str): The unique identifier for the channel.
+        channel (Channel): The channel the conversation belongs to. Deleting
+            the channel deletes its conversation and messages.
         created_at (datetime): Timestamp when the conversation was created.
     """
-    channel_id = models.CharField(max_length=255)
+    channel = models.OneToOneField(
+        Channel,
+        on_delete=models.CASCADE,
+        related_name="conversation"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -37,7 +48,9 @@ class Messages(models.Model):
         conversation (ConversationModel): The related conversation.
         sender (User): The user who sent the message.
         content (str): The message content.
-        timestamp_created (datetime): When the message was created.
+        timestamp_created (datetime): When the message was created. Set by
+            the server when the message is received, so write-behind rows keep
+            the timestamp they were broadcast with.
         timestamp_updated (datetime): When the message was last updated.
     """
     conversation = models.ForeignKey(
@@ -47,9 +60,18 @@ class Messages(models.Model):
     )
     sender = models.ForeignKey(get_user_model(), on_delete=models.PROTECT)
     content = models.TextField()
-    timestamp_created = models.DateTimeField(auto_now_add=True)
+    timestamp_created = models.DateTimeField(default=timezone.now, editable=False)
     timestamp_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # History pages walk a conversation in (timestamp_created, id) order.
+            models.Index(
+                fields=["conversation", "timestamp_created", "id"],
+                name="webchat_msg_conv_created_idx",
+            ),
+        ]
+
     def __str__(self):
         """
         String representation of the message.
@@ -58,3 +80,115 @@ class Messages(models.Model):
             str: Short preview of the message content.
         """
         return f"Message by {self.sender} in {self.conversation}: {self.content[:30]}"
+
+
+class ArchivedMessage(models.Model):
+    """
+    Model holding messages moved out of Messages by ``archive_messages``.
+
+    Only used where the database can't partition Messages by month (SQLite
+    in development); history pages, search and channel previews read
+    through to it. Archived messages keep their IDs and are read-only.
+
+    Fields:
+        id (int): The message's original ID.
+        conversation (ConversationModel): The related conversation.
+        sender (User): The user who sent the message.
+        content (str): The message content.
+        timestamp_created (datetime): When the message was created.
+        timestamp_updated (datetime): When the message was last updated.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    conversation = models.ForeignKey(
+        ConversationModel,
+        on_delete=models.CASCADE,
+        related_name="archived_messages"
+    )
+    sender = models.ForeignKey(get_user_model(), on_delete=models.PROTECT, related_name="+")
+    content = models.TextField()
+    timestamp_created = models.DateTimeField()
+    timestamp_updated = models.DateTimeField()
+
+    class Meta:
+        db_table = "webchat_messages_archive"
+        indexes = [
+            models.Index(
+                fields=["conversation", "timestamp_created", "id"],
+                name="webchat_archive_conv_idx",
+            ),
+        ]
+
+    def __str__(self):
+        """
+        String representation of the archived message.
+
+        Returns:
+            str: Short preview of the message content.
+        """
+        return f"Archived message by {self.sender} in {self.conversation}: {self.content[:30]}"
+
+
+class ReadState(models.Model):
+    """
+    Model recording how far an account has read a conversation.
+
+    The watermark is the ``(timestamp_created, id)`` of the last message
+    read, the same key history pages are ordered by, so the unread messages
+    are one index range after it. It only ever moves forward.
+
+    Fields:
+        account (Account): The reader.
+        conversation (ConversationModel): The conversation read.
+        last_read_at (datetime): ``timestamp_created`` of the last message read.
+        last_read_id (int): ID of the last message read.
+        updated_at (datetime): When the watermark last moved.
+    """
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name="read_states"
+    )
+    conversation = models.ForeignKey(
+        ConversationModel,
+        on_delete=models.CASCADE,
+        related_name="read_states"
+    )
+    last_read_at = models.DateTimeField()
+    last_read_id = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "conversation"],
+                name="webchat_readstate_account_conversation_unique",
+            ),
+        ]
+
+    def __str__(self):
+        """
+        String representation of the read state.
+
+        Returns:
+            str: The reader, conversation and last message read.
+        """
+        return f"{self.account} read {self.conversation} up to message {self.last_read_id}"
+
+
+def bump_conversation_version(sender, instance, **kwargs):
+    """
+    Signal handler to invalidate a conversation's history ETags.
+
+    Covers new and edited messages; bulk inserts and deletes bump the
+    version where they happen, so cascades can keep using fast deletes.
+
+    Args:
+        sender (Model): The model class sending the signal.
+        instance (Messages): The saved message.
+        **kwargs: Additional keyword arguments.
+    """
+    bump_versions([version_key("conversation", instance.conversation_id)])
+
+
+# Connect the bump_conversation_version signal handler to the Messages post_save signal.
+post_save.connect(bump_conversation_version, sender=Messages)
@@ -0,0 +1,198 @@
+"""
+Keyset pagination for message history.
+
+Pages are anchored on a message ID through the ``before``, ``after`` or
+``around`` query parameters and walk the ``(timestamp_created, id)`` order
+of a conversation, so every page is an index range scan no matter how deep
+into the history it is.
+
+Where old messages are moved to an archive table (see ``archive``), pages
+that run past the oldest message still in Messages carry on in the archive.
+"""
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+#: Messages returned when the client doesn't ask for a page size.
+DEFAULT_PAGE_SIZE = 50
+
+#: The largest page size a client may ask for.
+MAX_PAGE_SIZE = 100
+
+#: The anchor parameters, at most one of which may be given.
+ANCHORS = ("before", "after", "around")
+
+
+class MessageCursorPagination:
+    """
+    Paginate a conversation's messages around an anchor message.
+
+    Without an anchor the newest page is returned. Pages are always
+    returned oldest first.
+    """
+
+    def get_limit(self, request):
+        """
+        Read the page size from the ``limit`` query parameter.
+
+        Args:
+            request (Request): The incoming HTTP request.
+
+        Returns:
+            int: The page size, capped at MAX_PAGE_SIZE.
+
+        Raises:
+            ValidationError: If the limit is not a positive integer.
+        """
+        limit = request.query_params.get("limit")
+        if limit is None:
+            return DEFAULT_PAGE_SIZE
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        if limit < 1:
+            raise ValidationError({"limit": "Must be at least 1."})
+        return min(limit, MAX_PAGE_SIZE)
+
+    def get_anchor(self, request):
+        """
+        Read the anchor parameter, if any.
+
+        Args:
+            request (Request): The incoming HTTP request.
+
+        Returns:
+            tuple[str, int] or None: The anchor kind and message ID.
+
+        Raises:
+            ValidationError: If several anchors are given or the ID is invalid.
+        """
+        given = [name for name in ANCHORS if name in request.query_params]
+        if not given:
+            return None
+        if len(given) > 1:
+            raise ValidationError(f"Only one of {', '.join(ANCHORS)} may be given.")
+        try:
+            return given[0], int(request.query_params[given[0]])
+        except ValueError:
+            raise ValidationError({given[0]: "Must be a message ID."})
+
+    def paginate(self, queryset, request, archive=None):
+        """
+        Return one page of messages from a conversation's queryset.
+
+        Args:
+            queryset (QuerySet): The conversation's messages.
+            request (Request): The incoming HTTP request.
+            archive (QuerySet): The conversation's archived messages, if the
+                archive is in use.
+
+        Returns:
+            list[Messages]: The page, oldest first.
+
+        Raises:
+            ValidationError: If the parameters are invalid or the anchor
+            message isn't in the conversation.
+        """
+        limit = self.get_limit(request)
+        anchor = self.get_anchor(request)
+        if anchor is None:
+            return self.older(queryset, limit, archive=archive)
+
+        kind, message_id = anchor
+        found = self.find_anchor(message_id, queryset, archive)
+        if found is None:
+            raise ValidationError({kind: "No such message in this conversation."})
+        tier, timestamp = found
+        key = (timestamp, message_id)
+        # Everything archived is older than everything in Messages, so which
+        # tier holds the anchor says where each direction has to look.
+        archived = tier is archive
+        older_tiers = (archive, None) if archived else (queryset, archive)
+        newer_tiers = (queryset, archive) if archived else (queryset, None)
+
+        if kind == "before":
+            return self.older(older_tiers[0], limit, key, archive=older_tiers[1])
+        if kind == "after":
+            return self.newer(newer_tiers[0], limit, key, archive=newer_tiers[1])
+        older = self.older(older_tiers[0], limit // 2, key, archive=older_tiers[1])
+        newer = self.newer(newer_tiers[0], limit - len(older) - 1, key, archive=newer_tiers[1])
+        return older + list(tier.filter(id=message_id)) + newer
+
+    def find_anchor(self, message_id, queryset, archive=None):
+        """
+        Look up the anchor message, in Messages and then in the archive.
+
+        Args:
+            message_id (int): The anchor message ID.
+            queryset (QuerySet): The messages in scope.
+            archive (QuerySet): The archived messages in scope, or None.
+
+        Returns:
+            tuple or None: The tier holding the anchor (``queryset`` or
+            ``archive``) and its ``timestamp_created``, or None if neither
+            holds it.
+        """
+        for tier in (queryset, archive):
+            if tier is None:
+                continue
+            try:
+                return tier, tier.values_list("timestamp_created", flat=True).get(id=message_id)
+            except tier.model.DoesNotExist:
+                pass
+        return None
+
+    def older(self, queryset, limit, key=None, archive=None):
+        """
+        Fetch up to ``limit`` messages before ``key`` (or the newest ones).
+
+        Args:
+            queryset (QuerySet): The conversation's messages.
+            limit (int): How many messages to return.
+            key (tuple): The ``(timestamp_created, id)`` to page back from.
+            archive (QuerySet): Archived messages to carry on into when
+                ``queryset`` runs out.
+
+        Returns:
+            list[Messages]: The messages, oldest first.
+        """
+        if limit <= 0:
+            return []
+        if key is not None:
+            # The outer range keeps this a single ordered index range scan;
+            # the OR only filters rows within it.
+            queryset = queryset.filter(
+                Q(timestamp_created__lt=key[0]) | Q(id__lt=key[1]),
+                timestamp_created__lte=key[0],
+            )
+        page = list(queryset.order_by("-timestamp_created", "-id")[:limit])
+        page.reverse()
+        if len(page) < limit and archive is not None:
+            return self.older(archive, limit - len(page), key) + page
+        return page
+
+    def newer(self, queryset, limit, key, archive=None):
+        """
+        Fetch up to ``limit`` messages after ``key``.
+
+        Args:
+            queryset (QuerySet): The conversation's messages.
+            limit (int): How many messages to return.
+            key (tuple): The ``(timestamp_created, id)`` to page forward from.
+            archive (QuerySet): Archived messages to start from, when ``key``
+                is in the archive.
+
+        Returns:
+            list[Messages]: The messages, oldest first.
+        """
+        if limit <= 0:
+            return []
+        if archive is not None:
+            page = self.newer(archive, limit, key)
+            return page + self.newer(queryset, limit - len(page), key)
+        queryset = queryset.filter(
+            Q(timestamp_created__gt=key[0]) | Q(id__gt=key[1]),
+            timestamp_created__gte=key[0],
+        )
+        return list(queryset.order_by("timestamp_created", "id")[:limit])
@@ -0,0 +1,138 @@
+"""
+Monthly range partitions of the messages table on PostgreSQL.
+
+Migration ``0012_partition_messages`` turns ``webchat_messages`` into a
+table partitioned by month on ``timestamp_created``. Queries keep naming the
+parent table and PostgreSQL prunes them to the months they can touch, so the
+recent partitions and their indexes are what stays in memory. A ``DEFAULT``
+partition catches rows outside every month created so far; they are moved
+out when their month's partition is created.
+
+The ``message_partitions`` command creates partitions ahead of time and
+drops months past retention, which detaches and drops a table instead of
+deleting rows one by one.
+"""
+
+import re
+from datetime import timezone
+
+#: The partitioned table.
+PARENT = "webchat_messages"
+
+#: The partition catching rows outside every monthly partition.
+DEFAULT_PARTITION = f"{PARENT}_default"
+
+#: The stored columns, i.e. all but the generated ``search_vector``.
+COLUMNS = "id, content, timestamp_created, timestamp_updated, conversation_id, sender_id"
+
+#: Names of the monthly partitions, e.g. ``webchat_messages_y2026m10``.
+PARTITION_NAME = re.compile(rf"^{PARENT}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(moment):
+    """
+    Returns:
+        datetime: The start of the UTC month containing ``moment``.
+    """
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    """
+    Returns:
+        datetime: The start of the month ``count`` months after ``month``.
+    """
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def partition_name(month):
+    """
+    Returns:
+        str: The name of the partition holding ``month``.
+    """
+    return f"{PARENT}_y{month.year}m{month.month:02d}"
+
+
+def existing_partitions(cursor):
+    """
+    List the monthly partitions of the messages table.
+
+    Args:
+        cursor: A database cursor.
+
+    Returns:
+        dict: Partition name to its ``(year, month)``.
+    """
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = %s",
+        [PARENT],
+    )
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[name] = (int(match[1]), int(match[2]))
+    return partitions
+
+
+def create_partition(cursor, month):
+    """
+    Create the partition for a month, if it doesn't exist yet.
+
+    PostgreSQL refuses to create a partition while the default partition
+    holds rows in its range, e.g. messages of a month that was never created
+    in time. Those rows are moved into the new partition: the default
+    partition is detached, the month created, the rows copied through the
+    parent and deleted, and the default partition attached again. Run it in
+    a transaction so the rows are never missing or doubled.
+
+    Args:
+        cursor: A database cursor.
+        month (datetime): The start of the month.
+
+    Returns:
+        int: How many rows were moved out of the default partition.
+    """
+    name = partition_name(month)
+    bounds = [month, add_months(month, 1)]
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return 0
+    in_range = "timestamp_created >= %s AND timestamp_created < %s"
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})", bounds)
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM (%s) TO (%s)", bounds)
+        return 0
+    cursor.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT_PARTITION}")
+    cursor.execute(f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM (%s) TO (%s)", bounds)
+    cursor.execute(
+        f"INSERT INTO {PARENT} ({COLUMNS}) SELECT {COLUMNS} FROM {DEFAULT_PARTITION} WHERE {in_range}", bounds
+    )
+    cursor.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}", bounds)
+    moved = cursor.rowcount
+    cursor.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+    return moved
+
+
+def drop_partitions_before(cursor, month):
+    """
+    Detach and drop every monthly partition older than ``month``.
+
+    Args:
+        cursor: A database cursor.
+        month (datetime): The start of the oldest month to keep.
+
+    Returns:
+        list[str]: The dropped partitions.
+    """
+    dropped = []
+    for name, (year, month_number) in sorted(existing_partitions(cursor).items()):
+        if (year, month_number) < (month.year, month.month):
+            cursor.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+    return dropped
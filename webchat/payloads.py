@@ -0,0 +1,133 @@
+"""
+Builders for the ``new_message`` payload.
+
+The ChatConsumer broadcasts every message in the same shape, and anything
+that replays stored messages to a client must produce that shape too, so
+the builders live here rather than in the consumer.
+
+Message history pages take the fast path: ``values()`` rows with the
+author's columns joined in, turned into payloads without instantiating
+models or serializers, and with each author's block built once per page.
+"""
+
+from ping_me_api.images import image_url
+
+from .profiles import sender_snapshot
+
+#: The columns ``row_payloads`` needs, for ``Messages.objects.values()``.
+MESSAGE_VALUES = (
+    "id",
+    "sender_id",
+    "content",
+    "timestamp_created",
+    "timestamp_updated",
+    "sender__username",
+    "sender__account__username",
+    "sender__account__image",
+)
+
+
+def message_payload(message, sender):
+    """
+    Build the ``new_message`` payload for a stored message.
+
+    Args:
+        message (Messages): The message row.
+        sender (dict): The sender block from ``sender_snapshot``.
+
+    Returns:
+        dict: The message payload.
+    """
+    return {
+        "id": message.id,
+        "user": sender,
+        "content": message.content,
+        "timestamp_created": message.timestamp_created.isoformat(),
+        "timestamp_updated": message.timestamp_updated.isoformat(),
+    }
+
+
+def message_payloads(messages):
+    """
+    Build payloads for a list of messages, snapshotting each sender once.
+
+    The messages should be fetched with ``select_related("sender__account")``
+    so building the sender blocks needs no further queries.
+
+    Args:
+        messages (Iterable[Messages]): The message rows, in the order wanted.
+
+    Returns:
+        list[dict]: The message payloads.
+    """
+    senders = {}
+    payloads = []
+    for message in messages:
+        if message.sender_id not in senders:
+            senders[message.sender_id] = sender_snapshot(message.sender)
+        payloads.append(message_payload(message, senders[message.sender_id]))
+    return payloads
+
+
+def row_author(row):
+    """
+    Build the sender block for a ``values()`` row, like ``sender_snapshot``.
+
+    Args:
+        row (dict): A message row with the ``MESSAGE_VALUES`` columns.
+
+    Returns:
+        dict: The author's ID, username and avatar URL.
+    """
+    account_username = row["sender__account__username"]
+    return {
+        "id": row["sender_id"],
+        "username": row["sender__username"] if account_username is None else account_username,
+        "image_url": image_url(row["sender__account__image"]),
+    }
+
+
+def row_payloads(rows):
+    """
+    Build ``new_message`` payloads from ``values()`` rows.
+
+    Args:
+        rows (Iterable[dict]): Message rows with the ``MESSAGE_VALUES`` columns.
+
+    Returns:
+        list[dict]: The message payloads.
+    """
+    authors = {}
+    payloads = []
+    for row in rows:
+        author = authors.get(row["sender_id"])
+        if author is None:
+            author = authors[row["sender_id"]] = row_author(row)
+        payloads.append({
+            "id": row["id"],
+            "user": author,
+            "content": row["content"],
+            "timestamp_created": row["timestamp_created"].isoformat(),
+            "timestamp_updated": row["timestamp_updated"].isoformat(),
+        })
+    return payloads
+
+
+def compact_payloads(payloads):
+    """
+    Build a page envelope listing each author once.
+
+    Args:
+        payloads (Iterable[dict]): ``new_message`` payloads.
+
+    Returns:
+        dict: ``authors`` (sender blocks) and ``messages`` (payloads whose
+        ``user`` is the author's ID).
+    """
+    authors = {}
+    messages = []
+    for payload in payloads:
+        author = payload["user"]
+        authors.setdefault(author["id"], author)
+        messages.append(dict(payload, user=author["id"]))
+    return {"authors": list(authors.values()), "messages": messages}
@@ -0,0 +1,532 @@
+"""
+Write-behind persistence for chat messages.
+
+When ``WEBCHAT["WRITE_BEHIND"]`` is enabled the ChatConsumer broadcasts each
+message straight away under a provisional ID and hands it to the per-process
+WriteBehindBuffer, which inserts the pending messages with ``bulk_create``
+once a batch fills up or the flush interval passes. Messages are written in
+the order they were received, and anything still pending is flushed when the
+process exits.
+
+A batch the database rejects for one of its rows (say, a message sent to a
+channel deleted before the flush) is retried row by row; the rows that still
+fail are dropped and their rooms are sent a ``chat.failed`` event. A batch
+failing for any other reason is retried on later ticks, up to
+``WEBCHAT["WRITE_BEHIND_MAX_RETRIES"]`` times, and the buffer holds at most
+``WEBCHAT["WRITE_BEHIND_MAX_PENDING"]`` messages.
+
+Every process also publishes the messages it has pending, per conversation,
+to the Django cache, and keeps each one there for a short while after it is
+persisted, along with its database ID. A socket reconnecting with
+``?since=`` reads them back through ``pending_messages()``, so its replay
+covers messages still buffered by other workers. Like the hot windows this
+relies on the cache being shared between processes, and is best-effort.
+"""
+
+import asyncio
+import atexit
+import itertools
+import logging
+import secrets
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import DataError, IntegrityError
+
+from ping_me_api.caching import bump_versions, version_key
+
+from .conf import webchat_setting
+from .hotwindow import hot_windows
+from .models import Messages
+from .payloads import message_payload
+
+logger = logging.getLogger(__name__)
+
+#: Random per-process token, keeps provisional IDs unique across workers.
+PROCESS_TOKEN = secrets.token_hex(4)
+
+#: Errors caused by the rows of a batch rather than by the database.
+ROW_ERRORS = (IntegrityError, DataError)
+
+#: Seconds a persisted message stays in the shared pending store, so a
+#: replay racing its flush still finds its provisional ID.
+PERSISTED_GRACE = 30
+
+#: Seconds a process's published pending messages (and its entry in the
+#: process registry) outlive its last update.
+PENDING_TIMEOUT = 300
+
+#: Seconds between refreshes of a process's entry in the process registry.
+REGISTER_INTERVAL = 10
+
+#: Cache key of the registry of processes publishing pending messages.
+PROCESSES_KEY = "webchat_write_behind_processes"
+
+
+def pending_key(conversation_id, token=PROCESS_TOKEN):
+    """
+    Returns:
+        str: The cache key of a process's pending messages in a conversation.
+    """
+    return f"webchat_pending_{int(conversation_id)}_{token}"
+
+
+def provisional_payload(pending):
+    """
+    Build the ``new_message`` payload broadcast for a pending message.
+
+    Args:
+        pending (dict): The pending message.
+
+    Returns:
+        dict: The payload, with the provisional ID and ``provisional: True``.
+    """
+    timestamp = pending["timestamp_created"].isoformat()
+    return {
+        "id": pending["provisional_id"],
+        "provisional": True,
+        "user": pending["sender"],
+        "content": pending["content"],
+        "timestamp_created": timestamp,
+        "timestamp_updated": timestamp,
+    }
+
+
+def pending_messages(conversation_id):
+    """
+    Read every process's published pending messages in a conversation.
+
+    Args:
+        conversation_id (int): The conversation ID.
+
+    Returns:
+        list[dict]: Entries with the ``message`` payload broadcast under the
+        provisional ID and the database ``id`` (None while still pending),
+        oldest first.
+    """
+    # This process's own entries are read even before it has registered.
+    tokens = set(cache.get(PROCESSES_KEY) or {}) | {PROCESS_TOKEN}
+    published = cache.get_many([pending_key(conversation_id, token) for token in tokens])
+    entries = [entry for messages in published.values() for entry in messages.values()]
+    return sorted(entries, key=lambda entry: entry["message"]["timestamp_created"])
+
+
+class WriteBehindFull(Exception):
+    """
+    Raised when a message is queued while the buffer is at its limit.
+    """
+
+
+class WriteBehindBuffer:
+    """
+    Per-process queue of broadcast messages waiting to be persisted.
+
+    Pending messages are plain dicts with the keys ``provisional_id``,
+    ``conversation_id``, ``channel_id``, ``room_group_name``, ``sender_id``,
+    ``sender`` (the sender block), ``content`` and ``timestamp_created``,
+    plus ``attempts`` once a flush of them has failed.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty buffer; the flusher task starts on first use.
+        """
+        self._pending = []
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._flush_lock = None
+        self._wakeup = None
+        self._task = None
+        self._published = {}
+        self._registered_at = 0
+
+    def provisional_id(self):
+        """
+        Return a new server-assigned provisional message ID.
+
+        Returns:
+            str: An ID unique to this process, e.g. ``"p1a2b3c4d-17"``.
+        """
+        return f"p{PROCESS_TOKEN}-{next(self._counter)}"
+
+    def enqueue(self, pending):
+        """
+        Queue a broadcast message for persistence.
+
+        Must be called from the event loop. Starts the flusher task if it
+        isn't running and wakes it early once a full batch is waiting. The
+        caller publishes the message's conversation before broadcasting it.
+
+        Args:
+            pending (dict): The pending message.
+
+        Raises:
+            WriteBehindFull: If ``WRITE_BEHIND_MAX_PENDING`` messages are
+                already waiting.
+        """
+        with self._lock:
+            if len(self._pending) >= webchat_setting("WRITE_BEHIND_MAX_PENDING"):
+                raise WriteBehindFull()
+            self._pending.append(pending)
+            self._published.setdefault(pending["conversation_id"], {})[pending["provisional_id"]] = {
+                "message": provisional_payload(pending), "id": None, "persisted_at": None,
+            }
+            size = len(self._pending)
+        self._ensure_flusher()
+        if size >= webchat_setting("WRITE_BEHIND_BATCH_SIZE"):
+            self._wakeup.set()
+
+    def publish(self, conversation_id):
+        """
+        Write this process's pending messages in a conversation to the cache.
+
+        Persisted messages older than PERSISTED_GRACE are left out. Runs in
+        the thread-sensitive executor (or at exit), so the writes of one
+        process never overtake each other.
+
+        Args:
+            conversation_id (int): The conversation ID.
+        """
+        now = time.time()
+        with self._lock:
+            messages = self._published.get(conversation_id, {})
+            for provisional_id, entry in list(messages.items()):
+                if entry["persisted_at"] is not None and now - entry["persisted_at"] > PERSISTED_GRACE:
+                    del messages[provisional_id]
+            snapshot = {
+                provisional_id: {"message": entry["message"], "id": entry["id"]}
+                for provisional_id, entry in messages.items()
+            }
+            if not messages:
+                self._published.pop(conversation_id, None)
+        if snapshot:
+            cache.set(pending_key(conversation_id), snapshot, PENDING_TIMEOUT)
+            self._register(now)
+        else:
+            cache.delete(pending_key(conversation_id))
+
+    def _register(self, now):
+        """
+        Refresh this process's entry in the process registry.
+
+        The registry is updated with a read-modify-write, so a concurrent
+        registration can be lost; it is redone every REGISTER_INTERVAL.
+
+        Args:
+            now (float): The current time.
+        """
+        if now - self._registered_at < REGISTER_INTERVAL:
+            return
+        processes = {
+            token: seen for token, seen in (cache.get(PROCESSES_KEY) or {}).items()
+            if now - seen < PENDING_TIMEOUT
+        }
+        processes[PROCESS_TOKEN] = now
+        cache.set(PROCESSES_KEY, processes, None)
+        self._registered_at = now
+
+    def _settle(self, persisted, failed):
+        """
+        Record persisted and dropped messages and republish their conversations.
+
+        Conversations whose messages have all outlived PERSISTED_GRACE are
+        republished too, which drops them.
+
+        Args:
+            persisted (list[tuple[dict, int]]): Persisted messages and their IDs.
+            failed (list[dict]): Messages that were dropped.
+        """
+        now = time.time()
+        touched = {pending["conversation_id"] for pending in failed}
+        touched.update(pending["conversation_id"] for pending, _ in persisted)
+        with self._lock:
+            for pending, message_id in persisted:
+                entry = self._published.get(pending["conversation_id"], {}).get(pending["provisional_id"])
+                if entry is not None:
+                    entry.update(id=message_id, persisted_at=now)
+            for pending in failed:
+                self._published.get(pending["conversation_id"], {}).pop(pending["provisional_id"], None)
+            touched.update(
+                conversation_id for conversation_id, messages in self._published.items()
+                if all(
+                    entry["persisted_at"] is not None and now - entry["persisted_at"] > PERSISTED_GRACE
+                    for entry in messages.values()
+                )
+            )
+        for conversation_id in touched:
+            self.publish(conversation_id)
+
+    def _write(self, batch):
+        """
+        Persist a batch and settle its messages; runs on the database thread.
+
+        Args:
+            batch (list[dict]): The pending messages, oldest first.
+
+        Returns:
+            tuple[list[tuple[dict, int]], list[dict]]: See ``write_pending``.
+        """
+        persisted, failed = write_pending(batch)
+        try:
+            self._settle(persisted, failed)
+        except Exception:
+            # The rows are committed; retrying them would insert duplicates.
+            logger.exception("Could not republish the pending messages of %d conversations", len(batch))
+        return persisted, failed
+
+    def _ensure_flusher(self):
+        """
+        Start the background flusher on the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._flush_lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        """
+        Flush pending messages every interval, or sooner when woken.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), webchat_setting("WRITE_BEHIND_FLUSH_INTERVAL")
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed, retrying on the next tick")
+
+    def _take(self):
+        """
+        Remove and return up to one batch of pending messages.
+
+        Returns:
+            list[dict]: The oldest pending messages.
+        """
+        with self._lock:
+            batch_size = webchat_setting("WRITE_BEHIND_BATCH_SIZE")
+            batch = self._pending[:batch_size]
+            del self._pending[:batch_size]
+        return batch
+
+    def _requeue(self, batch):
+        """
+        Put a batch that failed to persist back at the front of the queue.
+
+        Messages that have used up their ``WRITE_BEHIND_MAX_RETRIES``
+        attempts are not requeued.
+
+        Args:
+            batch (list[dict]): The messages to retry.
+
+        Returns:
+            list[dict]: The messages given up on.
+        """
+        retry, given_up = [], []
+        for pending in batch:
+            pending["attempts"] = pending.get("attempts", 0) + 1
+            if pending["attempts"] < webchat_setting("WRITE_BEHIND_MAX_RETRIES"):
+                retry.append(pending)
+            else:
+                given_up.append(pending)
+        with self._lock:
+            self._pending[:0] = retry
+        return given_up
+
+    def pending_count(self):
+        """
+        Returns:
+            int: How many messages are waiting to be persisted.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    async def flush(self):
+        """
+        Persist everything currently pending and announce the real IDs.
+
+        Each room group receives a ``chat.persisted`` event mapping the
+        provisional IDs of its messages to their database IDs, and a
+        ``chat.failed`` event listing those that could not be stored.
+
+        Returns:
+            dict: The database IDs of the messages this flush persisted, by
+            provisional ID.
+
+        Raises:
+            Exception: Whatever the database raised if a batch could not be
+                written at all; the batch is requeued for the next flush.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        ids = {}
+        async with self._flush_lock:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return ids
+                try:
+                    persisted, failed = await database_sync_to_async(self._write)(batch)
+                except Exception:
+                    given_up = self._requeue(batch)
+                    if given_up:
+                        logger.error("Dropping %d chat messages after repeated flush failures", len(given_up))
+                        await sync_to_async(self._settle)([], given_up)
+                        await announce_failed(given_up)
+                    raise
+                logger.debug("Persisted %d write-behind messages", len(persisted))
+                ids.update((pending["provisional_id"], message_id) for pending, message_id in persisted)
+                try:
+                    await announce_persisted(persisted)
+                    await announce_failed(failed)
+                except Exception:
+                    logger.exception("Could not announce %d persisted chat messages", len(persisted))
+
+    def flush_sync(self):
+        """
+        Persist everything pending without the event loop, used at exit.
+        """
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("Dropping %d unpersisted chat messages at exit", len(batch))
+                return
+
+
+def write_batch(batch):
+    """
+    Insert a batch of pending messages with a single ``bulk_create``.
+
+    Rows are inserted in queue order so database IDs follow the broadcast
+    order, then written through to their channels' hot windows (see
+    ``write_through``).
+
+    Args:
+        batch (list[dict]): The pending messages, oldest first.
+
+    Returns:
+        list[int]: The database IDs, in the same order as ``batch``.
+    """
+    messages = Messages.objects.bulk_create([
+        Messages(
+            conversation_id=pending["conversation_id"],
+            sender_id=pending["sender_id"],
+            content=pending["content"],
+            timestamp_created=pending["timestamp_created"],
+        )
+        for pending in batch
+    ])
+    write_through(batch, messages)
+    return [message.id for message in messages]
+
+
+def write_through(batch, messages):
+    """
+    Update the hot windows and history ETags for freshly inserted messages.
+
+    The rows are already committed at this point, so cache errors are only
+    logged: raising them would make the flusher requeue, and insert again, a
+    batch that is already stored. A window that misses the update is caught
+    by the hot-window verification, and a missed ETag bump by the
+    conversation's next one.
+
+    Args:
+        batch (list[dict]): The pending messages, oldest first.
+        messages (list[Messages]): The inserted rows, in the same order.
+    """
+    channels = {}
+    for pending, message in zip(batch, messages):
+        channels.setdefault(pending["channel_id"], []).append(message_payload(message, pending["sender"]))
+    try:
+        for channel_id, payloads in channels.items():
+            hot_windows.append(channel_id, payloads)
+    except Exception:
+        logger.exception("Could not write %d chat messages through to the hot windows", len(batch))
+    try:
+        # bulk_create sends no post_save, so invalidate the history ETags here.
+        bump_versions({version_key("conversation", pending["conversation_id"]) for pending in batch})
+    except Exception:
+        logger.exception("Could not bump the history versions of %d chat messages", len(batch))
+
+
+def write_pending(batch):
+    """
+    Persist a batch, falling back to one row at a time if a row is rejected.
+
+    Rows the database still rejects on their own are logged and left out,
+    so one bad row doesn't hold back the rest of the queue.
+
+    Args:
+        batch (list[dict]): The pending messages, oldest first.
+
+    Returns:
+        tuple[list[tuple[dict, int]], list[dict]]: The persisted messages
+        paired with their database IDs, and the messages that were rejected.
+    """
+    try:
+        return list(zip(batch, write_batch(batch))), []
+    except ROW_ERRORS:
+        logger.warning("Write-behind batch of %d rejected, retrying row by row", len(batch))
+    persisted, failed = [], []
+    for pending in batch:
+        try:
+            persisted.append((pending, write_batch([pending])[0]))
+        except ROW_ERRORS:
+            logger.exception("Dropping chat message %s", pending["provisional_id"])
+            failed.append(pending)
+    return persisted, failed
+
+
+async def announce_persisted(persisted):
+    """
+    Tell each room which database IDs its provisional messages received.
+
+    Args:
+        persisted (list[tuple[dict, int]]): The persisted pending messages
+            paired with their database IDs.
+    """
+    rooms = {}
+    for pending, message_id in persisted:
+        rooms.setdefault(pending["room_group_name"], {})[pending["provisional_id"]] = message_id
+    channel_layer = get_channel_layer()
+    for room_group_name, persisted in rooms.items():
+        await channel_layer.group_send(
+            room_group_name, {"type": "chat.persisted", "ids": persisted}
+        )
+
+
+async def announce_failed(failed):
+    """
+    Tell each room which of its provisional messages were not stored.
+
+    Args:
+        failed (list[dict]): The pending messages that were dropped.
+    """
+    rooms = {}
+    for pending in failed:
+        rooms.setdefault(pending["room_group_name"], []).append(pending["provisional_id"])
+    channel_layer = get_channel_layer()
+    for room_group_name, provisional_ids in rooms.items():
+        await channel_layer.group_send(
+            room_group_name, {"type": "chat.failed", "ids": provisional_ids}
+        )
+
+
+#: The process-wide write-behind buffer used by the ChatConsumer.
+write_behind = WriteBehindBuffer()
+
+# Flush whatever is still pending when the worker shuts down.
+atexit.register(write_behind.flush_sync)
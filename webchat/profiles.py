@@ -0,0 +1,60 @@
+"""
+Sender profile snapshots for the chat consumer.
+
+Each socket builds its sender's ``{id, username, image_url}`` block once at
+connect time and reuses it for every message. Every socket also joins a
+per-user group, so a profile edit can push the fresh snapshot to all of
+that user's open sockets through the channel layer.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from ping_me_api.images import image_url
+
+
+def user_group_name(user_id):
+    """
+    Return the channel-layer group every socket of a user joins.
+
+    Args:
+        user_id (int): The user's ID.
+
+    Returns:
+        str: The group name.
+    """
+    return f"user_{user_id}"
+
+
+def sender_snapshot(user):
+    """
+    Build the sender block used in message payloads.
+
+    Touches the ORM for the user's account, so callers on the event loop
+    must run it on the database thread pool.
+
+    Args:
+        user (User): The sending user.
+
+    Returns:
+        dict: The user's ID, username and avatar URL.
+    """
+    account = getattr(user, "account", None)
+    return {
+        "id": user.id,
+        "username": account.username if account else user.username,
+        "image_url": image_url(account.image) if account else None,
+    }
+
+
+def broadcast_profile_update(user):
+    """
+    Send a user's fresh sender snapshot to all of their connected sockets.
+
+    Args:
+        user (User): The user whose profile changed.
+    """
+    async_to_sync(get_channel_layer().group_send)(
+        user_group_name(user.id),
+        {"type": "profile.updated", "user": sender_snapshot(user)},
+    )
@@ -0,0 +1,107 @@
+"""
+Read watermarks and unread counts.
+
+Each account has one ``ReadState`` per conversation it has read, holding the
+``(timestamp_created, id)`` of the last message read. The ChatConsumer and
+the REST API advance it; it never moves backwards, so a stale client can't
+mark messages unread again.
+
+Unread counts for all of a user's channels come from one query: for each
+conversation, a correlated subquery counts the messages after the watermark,
+stopping at ``WEBCHAT["UNREAD_COUNT_CAP"]``. Each count is a bounded range
+of the ``(conversation, timestamp_created, id)`` index, however long the
+history behind the watermark is.
+"""
+
+from datetime import datetime, timezone
+
+from django.db.models import FilteredRelation, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .conf import webchat_setting
+from .models import ConversationModel, Messages, ReadState
+
+#: Watermark of a conversation the account has never read.
+NEVER_READ = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class SubqueryCount(Subquery):
+    """
+    Count the rows of a (sliced) subquery.
+    """
+    template = "(SELECT COUNT(*) FROM (%(subquery)s) subquery_count)"
+    output_field = IntegerField()
+
+
+def advance_read_state(account_id, conversation_id, message_id):
+    """
+    Move an account's watermark in a conversation forward to a message.
+
+    Args:
+        account_id (int): The reader's account ID.
+        conversation_id (int): The conversation read.
+        message_id (int): The last message read.
+
+    Returns:
+        bool: True if the watermark moved, False if it was already at or
+        past the message, or the message isn't in the conversation.
+    """
+    try:
+        read_at = Messages.objects.values_list("timestamp_created", flat=True).get(
+            id=message_id, conversation_id=conversation_id
+        )
+    except Messages.DoesNotExist:
+        return False
+    state, created = ReadState.objects.get_or_create(
+        account_id=account_id,
+        conversation_id=conversation_id,
+        defaults={"last_read_at": read_at, "last_read_id": message_id},
+    )
+    if created:
+        return True
+    # Conditional, so concurrent advances can only ever keep the furthest.
+    return bool(
+        ReadState.objects.filter(pk=state.pk)
+        .filter(Q(last_read_at__lt=read_at) | Q(last_read_at=read_at, last_read_id__lt=message_id))
+        .update(last_read_at=read_at, last_read_id=message_id)
+    )
+
+
+def unread_counts(account):
+    """
+    Count the unread messages of every channel in the account's servers.
+
+    Messages the account's user sent themselves are never unread.
+
+    Args:
+        account (Account): The reader.
+
+    Returns:
+        dict: ``cap`` (the most counted per channel), ``channels`` and
+        ``servers`` (IDs, as strings, to their unread counts). Channels and
+        servers with nothing unread are left out; server counts are capped too.
+    """
+    cap = webchat_setting("UNREAD_COUNT_CAP")
+    unread = (
+        Messages.objects.filter(conversation=OuterRef("pk"), timestamp_created__gte=OuterRef("read_at"))
+        .filter(Q(timestamp_created__gt=OuterRef("read_at")) | Q(id__gt=OuterRef("read_id")))
+        .exclude(sender_id=account.owner_id)
+        .order_by()
+        .values("id")[:cap]
+    )
+    rows = (
+        ConversationModel.objects.filter(channel__server__members=account)
+        .alias(state=FilteredRelation("read_states", condition=Q(read_states__account=account)))
+        .annotate(
+            read_at=Coalesce("state__last_read_at", Value(NEVER_READ)),
+            read_id=Coalesce("state__last_read_id", Value(0)),
+            unread=SubqueryCount(unread),
+        )
+        .values_list("channel_id", "channel__server_id", "unread")
+    )
+    channels, servers = {}, {}
+    for channel_id, server_id, count in rows:
+        if count:
+            channels[str(channel_id)] = count
+            servers[str(server_id)] = min(servers.get(str(server_id), 0) + count, cap)
+    return {"cap": cap, "channels": channels, "servers": servers}
@@ -6,13 +6,33 @@ API endpoints, including response schemas and query parameters for use with drf_
 """
 
 from drf_spectacular.types import OpenApiTypes
-from drf_spectacular.utils import OpenApiParameter, extend_schema
+from drf_spectacular.utils import OpenApiParameter, extend_schema, inline_serializer
+from rest_framework import serializers
 
 from .serializers import MessageSerializer
 
 # --- Message List Endpoint ---
+message_author = inline_serializer(
+    name="MessageAuthor",
+    fields={
+        "id": serializers.IntegerField(),
+        "username": serializers.CharField(),
+        "image_url": serializers.CharField(allow_null=True),
+    },
+)
+
 list_message_docs = extend_schema(
-    responses=MessageSerializer(many=True),
+    responses=inline_serializer(
+        name="MessagePayload",
+        many=True,
+        fields={
+            "id": serializers.IntegerField(),
+            "user": message_author,
+            "content": serializers.CharField(),
+            "timestamp_created": serializers.DateTimeField(),
+            "timestamp_updated": serializers.DateTimeField(),
+        },
+    ),
     parameters=[
         OpenApiParameter(
             name="channel_id",
@@ -20,9 +40,128 @@ list_message_docs = extend_schema(
             location=OpenApiParameter.QUERY,
             description="ID of the channel",
             required=True,
-        )
+        ),
+        OpenApiParameter(
+            name="before",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Return the messages sent before this message ID",
+        ),
+        OpenApiParameter(
+            name="after",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Return the messages sent after this message ID",
+        ),
+        OpenApiParameter(
+            name="around",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Return the messages surrounding this message ID",
+        ),
+        OpenApiParameter(
+            name="limit",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Number of messages to return (default 50, max 100)",
+        ),
+        OpenApiParameter(
+            name="compact",
+            type=OpenApiTypes.BOOL,
+            location=OpenApiParameter.QUERY,
+            description="Return {authors, messages} with each author listed once and messages referring to them by ID",
+        ),
+    ],
+    description="List one page of messages in a conversation by channel_id, oldest first, "
+                "in the same shape as the websocket new_message payload.",
+    tags=["Messages"],
+)
+
+# --- Latest Messages Endpoint ---
+latest_messages_docs = extend_schema(
+    responses=OpenApiTypes.OBJECT,
+    parameters=[
+        OpenApiParameter(
+            name="channel_ids",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Comma-separated channel IDs (at most 200); defaults to every channel "
+                        "of the user's servers",
+        ),
+    ],
+    description="Return the newest message of each channel, keyed by channel ID, in the same "
+                "shape as the websocket new_message payload. Channels without messages are left out.",
+    tags=["Messages"],
+)
+
+# --- Message Search Endpoint ---
+search_messages_docs = extend_schema(
+    responses=OpenApiTypes.OBJECT,
+    parameters=[
+        OpenApiParameter(
+            name="q",
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            description="Words every result must contain",
+            required=True,
+        ),
+        OpenApiParameter(
+            name="channel_id",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Search this channel (give this or server_id)",
+        ),
+        OpenApiParameter(
+            name="server_id",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Search every channel of this server (give this or channel_id)",
+        ),
+        OpenApiParameter(
+            name="before",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Return the results older than this message ID (the previous page's next)",
+        ),
+        OpenApiParameter(
+            name="limit",
+            type=OpenApiTypes.INT,
+            location=OpenApiParameter.QUERY,
+            description="Number of results to return (default 50, max 100)",
+        ),
     ],
-    description="List all messages in a conversation by channel_id.",
+    description="Full-text search of a channel or server, newest first. Each result is a "
+                "new_message payload with an HTML-escaped snippet marking the matches with <mark>.",
+    tags=["Messages"],
+)
+
+# --- Read Watermark Endpoint ---
+read_messages_docs = extend_schema(
+    request=inline_serializer(
+        name="ReadWatermark",
+        fields={
+            "channel_id": serializers.IntegerField(),
+            "message_id": serializers.IntegerField(),
+        },
+    ),
+    responses=inline_serializer(name="ReadWatermarkResult", fields={"advanced": serializers.BooleanField()}),
+    description="Advance the user's read watermark in a channel to a message. The watermark "
+                "only moves forward.",
+    tags=["Messages"],
+)
+
+# --- Unread Counts Endpoint ---
+unread_counts_docs = extend_schema(
+    responses=inline_serializer(
+        name="UnreadCounts",
+        fields={
+            "cap": serializers.IntegerField(),
+            "channels": serializers.DictField(child=serializers.IntegerField()),
+            "servers": serializers.DictField(child=serializers.IntegerField()),
+        },
+    ),
+    description="Unread message counts per channel and per server for all of the user's servers, "
+                "each capped at cap. Channels and servers with nothing unread are left out.",
     tags=["Messages"],
 )
 
@@ -0,0 +1,229 @@
+"""
+Full-text search over chat history.
+
+Messages are matched through a database-native index (see migration
+``0009_messages_search_index``): a GIN-indexed ``tsvector`` column on
+PostgreSQL and an FTS5 table on SQLite. Both are kept in sync with inserts,
+edits and deletes by the database itself.
+
+Results are newest first and paginated with a ``before`` message ID, like
+the history pages, so a deep page costs no more than the first. Snippets
+are only built for the page being returned. Where old messages are moved to
+the archive table (SQLite), it has an FTS5 table of its own and results
+carry on into it.
+"""
+
+import html
+import re
+
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+
+from .pagination import MessageCursorPagination
+from .payloads import row_payloads
+
+#: Marks put around matched words by the database; escaped content can't
+#: contain them, so they are safely swapped for ``<mark>`` tags afterwards.
+START_MARK, STOP_MARK = "\x02", "\x03"
+
+#: Most words a search query may have.
+MAX_TERMS = 10
+
+
+def search_terms(query):
+    """
+    Split a search query into the words every result must contain.
+
+    Args:
+        query (str): The query as typed by the user.
+
+    Returns:
+        list[str]: The words, at most MAX_TERMS.
+
+    Raises:
+        ValidationError: If the query has no words.
+    """
+    terms = re.findall(r"\w+", query)[:MAX_TERMS]
+    if not terms:
+        raise ValidationError({"q": "Must contain at least one word."})
+    return terms
+
+
+def highlight(snippet):
+    """
+    Escape a snippet and turn the database's match marks into ``<mark>`` tags.
+
+    Args:
+        snippet (str): The snippet as returned by the database.
+
+    Returns:
+        str: HTML-safe text with the matched words in ``<mark>`` tags.
+    """
+    return html.escape(snippet).replace(START_MARK, "<mark>").replace(STOP_MARK, "</mark>")
+
+
+class PostgresSearch:
+    """
+    Search backed by the ``search_vector`` column and its GIN index.
+    """
+
+    def match(self, messages, terms):
+        """
+        Narrow messages to those containing every term.
+
+        Args:
+            messages (QuerySet): The messages in scope.
+            terms (list[str]): The words from ``search_terms``.
+
+        Returns:
+            QuerySet: The matching messages.
+        """
+        tsquery = " & ".join(terms)
+        return messages.alias(
+            matches_search=RawSQL(
+                "\"webchat_messages\".\"search_vector\" @@ to_tsquery('simple', %s)",
+                [tsquery],
+                output_field=BooleanField(),
+            )
+        ).filter(matches_search=True)
+
+    def snippets(self, model, message_ids, terms):
+        """
+        Build a marked-up snippet of each message around the matched words.
+
+        Args:
+            model (Model): Messages (the only model with a search index here).
+            message_ids (list[int]): The messages on the page.
+            terms (list[str]): The words from ``search_terms``.
+
+        Returns:
+            dict: Message ID to its snippet.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, ts_headline('simple', content, to_tsquery('simple', %s), %s) "
+                "FROM webchat_messages WHERE id = ANY(%s)",
+                [" & ".join(terms), f"StartSel={START_MARK}, StopSel={STOP_MARK}, MaxWords=20, MinWords=8",
+                 list(message_ids)],
+            )
+            return dict(cursor.fetchall())
+
+
+class SQLiteSearch:
+    """
+    Search backed by the ``webchat_messages_fts`` FTS5 table.
+    """
+
+    def fts_query(self, terms):
+        """
+        Returns:
+            str: An FTS5 query matching every term as a plain token, never
+            as query syntax.
+        """
+        return " ".join(f'"{term}"' for term in terms)
+
+    def match(self, messages, terms):
+        """
+        Narrow messages to those containing every term.
+
+        Args:
+            messages (QuerySet): The messages in scope.
+            terms (list[str]): The words from ``search_terms``.
+
+        Returns:
+            QuerySet: The matching messages.
+        """
+        fts_table = f"{messages.model._meta.db_table}_fts"
+        return messages.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s",
+                [self.fts_query(terms)],
+            )
+        )
+
+    def snippets(self, model, message_ids, terms):
+        """
+        Build a marked-up snippet of each message around the matched words.
+
+        Args:
+            model (Model): Messages or ArchivedMessage, whichever holds them.
+            message_ids (list[int]): The messages on the page.
+            terms (list[str]): The words from ``search_terms``.
+
+        Returns:
+            dict: Message ID to its snippet.
+        """
+        message_ids = list(message_ids)
+        fts_table = f"{model._meta.db_table}_fts"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({fts_table}, 0, %s, %s, '…', 16) "
+                f"FROM {fts_table} WHERE {fts_table} MATCH %s "
+                f"AND rowid IN ({', '.join(['%s'] * len(message_ids))})",
+                [START_MARK, STOP_MARK, self.fts_query(terms), *message_ids],
+            )
+            return dict(cursor.fetchall())
+
+
+#: The search implementation for each supported database vendor.
+BACKENDS = {"postgresql": PostgresSearch(), "sqlite": SQLiteSearch()}
+
+
+def search_page(messages, request, archive=None):
+    """
+    Return one page of search results.
+
+    Args:
+        messages (QuerySet): The messages in scope, as ``values()`` rows with
+            the ``MESSAGE_VALUES`` columns.
+        request (Request): The incoming HTTP request, with the query in ``q``
+            and optionally ``before`` and ``limit``.
+        archive (QuerySet): The archived messages in scope, in the same
+            shape, if the archive is in use.
+
+    Returns:
+        dict: ``results`` (``new_message`` payloads, newest first, each with
+        a highlighted ``snippet``) and ``next`` (the ``before`` value of the
+        following page, or None on the last page).
+
+    Raises:
+        ValidationError: If the query or the pagination parameters are invalid.
+    """
+    terms = search_terms(request.query_params.get("q", ""))
+    backend = BACKENDS[connection.vendor]
+    pagination = MessageCursorPagination()
+    limit = pagination.get_limit(request)
+    tiers = [backend.match(messages, terms)]
+    if archive is not None:
+        tiers.append(backend.match(archive, terms))
+
+    key = None
+    before = request.query_params.get("before")
+    if before is not None:
+        if not before.isdigit():
+            raise ValidationError({"before": "Must be a message ID."})
+        found = pagination.find_anchor(int(before), messages, archive)
+        if found is None:
+            raise ValidationError({"before": "No such message in this scope."})
+        tier, timestamp = found
+        key = (timestamp, int(before))
+        if tier is archive:
+            tiers = tiers[1:]
+
+    # One extra row tells whether there is a following page.
+    rows = pagination.older(tiers[0], limit + 1, key, archive=tiers[1] if len(tiers) > 1 else None)
+    rows.reverse()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    snippets = {}
+    for tier in tiers:
+        missing = [row["id"] for row in rows if row["id"] not in snippets]
+        if missing:
+            snippets.update(backend.snippets(tier.model, missing, terms))
+    results = [
+        dict(payload, snippet=highlight(snippets.get(payload["id"], payload["content"])))
+        for payload in row_payloads(rows)
+    ]
+    return {"results": results, "next": rows[-1]["id"] if more else None}
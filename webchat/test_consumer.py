@@ -0,0 +1,448 @@
+import asyncio
+import time
+from unittest import mock
+
+import msgpack
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.contrib.auth.models import AnonymousUser
+from django.db import OperationalError
+from django.test import override_settings
+
+from ping_me_api.routing import websocket_urlpatterns
+from ping_me_api.testing import PingMeTransactionTestCase
+from server.models import Channel, Server, ServerCategory
+from webchat.conversations import conversation_cache, resolve_conversation_id
+from webchat.hotwindow import hot_windows
+from webchat.models import ConversationModel, Messages, ReadState
+from webchat.payloads import MESSAGE_VALUES
+from webchat.persistence import PROCESSES_KEY, pending_key, write_behind
+from webchat.profiles import broadcast_profile_update
+
+
+def with_user(user):
+    router = URLRouter(websocket_urlpatterns)
+
+    async def application(scope, receive, send):
+        return await router(dict(scope, user=user), receive, send)
+
+    return application
+
+
+def with_stalled_socket(user, drained):
+    application = with_user(user)
+
+    async def stalled(scope, receive, send):
+        # Like a server whose send waits for the socket to drain.
+        async def send_when_drained(message):
+            if message['type'] == 'websocket.send':
+                await drained.wait()
+            await send(message)
+
+        return await application(scope, receive, send_when_drained)
+
+    return stalled
+
+
+class TestChatConsumer(PingMeTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user('sockuser')
+        category = ServerCategory.objects.create(name='sockcat')
+        server = Server.objects.create(name='sockserver', owner=self.user.account, category=category)
+        self.channel = Channel.objects.create(name='sockchannel', server=server, owner=self.user.account)
+        self.path = f'{server.id}/{self.channel.id}'
+
+    def test_anonymous_connection_is_rejected(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(AnonymousUser()), '1/1')
+            connected, _ = await communicator.connect()
+            return connected
+
+        self.assertFalse(async_to_sync(scenario)())
+
+    def test_message_is_saved_and_broadcast(self):
+        async def scenario():
+            sender = WebsocketCommunicator(with_user(self.user), self.path)
+            listener = WebsocketCommunicator(with_user(self.user), self.path)
+            await sender.connect()
+            await listener.connect()
+            await sender.send_json_to({'message': 'hello'})
+            received = await listener.receive_json_from()
+            await sender.disconnect()
+            await listener.disconnect()
+            return received
+
+        received = async_to_sync(scenario)()
+        message = received['message']
+        self.assertEqual(message['content'], 'hello')
+        self.assertEqual(message['user']['id'], self.user.id)
+        self.assertEqual(message['user']['username'], 'sockuser')
+        self.assertTrue(message['user']['image_url'].startswith('https://'))
+        self.assertEqual(Messages.objects.get().id, message['id'])
+
+    @override_settings(WEBCHAT={'WRITE_BEHIND': True, 'WRITE_BEHIND_FLUSH_INTERVAL': 60})
+    def test_write_behind_broadcasts_first_and_persists_in_order(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), self.path)
+            await communicator.connect()
+            provisional = []
+            for text in ('one', 'two', 'three'):
+                await communicator.send_json_to({'message': text})
+                provisional.append((await communicator.receive_json_from())['message'])
+            persisted_before_flush = await database_sync_to_async(Messages.objects.count)()
+            await write_behind.flush()
+            persisted = (await communicator.receive_json_from())['persisted']
+            await communicator.disconnect()
+            return provisional, persisted_before_flush, persisted
+
+        provisional, persisted_before_flush, persisted = async_to_sync(scenario)()
+        self.assertEqual(persisted_before_flush, 0)
+        self.assertTrue(all(message['provisional'] for message in provisional))
+        ids = [persisted[message['id']] for message in provisional]
+        self.assertEqual(
+            list(Messages.objects.order_by('id').values_list('id', 'content')),
+            list(zip(ids, ['one', 'two', 'three'])),
+        )
+
+    @override_settings(WEBCHAT={'WRITE_BEHIND': True, 'WRITE_BEHIND_FLUSH_INTERVAL': 60})
+    def test_write_behind_drops_rows_the_database_rejects(self):
+        other = Channel.objects.create(name='otherchannel', server=self.channel.server, owner=self.user.account)
+
+        async def scenario():
+            doomed = WebsocketCommunicator(with_user(self.user), self.path)
+            kept = WebsocketCommunicator(with_user(self.user), f'{other.server_id}/{other.id}')
+            await doomed.connect()
+            await kept.connect()
+            await doomed.send_json_to({'message': 'to a deleted channel'})
+            doomed_id = (await doomed.receive_json_from())['message']['id']
+            await kept.send_json_to({'message': 'kept'})
+            kept_id = (await kept.receive_json_from())['message']['id']
+            await database_sync_to_async(self.channel.delete)()
+            await write_behind.flush()
+            failed = await doomed.receive_json_from()
+            persisted = await kept.receive_json_from()
+            await doomed.disconnect()
+            await kept.disconnect()
+            return doomed_id, kept_id, failed, persisted
+
+        doomed_id, kept_id, failed, persisted = async_to_sync(scenario)()
+        self.assertEqual(failed, {'failed': [doomed_id]})
+        self.assertEqual(write_behind.pending_count(), 0)
+        message = Messages.objects.get()
+        self.assertEqual((message.content, persisted['persisted'][kept_id]), ('kept', message.id))
+
+    @override_settings(WEBCHAT={'WRITE_BEHIND': True, 'WRITE_BEHIND_FLUSH_INTERVAL': 60})
+    def test_write_behind_cache_errors_after_the_insert_are_not_retried(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), self.path)
+            await communicator.connect()
+            await communicator.send_json_to({'message': 'once'})
+            provisional = (await communicator.receive_json_from())['message']
+            timeout = ConnectionError('cache timed out')
+            with mock.patch.object(hot_windows, 'append', side_effect=timeout), \
+                    mock.patch.object(write_behind, 'publish', side_effect=timeout):
+                await write_behind.flush()
+            persisted = await communicator.receive_json_from()
+            await write_behind.flush()
+            await communicator.disconnect()
+            return provisional, persisted
+
+        provisional, persisted = async_to_sync(scenario)()
+        message = Messages.objects.get()
+        self.assertEqual(persisted, {'persisted': {provisional['id']: message.id}})
+        self.assertEqual(write_behind.pending_count(), 0)
+
+    @override_settings(WEBCHAT={
+        'WRITE_BEHIND': True, 'WRITE_BEHIND_FLUSH_INTERVAL': 60, 'WRITE_BEHIND_MAX_PENDING': 1,
+    })
+    def test_full_write_behind_buffer_is_flushed_before_queueing(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), self.path)
+            await communicator.connect()
+            await communicator.send_json_to({'message': 'one'})
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'message': 'two'})
+            frames = [await communicator.receive_json_from() for _ in range(2)]
+            await communicator.disconnect()
+            return frames
+
+        frames = async_to_sync(scenario)()
+        self.assertEqual([list(frame) for frame in frames], [['persisted'], ['message']])
+        self.assertEqual(list(Messages.objects.values_list('content', flat=True)), ['one'])
+        self.assertEqual(write_behind.pending_count(), 1)
+        write_behind.flush_sync()
+
+    @override_settings(WEBCHAT={'HOT_WINDOW_VERIFY_RATE': 0})
+    def test_saved_message_is_written_through_to_the_hot_window(self):
+        rows = Messages.objects.filter(conversation__channel=self.channel).values(*MESSAGE_VALUES)
+        hot_windows.newest_page(self.channel.id, rows, 50)
+
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), self.path)
+            await communicator.connect()
+            await communicator.send_json_to({'message': 'cached'})
+            received = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return received['message']
+
+        message = async_to_sync(scenario)()
+        with self.assertNumQueries(0):
+            self.assertEqual(hot_windows.newest_page(self.channel.id, rows, 50), [message])
+
+    def test_read_frames_advance_the_watermark(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), self.path)
+            await communicator.connect()
+            await communicator.send_json_to({'message': 'first'})
+            first = await communicator.receive_json_from()
+            await communicator.send_json_to({'read': first['message']['id']})
+            # Frames are handled in order, so this echo follows the read.
+            await communicator.send_json_to({'message': 'second'})
+            await communicator.receive_json_from()
+            await communicator.disconnect()
+            return first['message']['id']
+
+        first_id = async_to_sync(scenario)()
+        state = ReadState.objects.get()
+        self.assertEqual((state.account, state.last_read_id), (self.user.account, first_id))
+
+    def test_conversation_is_resolved_once_per_channel(self):
+        channel_id = str(self.channel.id)
+        conversation_id = resolve_conversation_id(channel_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_conversation_id(channel_id), conversation_id)
+        conversation_cache.clear()
+        self.assertEqual(resolve_conversation_id(channel_id), conversation_id)
+        self.assertEqual(ConversationModel.objects.filter(channel=self.channel).count(), 1)
+
+    def test_unknown_channel_is_rejected(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), f'{self.channel.server_id}/999999')
+            connected, _ = await communicator.connect()
+            return connected
+
+        self.assertFalse(async_to_sync(scenario)())
+        self.assertFalse(ConversationModel.objects.exists())
+
+    def test_deleting_channel_deletes_its_history(self):
+        conversation_id = resolve_conversation_id(str(self.channel.id))
+        Messages.objects.create(conversation_id=conversation_id, sender=self.user, content='gone soon')
+        self.channel.delete()
+        self.assertFalse(ConversationModel.objects.exists())
+        self.assertFalse(Messages.objects.exists())
+        self.assertIsNone(conversation_cache.get(self.channel.id))
+
+    def test_profile_update_reaches_connected_sockets(self):
+        def rename():
+            self.user.account.username = 'renamed'
+            self.user.account.save()
+            broadcast_profile_update(self.user)
+
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), self.path)
+            await communicator.connect()
+            await database_sync_to_async(rename)()
+            await communicator.send_json_to({'message': 'after rename'})
+            received = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return received
+
+        self.assertEqual(async_to_sync(scenario)()['message']['user']['username'], 'renamed')
+
+    @override_settings(WEBCHAT={'COALESCE_WINDOW_MS': 20})
+    def test_coalesced_messages_arrive_as_one_batch_frame(self):
+        async def scenario():
+            batched = WebsocketCommunicator(with_user(self.user), self.path, subprotocols=['pingme.batch.v1'])
+            plain = WebsocketCommunicator(with_user(self.user), self.path)
+            _, subprotocol = await batched.connect()
+            await plain.connect()
+            for text in ('one', 'two', 'three'):
+                await batched.send_json_to({'message': text})
+            batch = await batched.receive_json_from()
+            singles = [await plain.receive_json_from() for _ in range(3)]
+            await batched.disconnect()
+            await plain.disconnect()
+            return subprotocol, batch, singles
+
+        subprotocol, batch, singles = async_to_sync(scenario)()
+        self.assertEqual(subprotocol, 'pingme.batch.v1')
+        self.assertEqual([m['content'] for m in batch['messages']], ['one', 'two', 'three'])
+        self.assertEqual([frame['message']['content'] for frame in singles], ['one', 'two', 'three'])
+
+    def test_msgpack_subprotocol_exchanges_binary_frames(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), self.path, subprotocols=['pingme.msgpack.v1'])
+            _, subprotocol = await communicator.connect()
+            await communicator.send_to(bytes_data=msgpack.packb({'message': 'packed'}))
+            frame = await communicator.receive_from()
+            await communicator.disconnect()
+            return subprotocol, frame
+
+        subprotocol, frame = async_to_sync(scenario)()
+        self.assertEqual(subprotocol, 'pingme.msgpack.v1')
+        self.assertIsInstance(frame, bytes)
+        self.assertEqual(msgpack.unpackb(frame)['message']['content'], 'packed')
+
+    def test_reconnect_with_since_replays_only_missed_messages(self):
+        conversation_id = resolve_conversation_id(str(self.channel.id))
+        first, second, third = [
+            Messages.objects.create(conversation_id=conversation_id, sender=self.user, content=text)
+            for text in ('seen', 'missed one', 'missed two')
+        ]
+
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), f'{self.path}?since={first.id}')
+            await communicator.connect()
+            replay = await communicator.receive_json_from()
+            await communicator.send_json_to({'message': 'live'})
+            live = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return replay, live
+
+        replay, live = async_to_sync(scenario)()
+        self.assertTrue(replay['complete'])
+        self.assertEqual([m['id'] for m in replay['replay']], [second.id, third.id])
+        self.assertEqual(live['message']['content'], 'live')
+
+    @override_settings(WEBCHAT={'WRITE_BEHIND': True, 'WRITE_BEHIND_FLUSH_INTERVAL': 60})
+    def test_write_behind_replay_drops_the_provisional_copy(self):
+        conversation_id = resolve_conversation_id(str(self.channel.id))
+        seen = Messages.objects.create(conversation_id=conversation_id, sender=self.user, content='seen')
+        room = f'chat_s{self.channel.server_id}_c{self.channel.id}'
+
+        async def scenario():
+            sender = WebsocketCommunicator(with_user(self.user), self.path)
+            await sender.connect()
+            await sender.send_json_to({'message': 'pending'})
+            provisional = (await sender.receive_json_from())['message']
+            reconnected = WebsocketCommunicator(with_user(self.user), f'{self.path}?since={seen.id}')
+            await reconnected.connect()
+            replay = await reconnected.receive_json_from()
+            persisted = await reconnected.receive_json_from()
+            # The broadcast as it would have been queued had it come in after the join.
+            await get_channel_layer().group_send(room, {'type': 'chat.message', 'new_message': provisional})
+            await sender.send_json_to({'message': 'live'})
+            live = await reconnected.receive_json_from()
+            await sender.disconnect()
+            await reconnected.disconnect()
+            return provisional, replay, persisted, live
+
+        provisional, replay, persisted, live = async_to_sync(scenario)()
+        message = Messages.objects.get(content='pending')
+        self.assertEqual([m['id'] for m in replay['replay']], [message.id])
+        self.assertEqual(persisted, {'persisted': {provisional['id']: message.id}})
+        self.assertEqual(live['message']['content'], 'live')
+        write_behind.flush_sync()
+
+    @override_settings(WEBCHAT={'WRITE_BEHIND': True, 'WRITE_BEHIND_FLUSH_INTERVAL': 60})
+    def test_replay_survives_a_failed_write_behind_flush(self):
+        conversation_id = resolve_conversation_id(str(self.channel.id))
+        seen = Messages.objects.create(conversation_id=conversation_id, sender=self.user, content='seen')
+
+        async def scenario():
+            sender = WebsocketCommunicator(with_user(self.user), self.path)
+            await sender.connect()
+            await sender.send_json_to({'message': 'pending'})
+            provisional = (await sender.receive_json_from())['message']
+            reconnected = WebsocketCommunicator(with_user(self.user), f'{self.path}?since={seen.id}')
+            outage = OperationalError('database is unavailable')
+            with mock.patch('webchat.persistence.write_pending', side_effect=outage):
+                connected, _ = await reconnected.connect()
+                replay = await reconnected.receive_json_from()
+            await sender.disconnect()
+            await reconnected.disconnect()
+            return provisional, connected, replay
+
+        provisional, connected, replay = async_to_sync(scenario)()
+        self.assertTrue(connected)
+        self.assertEqual(replay['replay'], [provisional])
+        self.assertEqual(write_behind.pending_count(), 1)
+        write_behind.flush_sync()
+
+    @override_settings(WEBCHAT={'WRITE_BEHIND': True, 'WRITE_BEHIND_FLUSH_INTERVAL': 60})
+    def test_replay_includes_messages_pending_in_other_processes(self):
+        conversation_id = resolve_conversation_id(str(self.channel.id))
+        room = f'chat_s{self.channel.server_id}_c{self.channel.id}'
+        elsewhere = {
+            'id': 'pother-1', 'provisional': True, 'user': {'id': self.user.id}, 'content': 'elsewhere',
+            'timestamp_created': '2026-01-01T00:00:00+00:00', 'timestamp_updated': '2026-01-01T00:00:00+00:00',
+        }
+        cache.set(PROCESSES_KEY, {'other': time.time()})
+        cache.set(pending_key(conversation_id, 'other'), {'pother-1': {'message': elsewhere, 'id': None}})
+
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), f'{self.path}?since=0')
+            await communicator.connect()
+            replay = await communicator.receive_json_from()
+            await get_channel_layer().group_send(room, {'type': 'chat.message', 'new_message': elsewhere})
+            await communicator.send_json_to({'message': 'live'})
+            live = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return replay, live
+
+        replay, live = async_to_sync(scenario)()
+        self.assertEqual(replay['replay'], [elsewhere])
+        self.assertEqual(live['message']['content'], 'live')
+        write_behind.flush_sync()
+
+    @override_settings(WEBCHAT={'OUTBOUND_QUEUE_SIZE': 1, 'SLOW_CONSUMER_POLICY': 'drop'})
+    def test_slow_socket_drops_frames_over_its_outbound_queue(self):
+        async def scenario():
+            drained = asyncio.Event()
+            communicator = WebsocketCommunicator(with_stalled_socket(self.user, drained), self.path)
+            await communicator.connect()
+            for text in ('one', 'two', 'three'):
+                await communicator.send_json_to({'message': text})
+            # One frame is being written and one is queued, so the third is dropped.
+            for _ in range(100):
+                if await database_sync_to_async(Messages.objects.count)() == 3:
+                    break
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            drained.set()
+            frames = [await communicator.receive_json_from() for _ in range(2)]
+            nothing_else = await communicator.receive_nothing()
+            await communicator.disconnect()
+            return frames, nothing_else
+
+        frames, nothing_else = async_to_sync(scenario)()
+        self.assertEqual([frame['message']['content'] for frame in frames], ['one', 'two'])
+        self.assertTrue(nothing_else)
+        self.assertEqual(Messages.objects.count(), 3)
+
+    @override_settings(WEBCHAT={'OUTBOUND_QUEUE_SIZE': 1, 'SLOW_CONSUMER_POLICY': 'disconnect'})
+    def test_slow_socket_is_closed_with_4008(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(with_stalled_socket(self.user, asyncio.Event()), self.path)
+            await communicator.connect()
+            for text in ('one', 'two', 'three'):
+                await communicator.send_json_to({'message': text})
+            closed = await communicator.receive_output()
+            await communicator.disconnect()
+            return closed
+
+        self.assertEqual(async_to_sync(scenario)(), {'type': 'websocket.close', 'code': 4008})
+
+    @override_settings(WEBCHAT={'SOCKET_RATE': 0.01, 'SOCKET_BURST': 2, 'RATE_LIMIT_CLOSE_AFTER': 2})
+    def test_over_limit_frames_get_an_error_then_a_close(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(with_user(self.user), self.path)
+            await communicator.connect()
+            for text in ('one', 'two', 'three'):
+                await communicator.send_json_to({'message': text})
+            frames = [await communicator.receive_json_from() for _ in range(3)]
+            await communicator.send_json_to({'message': 'four'})
+            closed = await communicator.receive_output()
+            await communicator.disconnect()
+            return frames, closed
+
+        frames, closed = async_to_sync(scenario)()
+        self.assertEqual([f['message']['content'] for f in frames if 'message' in f], ['one', 'two'])
+        self.assertEqual([f['error']['code'] for f in frames if 'error' in f], ['rate_limited'])
+        self.assertEqual(closed, {'type': 'websocket.close', 'code': 4029})
+        self.assertEqual(Messages.objects.count(), 2)
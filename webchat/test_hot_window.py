@@ -0,0 +1,125 @@
+import tempfile
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ping_me_api.testing import PingMeTestCase
+from server.models import Channel, Server, ServerCategory
+from webchat.hotwindow import HotWindowCache, hot_windows
+from webchat.models import ConversationModel, Messages
+from webchat.payloads import MESSAGE_VALUES, message_payload
+from webchat.persistence import write_batch
+from webchat.profiles import sender_snapshot
+
+
+@override_settings(WEBCHAT={'HOT_WINDOW_VERIFY_RATE': 0})
+class TestHotWindow(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user('hotuser')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = ServerCategory.objects.create(name='hotcat')
+        server = Server.objects.create(name='hotserver', owner=self.user.account, category=category)
+        channel = Channel.objects.create(name='hot', server=server, owner=self.user.account)
+        self.channel_id = str(channel.id)
+        self.conversation = ConversationModel.objects.create(channel=channel)
+        start = timezone.now() - timedelta(minutes=1)
+        self.messages = [
+            Messages.objects.create(
+                conversation=self.conversation, sender=self.user, content=f'message {i}',
+                timestamp_created=start + timedelta(seconds=i),
+            )
+            for i in range(5)
+        ]
+
+    def page(self, **params):
+        response = self.client.get('/api/messages/', {'channel_id': self.channel_id, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def database_page(self, **params):
+        with self.settings(WEBCHAT={'HOT_WINDOW_SIZE': 0, 'HOT_WINDOW_VERIFY_RATE': 0}):
+            return self.page(**params)
+
+    def test_newest_page_is_served_from_the_window(self):
+        first = self.page(limit=3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.page(limit=3), first)
+        self.assertEqual(first, self.database_page(limit=3))
+        stats = hot_windows.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_persisted_messages_are_written_through(self):
+        self.page()
+        write_batch([{
+            'provisional_id': 'p1-1',
+            'conversation_id': self.conversation.id,
+            'channel_id': self.channel_id,
+            'room_group_name': 'unused',
+            'sender_id': self.user.id,
+            'sender': {'id': self.user.id, 'username': 'hotuser', 'image_url': None},
+            'content': 'fresh',
+            'timestamp_created': timezone.now(),
+        }])
+        with self.assertNumQueries(0):
+            cached = self.page()
+        self.assertEqual(cached[-1]['content'], 'fresh')
+        self.assertEqual([m['id'] for m in cached], [m['id'] for m in self.database_page()])
+
+    def test_windows_are_shared_between_processes(self):
+        rows = Messages.objects.filter(conversation=self.conversation).values(*MESSAGE_VALUES)
+        with tempfile.TemporaryDirectory() as location:
+            # Two cache clients on one store, like two workers on one Redis.
+            writer = HotWindowCache(FileBasedCache(location, {}))
+            reader = HotWindowCache(FileBasedCache(location, {}))
+            reader.newest_page(self.channel_id, rows, 50)
+            message = Messages.objects.create(conversation=self.conversation, sender=self.user, content='elsewhere')
+            writer.append(self.channel_id, [message_payload(message, sender_snapshot(self.user))])
+            with self.assertNumQueries(0):
+                cached = reader.newest_page(self.channel_id, rows, 50)
+            self.assertEqual(cached[-1]['content'], 'elsewhere')
+            self.assertEqual(writer.stats()['hits'], 1)
+
+    def test_edits_and_deletes_patch_the_window(self):
+        self.page()
+        edited, deleted = self.messages[1], self.messages[3]
+        self.client.patch(f'/api/messages/{edited.id}/', {'content': 'edited'}, format='json')
+        self.client.delete(f'/api/messages/{deleted.id}/')
+        with self.assertNumQueries(0):
+            cached = self.page()
+        self.assertEqual(cached, self.database_page())
+        self.assertEqual(cached[1]['content'], 'edited')
+
+    def test_deleting_the_channel_drops_its_window(self):
+        self.page()
+        self.assertIsNotNone(cache.get(hot_windows.window_key(self.channel_id)))
+        Channel.objects.get(pk=self.channel_id).delete()
+        self.assertIsNone(cache.get(hot_windows.window_key(self.channel_id)))
+
+    def test_profile_edit_refreshes_the_cached_author(self):
+        self.page()
+        self.client.patch('/api/account/edit_me/', {'username': 'renamed'}, format='json')
+        self.assertEqual({m['user']['username'] for m in self.page()}, {'renamed'})
+
+    def test_verified_hits_detect_and_repair_stale_windows(self):
+        self.page()
+        # A write that bypassed the window, e.g. lost to a concurrent update.
+        Messages.objects.create(conversation=self.conversation, sender=self.user, content='missed')
+        with self.settings(WEBCHAT={'HOT_WINDOW_VERIFY_RATE': 1}):
+            self.assertEqual(self.page()[-1]['content'], 'missed')
+        self.assertEqual(hot_windows.stats()['stale_rate'], 1.0)
+        self.assertEqual(self.page(), self.database_page())
+
+    def test_cache_stats_are_admin_only(self):
+        self.assertEqual(self.client.get('/api/messages/cache_stats/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.page()
+        self.page()
+        stats = self.client.get('/api/messages/cache_stats/').json()
+        self.assertEqual(stats['hit_rate'], 0.5)
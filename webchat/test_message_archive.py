@@ -0,0 +1,83 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ping_me_api.testing import PingMeTestCase
+from server.models import Channel, Server, ServerCategory
+from webchat.archive import archive_messages
+from webchat.models import ArchivedMessage, ConversationModel, Messages
+
+
+@override_settings(WEBCHAT={'HOT_WINDOW_VERIFY_RATE': 0})
+class TestMessageArchive(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user('archiveuser')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = ServerCategory.objects.create(name='archivecat')
+        server = Server.objects.create(name='archiveserver', owner=self.user.account, category=category)
+        self.channel = Channel.objects.create(name='archive', server=server, owner=self.user.account)
+        self.idle = Channel.objects.create(name='idle', server=server, owner=self.user.account)
+        conversation = ConversationModel.objects.create(channel=self.channel)
+        idle_conversation = ConversationModel.objects.create(channel=self.idle)
+        now = timezone.now()
+        self.ids = [
+            Messages.objects.create(
+                conversation=conversation, sender=self.user, content=f'archived game {i}' if i < 6 else f'game {i}',
+                timestamp_created=now - timedelta(days=10 - i),
+            ).id
+            for i in range(10)
+        ]
+        self.idle_id = Messages.objects.create(
+            conversation=idle_conversation, sender=self.user, content='long ago',
+            timestamp_created=now - timedelta(days=30),
+        ).id
+        self.expected = [self.page(limit=10), self.page(before=self.ids[7], limit=4)]
+        self.assertEqual(archive_messages(now - timedelta(days=4, hours=12), batch_size=4), 7)
+        cache.clear()
+
+    def page(self, **params):
+        response = self.client.get('/api/messages/', {'channel_id': self.channel.id, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [message['id'] for message in response.json()]
+
+    def test_messages_move_to_the_archive(self):
+        self.assertEqual(list(Messages.objects.order_by('id').values_list('id', flat=True)), self.ids[6:])
+        self.assertEqual(ArchivedMessage.objects.count(), 7)
+
+    def test_history_reads_through_to_the_archive(self):
+        self.assertEqual(self.page(limit=10), self.expected[0])
+        self.assertEqual(self.page(before=self.ids[7], limit=4), self.expected[1])
+        self.assertEqual(self.page(after=self.ids[4], limit=3), self.ids[5:8])
+        self.assertEqual(self.page(around=self.ids[5], limit=5), self.ids[3:8])
+        self.assertEqual(self.page(before=self.ids[2]), self.ids[:2])
+
+    def test_search_and_previews_read_through_to_the_archive(self):
+        response = self.client.get('/api/messages/search/', {'q': 'game', 'channel_id': self.channel.id, 'limit': 6})
+        page = response.json()
+        self.assertEqual([result['id'] for result in page['results']], self.ids[:3:-1])
+        self.assertEqual(page['results'][-1]['snippet'], 'archived <mark>game</mark> 4')
+        response = self.client.get(
+            '/api/messages/search/', {'q': 'game', 'channel_id': self.channel.id, 'before': page['next']},
+        )
+        self.assertEqual([result['id'] for result in response.json()['results']], self.ids[3::-1])
+        latest = self.client.get('/api/messages/latest/', {'channel_ids': f'{self.channel.id},{self.idle.id}'}).json()
+        self.assertEqual((latest[str(self.channel.id)]['id'], latest[str(self.idle.id)]['id']), (self.ids[-1], self.idle_id))
+
+    def test_archived_messages_are_read_only(self):
+        self.assertEqual(self.client.get(f'/api/messages/{self.ids[0]}/').json()['content'], 'archived game 0')
+        response = self.client.patch(f'/api/messages/{self.ids[0]}/', {'content': 'changed'}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_archive_command(self):
+        out = StringIO()
+        call_command('archive_messages', older_than=1, stdout=out)
+        self.assertIn('Archived 4 messages.', out.getvalue())
+        self.assertFalse(Messages.objects.exists())
+        self.assertEqual(self.page(limit=10), self.expected[0])
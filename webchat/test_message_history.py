@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ping_me_api.testing import PingMeTestCase
+from server.models import Channel, Server, ServerCategory
+from webchat.models import ConversationModel, Messages
+from webchat.payloads import message_payloads
+
+
+class TestMessageHistoryPagination(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user('historyuser')
+        self.other = self.make_user('historyother')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = ServerCategory.objects.create(name='historycat')
+        self.server = Server.objects.create(name='historyserver', owner=self.user.account, category=category)
+        channel = Channel.objects.create(name='history', server=self.server, owner=self.user.account)
+        self.channel_id = str(channel.id)
+        conversation = ConversationModel.objects.create(channel=channel)
+        start = timezone.now()
+        self.messages = [
+            Messages.objects.create(
+                conversation=conversation, sender=(self.user, self.other)[i % 2], content=f'message {i}',
+                timestamp_created=start + timedelta(seconds=i),
+            )
+            for i in range(10)
+        ]
+        self.ids = [message.id for message in self.messages]
+
+    def page(self, **params):
+        response = self.client.get('/api/messages/', {'channel_id': self.channel_id, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [message['id'] for message in response.data]
+
+    def test_default_page_is_the_newest_messages_oldest_first(self):
+        self.assertEqual(self.page(limit=3), self.ids[-3:])
+
+    def test_before_after_and_around_anchors(self):
+        self.assertEqual(self.page(before=self.ids[5], limit=2), self.ids[3:5])
+        self.assertEqual(self.page(after=self.ids[5], limit=2), self.ids[6:8])
+        self.assertEqual(self.page(around=self.ids[5], limit=5), self.ids[3:8])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'limit': 'x'}, {'before': 1, 'after': 2}, {'before': 999999}):
+            response = self.client.get('/api/messages/', {'channel_id': self.channel_id, **params})
+            self.assertEqual(response.status_code, 400)
+
+    def test_page_matches_the_live_message_payload(self):
+        response = self.client.get('/api/messages/', {'channel_id': self.channel_id})
+        live = message_payloads(Messages.objects.select_related('sender__account').order_by('id'))
+        self.assertEqual(response.json(), live)
+
+    def test_compact_page_lists_each_author_once(self):
+        response = self.client.get('/api/messages/', {'channel_id': self.channel_id, 'compact': 'true'})
+        page = response.json()
+        self.assertEqual([author['id'] for author in page['authors']], [self.user.id, self.other.id])
+        self.assertEqual([message['user'] for message in page['messages']], [self.user.id, self.other.id] * 5)
+        authors = {author['id']: author for author in page['authors']}
+        expanded = [dict(message, user=authors[message['user']]) for message in page['messages']]
+        self.assertEqual(expanded, self.client.get('/api/messages/', {'channel_id': self.channel_id}).json())
+
+    def test_latest_returns_the_newest_message_of_each_channel(self):
+        quiet = Channel.objects.create(name='quiet', server=self.server, owner=self.user.account)
+        other = Channel.objects.create(name='other', server=self.server, owner=self.user.account)
+        reply = Messages.objects.create(
+            conversation=ConversationModel.objects.create(channel=other), sender=self.other, content='reply',
+        )
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/messages/latest/', {'channel_ids': f'{self.channel_id},{quiet.id},{other.id}'})
+        latest = response.json()
+        self.assertEqual(set(latest), {self.channel_id, str(other.id)})
+        self.assertEqual(latest[self.channel_id]['id'], self.ids[-1])
+        self.assertEqual(
+            latest[str(other.id)],
+            message_payloads([Messages.objects.select_related('sender__account').get(id=reply.id)])[0],
+        )
+
+    def test_latest_defaults_to_the_channels_of_my_servers(self):
+        self.assertEqual(self.client.get('/api/messages/latest/').json(), {})
+        self.server.members.add(self.user.account)
+        self.assertEqual(list(self.client.get('/api/messages/latest/').json()), [self.channel_id])
+        response = self.client.get('/api/messages/latest/', {'channel_ids': '1,x'})
+        self.assertEqual(response.status_code, 400)
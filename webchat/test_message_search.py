@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ping_me_api.testing import PingMeTestCase
+from server.models import Channel, Server, ServerCategory
+from webchat.models import ConversationModel, Messages
+
+
+class TestMessageSearch(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user('searchuser')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = ServerCategory.objects.create(name='searchcat')
+        self.server = Server.objects.create(name='searchserver', owner=self.user.account, category=category)
+        other_server = Server.objects.create(name='elsewhere', owner=self.user.account, category=category)
+        self.channel = Channel.objects.create(name='search', server=self.server, owner=self.user.account)
+        sibling = Channel.objects.create(name='sibling', server=self.server, owner=self.user.account)
+        outside = Channel.objects.create(name='outside', server=other_server, owner=self.user.account)
+        start = timezone.now()
+        self.messages = {}
+        for i, (channel, content) in enumerate([
+            (self.channel, 'anyone up for a game tonight?'),
+            (self.channel, 'which game?'),
+            (sibling, 'the board GAME from last week'),
+            (outside, 'game night elsewhere'),
+            (self.channel, 'no idea, <b>surprise</b> me'),
+        ]):
+            conversation, _ = ConversationModel.objects.get_or_create(channel=channel)
+            self.messages[content] = Messages.objects.create(
+                conversation=conversation, sender=self.user, content=content,
+                timestamp_created=start + timedelta(seconds=i),
+            )
+
+    def search(self, **params):
+        response = self.client.get('/api/messages/search/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.json()
+
+    def contents(self, **params):
+        return [result['content'] for result in self.search(**params)['results']]
+
+    def test_search_is_scoped_to_a_channel_or_server(self):
+        self.assertEqual(self.contents(q='game', channel_id=self.channel.id),
+                         ['which game?', 'anyone up for a game tonight?'])
+        self.assertEqual(self.contents(q='game', server_id=self.server.id),
+                         ['the board GAME from last week', 'which game?', 'anyone up for a game tonight?'])
+        self.assertEqual(self.contents(q='game tonight', server_id=self.server.id),
+                         ['anyone up for a game tonight?'])
+
+    def test_results_are_paginated_newest_first(self):
+        first = self.search(q='game', server_id=self.server.id, limit=2)
+        self.assertEqual(len(first['results']), 2)
+        second = self.search(q='game', server_id=self.server.id, limit=2, before=first['next'])
+        self.assertEqual([result['content'] for result in second['results']], ['anyone up for a game tonight?'])
+        self.assertIsNone(second['next'])
+
+    def test_snippets_highlight_matches_and_escape_content(self):
+        [result] = self.search(q='surprise', channel_id=self.channel.id)['results']
+        self.assertEqual(result['snippet'], 'no idea, &lt;b&gt;<mark>surprise</mark>&lt;/b&gt; me')
+        self.assertEqual(result['user']['username'], 'searchuser')
+
+    def test_index_follows_edits_and_deletes(self):
+        edited = self.messages['which game?']
+        self.client.patch(f'/api/messages/{edited.id}/', {'content': 'which puzzle?'}, format='json')
+        self.client.delete(f'/api/messages/{self.messages["anyone up for a game tonight?"].id}/')
+        self.assertEqual(self.contents(q='game', channel_id=self.channel.id), [])
+        self.assertEqual(self.contents(q='puzzle', channel_id=self.channel.id), ['which puzzle?'])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in (
+            {'q': 'game'},
+            {'q': 'game', 'channel_id': self.channel.id, 'server_id': self.server.id},
+            {'q': '"*', 'channel_id': self.channel.id},
+            {'q': 'game', 'channel_id': self.channel.id, 'before': 999999},
+        ):
+            response = self.client.get('/api/messages/search/', params)
+            self.assertEqual(response.status_code, 400, params)
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ping_me_api.testing import PingMeTestCase
+from server.models import Channel, Server, ServerCategory
+from webchat.models import ConversationModel, Messages
+
+
+class TestReadState(PingMeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user('reader')
+        self.other = self.make_user('writer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = ServerCategory.objects.create(name='readcat')
+        self.server = Server.objects.create(name='readserver', owner=self.other.account, category=category)
+        self.server.members.add(self.user.account)
+        self.channel = Channel.objects.create(name='read', server=self.server, owner=self.other.account)
+        self.quiet = Channel.objects.create(name='quiet', server=self.server, owner=self.other.account)
+        conversation = ConversationModel.objects.create(channel=self.channel)
+        ConversationModel.objects.create(channel=self.quiet)
+        start = timezone.now()
+        self.messages = [
+            Messages.objects.create(
+                conversation=conversation, sender=self.other, content=f'message {i}',
+                timestamp_created=start + timedelta(seconds=i),
+            )
+            for i in range(5)
+        ]
+        # The user's own messages never count as unread.
+        Messages.objects.create(conversation=conversation, sender=self.user, content='mine')
+
+    def read(self, message, channel=None):
+        response = self.client.post(
+            '/api/messages/read/',
+            {'channel_id': (channel or self.channel).id, 'message_id': message.id},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.json()['advanced']
+
+    def unread(self):
+        with self.assertNumQueries(1):
+            return self.client.get('/api/messages/unread/').json()
+
+    def test_unread_counts_follow_the_watermark(self):
+        channel, server = str(self.channel.id), str(self.server.id)
+        self.assertEqual(self.unread(), {'cap': 100, 'channels': {channel: 5}, 'servers': {server: 5}})
+        self.assertTrue(self.read(self.messages[2]))
+        self.assertEqual(self.unread()['channels'], {channel: 2})
+        self.assertTrue(self.read(self.messages[4]))
+        self.assertEqual(self.unread(), {'cap': 100, 'channels': {}, 'servers': {}})
+
+    def test_watermark_only_moves_forward(self):
+        self.assertTrue(self.read(self.messages[3]))
+        self.assertFalse(self.read(self.messages[1]))
+        self.assertFalse(self.read(self.messages[3]))
+        self.assertEqual(self.unread()['channels'], {str(self.channel.id): 1})
+
+    @override_settings(WEBCHAT={'UNREAD_COUNT_CAP': 3})
+    def test_counts_are_capped(self):
+        self.assertEqual(self.unread(), {
+            'cap': 3, 'channels': {str(self.channel.id): 3}, 'servers': {str(self.server.id): 3},
+        })
+
+    def test_messages_of_another_channel_are_not_marked_read(self):
+        self.assertFalse(self.read(self.messages[4], channel=self.quiet))
+        response = self.client.post('/api/messages/read/', {'channel_id': 'x', 'message_id': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
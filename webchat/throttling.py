@@ -0,0 +1,141 @@
+"""
+Token-bucket rate limiting for chat sockets.
+
+Every ChatConsumer keeps a bucket for its own socket, and all sockets of a
+user share a per-user bucket held in a bucket store. The default store
+lives in process memory; setting ``WEBCHAT["RATE_LIMIT_STORE"]`` to
+``"cache"`` keeps the per-user buckets in the Django cache instead, so the
+limit holds across worker processes (on a best-effort basis, as the cache
+read and write are not atomic).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .conf import webchat_setting
+
+
+class TokenBucket:
+    """
+    A classic token bucket refilled continuously at ``rate`` tokens a second.
+    """
+
+    def __init__(self, rate, burst):
+        """
+        Initialize a full bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            burst (int): The bucket's capacity.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def consume(self, tokens=1):
+        """
+        Take tokens from the bucket if there are enough.
+
+        Args:
+            tokens (int): How many tokens the action costs.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds until
+            enough tokens will be available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0
+        return (tokens - self.tokens) / self.rate
+
+
+class MemoryBucketStore:
+    """
+    Per-process store of token buckets, bounded by evicting the least recently used.
+    """
+
+    def __init__(self, maxsize=10000):
+        """
+        Initialize an empty store.
+
+        Args:
+            maxsize (int): The most buckets kept at once.
+        """
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def consume(self, key, rate, burst):
+        """
+        Take one token from the bucket stored under ``key``.
+
+        Args:
+            key (str): The bucket key.
+            rate (float): Tokens added per second.
+            burst (int): The bucket's capacity.
+
+        Returns:
+            float: 0 if allowed, otherwise the seconds to wait.
+        """
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+                while len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            return bucket.consume()
+
+
+class CacheBucketStore:
+    """
+    Token buckets kept in the Django cache so all worker processes share them.
+    """
+
+    async def consume(self, key, rate, burst):
+        """
+        Take one token from the bucket stored under ``key``.
+
+        Args:
+            key (str): The bucket key.
+            rate (float): Tokens added per second.
+            burst (int): The bucket's capacity.
+
+        Returns:
+            float: 0 if allowed, otherwise the seconds to wait.
+        """
+        cache_key = f"webchat_bucket_{key}"
+        now = time.time()
+        tokens, updated = await cache.aget(cache_key, (float(burst), now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        retry_after = 0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        # Keep the bucket only as long as it takes to refill completely.
+        await cache.aset(cache_key, (tokens, now), timeout=int(burst / rate) + 1)
+        return retry_after
+
+
+_memory_store = MemoryBucketStore()
+_cache_store = CacheBucketStore()
+
+
+def bucket_store():
+    """
+    Return the bucket store selected by ``WEBCHAT["RATE_LIMIT_STORE"]``.
+
+    Returns:
+        MemoryBucketStore or CacheBucketStore: The store for per-user buckets.
+    """
+    if webchat_setting("RATE_LIMIT_STORE") == "cache":
+        return _cache_store
+    return _memory_store
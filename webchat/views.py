@@ -5,13 +5,102 @@ Includes custom permissions and API endpoints for listing, retrieving,
 updating, and deleting messages in conversations.
 """
 
+import hashlib
+
+from django.core.cache import cache
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
+from account.models import profile_version_key
+from ping_me_api.caching import bump_versions, get_versions, make_etag, version_key
+
+from .archive import archived_messages
+from .conversations import conversation_cache, resolve_conversation_id
+from .hotwindow import hot_windows
+from .latest import get_channel_ids, latest_payloads
 from .models import ConversationModel, Messages
+from .pagination import MessageCursorPagination
+from .payloads import MESSAGE_VALUES, compact_payloads, row_payloads
+from .readstate import advance_read_state, unread_counts
+from .search import search_page
 from .serializers import MessageSerializer
 
 
+#: Seconds the author IDs of a history page stay cached.
+PAGE_AUTHORS_CACHE_TIMEOUT = 300
+
+
+def page_author_ids(channel_id, conversation_id, conversation_version, request):
+    """
+    Return the authors of the history page a request asks for.
+
+    The newest page's authors are read off the channel's hot window when it
+    holds the page. Other pages read just their sender IDs, cached for as
+    long as the conversation is unchanged.
+
+    Args:
+        channel_id (str): The channel ID.
+        conversation_id (int): The channel's conversation ID.
+        conversation_version: The conversation's current version.
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        set[int]: The authors' user IDs.
+    """
+    pagination = MessageCursorPagination()
+    if pagination.get_anchor(request) is None:
+        author_ids = hot_windows.author_ids(channel_id, pagination.get_limit(request))
+        if author_ids is not None:
+            return author_ids
+    params = hashlib.sha1(repr(sorted(request.query_params.lists())).encode()).hexdigest()[:16]
+    key = f"webchat_page_authors_{conversation_id}_{conversation_version}_{params}"
+    author_ids = cache.get(key)
+    if author_ids is None:
+        rows = Messages.objects.filter(conversation_id=conversation_id).values("sender_id")
+        archive = archived_messages(conversation_id=conversation_id)
+        if archive is not None:
+            archive = archive.values("sender_id")
+        author_ids = {row["sender_id"] for row in pagination.paginate(rows, request, archive)}
+        cache.set(key, author_ids, PAGE_AUTHORS_CACHE_TIMEOUT)
+    return author_ids
+
+
+def message_history_etag(request, *args, **kwargs):
+    """
+    Build the ETag of a message history page without loading the messages.
+
+    The tag combines the conversation's version (bumped whenever one of its
+    messages is created, edited or deleted), the profile versions of the
+    page's authors and the page's query parameters.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        str or None: The ETag, or None if the channel has no conversation.
+    """
+    channel_id = request.query_params.get("channel_id", "")
+    if not channel_id.isdigit():
+        return None
+    conversation_id = conversation_cache.get(channel_id)
+    if conversation_id is None:
+        conversation_id = ConversationModel.objects.filter(channel_id=channel_id).values_list("id", flat=True).first()
+        if conversation_id is None:
+            return None
+        conversation_cache.set(channel_id, conversation_id)
+    [conversation_version] = get_versions([version_key("conversation", conversation_id)])
+    author_ids = sorted(page_author_ids(channel_id, conversation_id, conversation_version, request))
+    profiles = get_versions([profile_version_key(user_id) for user_id in author_ids])
+    return make_etag(
+        "messages", conversation_id, conversation_version, author_ids, profiles,
+        sorted(request.query_params.lists()),
+    )
+
+
 class IsSenderOrReadOnly(permissions.BasePermission):
     """
     Custom permission to only allow the sender of a message to edit or delete it.
@@ -42,23 +131,43 @@ class MessageViewSet(viewsets.ViewSet):
     """
     permission_classes = [permissions.IsAuthenticated, IsSenderOrReadOnly]
 
+    @method_decorator(condition(etag_func=message_history_etag))
     def list(self, request):
         """
-        List all messages in a conversation by channel_id.
+        List one page of messages in a conversation by channel_id.
+
+        Pages are anchored with ``before``, ``after`` or ``around`` (a message
+        ID) and sized with ``limit``; without an anchor the newest page is
+        returned. Messages are always ordered oldest first, in the same shape
+        as the ChatConsumer's ``new_message`` payload, and the newest page is
+        served from the channel's hot window when it is cached. With
+        ``compact=true`` the page is an envelope listing each author once,
+        and messages refer to their author by ID.
+
+        Responses carry an ETag; a request whose ``If-None-Match`` still
+        matches gets ``304 Not Modified`` without touching the messages.
 
         Args:
             request (Request): The incoming HTTP request.
 
         Returns:
-            Response: List of serialized messages or an empty list.
+            Response: List of message payloads (or the compact envelope).
         """
-        channel_id = request.query_params.get("channel_id")
-        conversation = ConversationModel.objects.filter(channel_id=channel_id).select_related().first()
-        if conversation:
-            messages = conversation.messages.select_related("conversation").select_related("sender").all()
-            serializer = MessageSerializer(messages, many=True)
-            return Response(serializer.data)
-        return Response([])
+        compact = request.query_params.get("compact") == "true"
+        channel_id = request.query_params.get("channel_id", "")
+        if not channel_id.isdigit():
+            return Response({"authors": [], "messages": []} if compact else [])
+        # Join through the conversation so each page is a single query.
+        rows = Messages.objects.filter(conversation__channel_id=channel_id).values(*MESSAGE_VALUES)
+        archive = archived_messages(conversation__channel_id=channel_id)
+        if archive is not None:
+            archive = archive.values(*MESSAGE_VALUES)
+        pagination = MessageCursorPagination()
+        if pagination.get_anchor(request) is None:
+            payloads = hot_windows.newest_page(channel_id, rows, pagination.get_limit(request), archive)
+        else:
+            payloads = row_payloads(pagination.paginate(rows, request, archive))
+        return Response(compact_payloads(payloads) if compact else payloads)
 
     def retrieve(self, request, pk=None):
         """
@@ -71,9 +180,12 @@ class MessageViewSet(viewsets.ViewSet):
         Returns:
             Response: Serialized message data or 404 if not found.
         """
-        try:
-            msg = Messages.objects.get(pk=pk)
-        except Messages.DoesNotExist:
+        msg = Messages.objects.filter(pk=pk).first()
+        if msg is None:
+            # Archived messages can still be read, but not edited or deleted.
+            archive = archived_messages(pk=pk)
+            msg = archive.first() if archive is not None else None
+        if msg is None:
             return Response(status=status.HTTP_404_NOT_FOUND)
         self.check_object_permissions(request, msg)
         serializer = MessageSerializer(msg)
@@ -91,13 +203,19 @@ class MessageViewSet(viewsets.ViewSet):
             Response: Updated serialized data or errors.
         """
         try:
-            msg = Messages.objects.get(pk=pk)
+            msg = Messages.objects.select_related("conversation").get(pk=pk)
         except Messages.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
         self.check_object_permissions(request, msg)
         serializer = MessageSerializer(msg, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            hot_windows.patch(
+                msg.conversation.channel_id,
+                msg.id,
+                content=msg.content,
+                timestamp_updated=msg.timestamp_updated.isoformat(),
+            )
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -113,9 +231,119 @@ class MessageViewSet(viewsets.ViewSet):
             Response: 204 NO CONTENT if deleted, 404 if not found.
         """
         try:
-            msg = Messages.objects.get(pk=pk)
+            msg = Messages.objects.select_related("conversation").get(pk=pk)
         except Messages.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
         self.check_object_permissions(request, msg)
+        message_id = msg.id
         msg.delete()
+        hot_windows.remove(msg.conversation.channel_id, message_id)
+        bump_versions([version_key("conversation", msg.conversation_id)])
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=["get"])
+    def latest(self, request):
+        """
+        Return the newest message of each of several channels in one query.
+
+        The channels are given as comma-separated ``channel_ids``; without
+        them, every channel of every server the user is a member of is
+        previewed. Channels without messages are left out.
+
+        Args:
+            request (Request): The incoming HTTP request.
+
+        Returns:
+            Response: Channel ID to its newest message payload.
+        """
+        channel_ids = get_channel_ids(request)
+        if channel_ids is None:
+            conversations = ConversationModel.objects.filter(channel__server__members=request.user.account)
+        else:
+            conversations = ConversationModel.objects.filter(channel_id__in=channel_ids)
+        return Response(latest_payloads(conversations))
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """
+        Search the messages of a channel or a whole server.
+
+        Exactly one of ``channel_id`` or ``server_id`` scopes the search, and
+        ``q`` holds the words every result must contain. Results are newest
+        first with a highlighted ``snippet``; pass ``next`` back as ``before``
+        for the following page.
+
+        Args:
+            request (Request): The incoming HTTP request.
+
+        Returns:
+            Response: ``results`` and ``next``, or 400 for invalid parameters.
+        """
+        scopes = {
+            "channel_id": "conversation__channel_id",
+            "server_id": "conversation__channel__server_id",
+        }
+        given = [name for name in scopes if name in request.query_params]
+        if len(given) != 1:
+            raise ValidationError("Exactly one of channel_id or server_id must be given.")
+        scope = request.query_params[given[0]]
+        if not scope.isdigit():
+            raise ValidationError({given[0]: "Must be an ID."})
+        messages = Messages.objects.filter(**{scopes[given[0]]: scope}).values(*MESSAGE_VALUES)
+        archive = archived_messages(**{scopes[given[0]]: scope})
+        if archive is not None:
+            archive = archive.values(*MESSAGE_VALUES)
+        return Response(search_page(messages, request, archive))
+
+    @action(detail=False, methods=["post"])
+    def read(self, request):
+        """
+        Advance the user's read watermark in a channel to a message.
+
+        The watermark only moves forward; marking an older message read
+        leaves it where it is.
+
+        Args:
+            request (Request): The incoming HTTP request, with ``channel_id``
+                and ``message_id`` in its body.
+
+        Returns:
+            Response: Whether the watermark moved, or 400 for invalid data.
+        """
+        channel_id = str(request.data.get("channel_id", ""))
+        message_id = request.data.get("message_id")
+        if not channel_id.isdigit():
+            raise ValidationError({"channel_id": "Must be a channel ID."})
+        if not isinstance(message_id, int):
+            raise ValidationError({"message_id": "Must be a message ID."})
+        conversation_id = conversation_cache.get(channel_id) or resolve_conversation_id(channel_id)
+        if conversation_id is None:
+            raise ValidationError({"channel_id": "No such channel."})
+        advanced = advance_read_state(request.user.account.id, conversation_id, message_id)
+        return Response({"advanced": advanced})
+
+    @action(detail=False, methods=["get"])
+    def unread(self, request):
+        """
+        Count the unread messages of every channel in the user's servers.
+
+        Args:
+            request (Request): The incoming HTTP request.
+
+        Returns:
+            Response: The cap and the capped counts per channel and server.
+        """
+        return Response(unread_counts(request.user.account))
+
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """
+        Report the hot-window cache's hit rate and staleness.
+
+        Args:
+            request (Request): The incoming HTTP request.
+
+        Returns:
+            Response: The counters from ``HotWindowCache.stats``.
+        """
+        return Response(hot_windows.stats())